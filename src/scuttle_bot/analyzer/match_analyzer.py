@@ -4,8 +4,9 @@ and flagging notable in-game moments (e.g. a sudden gold spike) with a
 best-effort explanation drawn from nearby match events.
 
 MatchAnalyzerMixin is mixed into ScuttleBotService alongside RiotClientMixin,
-whose get_puuid / _fetch_match_ids / _get_cached_match_detail /
-get_match_timeline it calls via self. All the heavy lifting (fetching,
+whose get_puuid / _fetch_match_ids / _get_cached_match_participants /
+get_match_timelines it calls via self. Both resolve a whole batch of matches
+with one cache query and fetch only what's missing. All the heavy lifting (fetching,
 caching, aggregating) happens here in Python -- these methods return small,
 precomputed summaries rather than raw timeline data, since a raw timeline is
 far too large and numeric for an LLM to reliably reason over directly.
@@ -69,41 +70,48 @@ class MatchAnalyzerMixin:
             player_values = []
             opponent_values = []
 
-            for match_id in match_ids:
-                if len(player_values) >= num_matches:
-                    break
-
-                match_detail = self._get_cached_match_detail(match_id, summoner_name=summoner_name, region=region)
-                if match_detail is None:
-                    continue
-
-                participants = match_detail["info"]["participants"]
-                me = next((p for p in participants if p["puuid"] == puuid), None)
-                if me is None or not me.get("teamPosition"):
-                    continue
-                opponent = next(
-                    (p for p in participants if p.get("teamPosition") == me["teamPosition"] and p["teamId"] != me["teamId"]),
-                    None,
-                )
-                if opponent is None:
-                    continue
-
-                timeline = self.get_match_timeline(match_id, region=region)
-                if timeline is None:
-                    continue
+            # Matches are resolved a window at a time -- only as many as are
+            # still needed -- so the over-fetched tail is never fetched
+            # unless earlier matches get skipped.
+            remaining = list(match_ids)
+            while remaining and len(player_values) < num_matches:
+                window_size = num_matches - len(player_values)
+                window, remaining = remaining[:window_size], remaining[window_size:]
+                participants = self._get_cached_match_participants(window, summoner_name=summoner_name, region=region)
+
+                lanes = {}  # match_id -> (me, lane opponent), in matchlist order
+                for match_id in window:
+                    match_participants = participants.get(match_id)
+                    if match_participants is None:
+                        continue
+                    me = next((p for p in match_participants if p["puuid"] == puuid), None)
+                    if me is None or not me.get("teamPosition"):
+                        continue
+                    opponent = next(
+                        (p for p in match_participants if p.get("teamPosition") == me["teamPosition"] and p["teamId"] != me["teamId"]),
+                        None,
+                    )
+                    if opponent is not None:
+                        lanes[match_id] = (me, opponent)
+
+                timelines = self.get_match_timelines(list(lanes), region=region)
+                for match_id, (me, opponent) in lanes.items():
+                    timeline = timelines.get(match_id)
+                    if timeline is None:
+                        continue
 
-                frame = self._nearest_frame(timeline, target_ms)
-                if frame is None:
-                    continue
+                    frame = self._nearest_frame(timeline, target_ms)
+                    if frame is None:
+                        continue
 
-                participant_frames = frame["participantFrames"]
-                my_frame = participant_frames.get(str(me["participantId"]))
-                opponent_frame = participant_frames.get(str(opponent["participantId"]))
-                if my_frame is None or opponent_frame is None:
-                    continue
+                    participant_frames = frame["participantFrames"]
+                    my_frame = participant_frames.get(str(me["participantId"]))
+                    opponent_frame = participant_frames.get(str(opponent["participantId"]))
+                    if my_frame is None or opponent_frame is None:
+                        continue
 
-                player_values.append(self._extract_metric(my_frame, metric))
-                opponent_values.append(self._extract_metric(opponent_frame, metric))
+                    player_values.append(self._extract_metric(my_frame, metric))
+                    opponent_values.append(self._extract_metric(opponent_frame, metric))
 
             matches_used = len(player_values)
             if matches_used == 0:
@@ -177,19 +185,17 @@ class MatchAnalyzerMixin:
             # so there's no point caching them like match/timeline data.
             replay_urls = self.get_replay_urls(puuid, region=region)
 
+            participants = self._get_cached_match_participants(match_ids, summoner_name=summoner_name, region=region, puuid=puuid)
+            my_participant_ids = {
+                match_id: participants[match_id][0]["participantId"]
+                for match_id in match_ids if participants.get(match_id)
+            }
+            timelines = self.get_match_timelines(list(my_participant_ids), region=region)
+
             moments = []
             biggest_moment = None
-            for match_id in match_ids:
-                match_detail = self._get_cached_match_detail(match_id, summoner_name=summoner_name, region=region)
-                if match_detail is None:
-                    continue
-
-                me = next((p for p in match_detail["info"]["participants"] if p["puuid"] == puuid), None)
-                if me is None:
-                    continue
-                participant_id = me["participantId"]
-
-                timeline = self.get_match_timeline(match_id, region=region)
+            for match_id, participant_id in my_participant_ids.items():
+                timeline = timelines.get(match_id)
                 if timeline is None:
                     continue
 
@@ -2,6 +2,7 @@ import json
 from collections import defaultdict
 
 from scuttle_bot.data.dataset import Dataset
+from scuttle_bot.data.snapshot import load_table
 
 ROLES = ["top", "jungle", "mid", "adc", "support"]
 OUTPUT_PATH = "src/scuttle_bot/service/champion_roles.json"
@@ -16,13 +17,15 @@ def build_champion_role_frequencies(db_path: str = "src/scuttle_bot/cache/ml_dat
     stays accurate for as long as the dataset is periodically refreshed.
     """
     dataset = Dataset(db_path=db_path)
-    matches = dataset.retrieve_dataset()
+    columns = [f"{team}_{role}" for role in ROLES for team in ("blue", "red")]
+    matches = load_table(dataset, "matches", columns=columns, categorical=True)
 
     counts = defaultdict(lambda: {role: 0 for role in ROLES})
     for role in ROLES:
         for team in ("blue", "red"):
-            for champ_id in matches[f"{team}_{role}"].dropna():
-                counts[int(champ_id)][role] += 1
+            for champ_id, picks in matches[f"{team}_{role}"].value_counts().items():
+                if picks:
+                    counts[int(champ_id)][role] += int(picks)
 
     with open(output_path, "w") as f:
         json.dump(counts, f, indent=2, sort_keys=True)
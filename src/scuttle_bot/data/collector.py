@@ -3,24 +3,23 @@ import os
 from typing import Optional
 import json
 import random
-import time
 
-from scuttle_bot.utilities.schemas import Region, Queue, get_match_routing_url
+from scuttle_bot.utilities.schemas import Region, Queue, get_match_routing_url, get_platform_routing_url
 from scuttle_bot.infra.aws_client import get_riot_api_key
-
-# requests.get() has no default timeout -- a stalled connection blocks
-# forever with no exception ever raised, which is indistinguishable from a
-# hung process. Every call in this module gets one explicitly.
-REQUEST_TIMEOUT = 30
+from scuttle_bot.infra.riot_http import riot_get
+from scuttle_bot.infra.response_cache import NOT_FOUND, get_response_cache
 
 class Collector:
-    def _get_json(self, url: str, max_retries: int = 3):
-        """GET that returns parsed JSON on 200, retries 429s honoring
-        Retry-After, and returns None on any other error status so callers
-        never receive a Riot error payload in place of real data."""
+    def _get_json(self, url: str, max_retries: int = 3, not_found=None):
+        """GET that returns parsed JSON on 200, retries 429s, and returns None
+        on any other error status so callers never receive a Riot error
+        payload in place of real data. A 404 returns not_found instead --
+        None unless the caller needs to tell "doesn't exist" from a failure. Pacing (including honoring a 429's
+        Retry-After) is the shared rate limiter's job -- acquire() blocks
+        until the call is legal, so a retry just goes back through it."""
         for attempt in range(max_retries + 1):
             try:
-                response = requests.get(url, headers=self.headers, timeout=REQUEST_TIMEOUT)
+                response = riot_get(url, headers=self.headers)
             except requests.exceptions.RequestException as e:
                 print(f"Request error (attempt {attempt + 1}/{max_retries + 1}): {e}")
                 if attempt < max_retries:
@@ -28,15 +27,22 @@ class Collector:
                 return None
             if response.status_code == 200:
                 return response.json()
+            if response.status_code == 404:
+                return not_found
             if response.status_code == 429 and attempt < max_retries:
-                retry_after = int(response.headers.get("Retry-After", 10))
-                print(f"Rate limited (429), waiting {retry_after}s before retrying...")
-                time.sleep(retry_after)
+                print(f"Rate limited (429), retrying after {response.headers.get('Retry-After', 'the limiter backoff')}s...")
                 continue
             print(f"Request failed with status {response.status_code}: {url}")
             return None
         return None
 
+    def _get_cached_json(self, url: str):
+        """_get_json behind the shared stale-while-revalidate cache, for
+        endpoints whose data only changes after a game (ranked entries,
+        mastery) or whose "doesn't exist" answer is worth remembering briefly
+        -- see response_cache.CACHE_POLICIES / NEGATIVE_CACHE_TTLS."""
+        return get_response_cache().get_json(url, lambda: self._get_json(url, not_found=NOT_FOUND))
+
     def __init__(self, region = Region.NA):
         from dotenv import load_dotenv
         load_dotenv()
@@ -46,32 +52,28 @@ class Collector:
             "X-Riot-Token": self.riot_key
         }
         self.riot_url = get_match_routing_url(region)  # match-v5's continental cluster for this platform
-        self.lol_url = "https://{region}.api.riotgames.com"
-        self.lol_url = self.lol_url.format(region=region.value)  # Using the provided region for ranked stats
+        self.lol_url = get_platform_routing_url(region)  # Using the provided region for ranked stats
 
     def collect_challenger_leagues(self, region: Region, queue: Queue) -> Optional[dict]:
         try:
-            url = self.lol_url.format(region=region.value)
-            response = requests.get(f"{url}/lol/league/v4/challengerleagues/by-queue/{queue.value}", headers=self.headers, timeout=REQUEST_TIMEOUT)
-            return response.json()
+            url = get_platform_routing_url(region)
+            return self._get_json(f"{url}/lol/league/v4/challengerleagues/by-queue/{queue.value}")
         except Exception as e:
             print(f"Error collecting challenger leagues: {e}")
             return None
     
     def collect_master_leagues(self, region: Region, queue: Queue) -> Optional[dict]:
         try:
-            url = self.lol_url.format(region=region.value)
-            response = requests.get(f"{url}/lol/league/v4/masterleagues/by-queue/{queue.value}", headers=self.headers, timeout=REQUEST_TIMEOUT)
-            return response.json()
+            url = get_platform_routing_url(region)
+            return self._get_json(f"{url}/lol/league/v4/masterleagues/by-queue/{queue.value}")
         except Exception as e:
             print(f"Error collecting master leagues: {e}")
             return None
         
     def collect_grandmaster_leagues(self, region: Region, queue: Queue) -> Optional[dict]:
         try:
-            url = self.lol_url.format(region=region.value)
-            response = requests.get(f"{url}/lol/league/v4/grandmasterleagues/by-queue/{queue.value}", headers=self.headers, timeout=REQUEST_TIMEOUT)
-            return response.json()
+            url = get_platform_routing_url(region)
+            return self._get_json(f"{url}/lol/league/v4/grandmasterleagues/by-queue/{queue.value}")
         except Exception as e:
             print(f"Error collecting grandmaster leagues: {e}")
             return None
@@ -116,7 +118,9 @@ class Collector:
             url = f"{self.riot_url}/lol/match/v5/matches/by-puuid/{puuid}/ids?count={count}"
             if queue_id is not None:
                 url += f"&queue={queue_id}"
-            return self._get_json(url)
+            match_ids = self._get_json(url)
+            get_response_cache().note_match_ids(puuid, match_ids)
+            return match_ids
         except Exception as e:
             print(f"Error collecting match history for PUUID {puuid}: {e}")
             return None
@@ -128,27 +132,70 @@ class Collector:
             print(f"Error collecting match details for match ID {match_id}: {e}")
             return None
 
+    def collect_match_timeline(self, match_id: str) -> Optional[dict]:
+        try:
+            return self._get_json(f"{self.riot_url}/lol/match/v5/matches/{match_id}/timeline")
+        except Exception as e:
+            print(f"Error collecting match timeline for match ID {match_id}: {e}")
+            return None
+
     def collect_ranked_stats(self, summoner_id: str) -> Optional[dict]:
         try:
-            return self._get_json(f"{self.lol_url}/lol/league/v4/entries/by-puuid/{summoner_id}")
+            return self._get_cached_json(f"{self.lol_url}/lol/league/v4/entries/by-puuid/{summoner_id}")
         except Exception as e:
             print(f"Error collecting ranked stats for summoner ID {summoner_id}: {e}")
             return None
 
-    def collect_champion_mastery(self, puuid: str, champion_id: int) -> Optional[dict]:
+    def collect_champion_masteries(self, puuid: str) -> Optional[dict]:
+        """Every champion's mastery for a player from one champion-mastery-v4
+        call, cached per player as a compact {str(championId): [points,
+        level, lastPlayTime]} snapshot rather than the full ~170-entry
+        payload. The same apex players turn up across many matches, so one
+        snapshot answers all of their later per-champion lookups until its
+        cache policy expires it."""
+        url = f"{self.lol_url}/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}"
+
+        def fetch():
+            masteries = self._get_json(url, not_found=NOT_FOUND)
+            if not isinstance(masteries, list):  # None, NOT_FOUND, or a Riot error payload
+                return masteries if masteries is NOT_FOUND else None
+            return {
+                str(m["championId"]): [m.get("championPoints"), m.get("championLevel"), m.get("lastPlayTime")]
+                for m in masteries
+            }
+
         try:
-            return self._get_json(
-                f"{self.lol_url}/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/by-champion/{champion_id}"
-            )
+            return get_response_cache().get_json(url, fetch)
         except Exception as e:
-            print(f"Error collecting champion mastery for PUUID {puuid}, champion {champion_id}: {e}")
+            print(f"Error collecting champion masteries for PUUID {puuid}: {e}")
             return None
 
+    def collect_champion_mastery(self, puuid: str, champion_id: int) -> Optional[dict]:
+        """One champion's mastery, answered from the player's cached snapshot
+        (see collect_champion_masteries). None if the player has never
+        played it, like the by-champion endpoint's 404."""
+        snapshot = self.collect_champion_masteries(puuid)
+        if not snapshot:
+            return None
+        entry = snapshot.get(str(champion_id))
+        if entry is None:
+            return None
+        champion_points, champion_level, last_play_time = entry
+        return {
+            "puuid": puuid,
+            "championId": champion_id,
+            "championPoints": champion_points,
+            "championLevel": champion_level,
+            "lastPlayTime": last_play_time,
+        }
+
     def collect_active_game(self, puuid: str) -> Optional[dict]:
         """Spectator-v5: current in-progress game for this player, or None if
-        they aren't in one (Riot returns 404, which _get_json maps to None)."""
+        they aren't in one (Riot returns 404, which _get_json maps to None).
+        That answer is negatively cached for a short while, since "is he in
+        game yet?" tends to get asked repeatedly."""
         try:
-            return self._get_json(f"{self.lol_url}/lol/spectator/v5/active-games/by-summoner/{puuid}")
+            return self._get_cached_json(f"{self.lol_url}/lol/spectator/v5/active-games/by-summoner/{puuid}")
         except Exception as e:
             print(f"Error collecting active game for PUUID {puuid}: {e}")
             return None
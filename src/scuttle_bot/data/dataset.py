@@ -1,22 +1,57 @@
-import time
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Callable, Optional
 
 import pandas as pd
 
-from scuttle_bot.utilities.schemas import Region, Queue, MATCH_QUEUE_IDS
+from scuttle_bot.utilities.schemas import Region, Queue, MATCH_QUEUE_IDS, LEGACY_MATCH_ID_REGION, qualify_match_id
 from scuttle_bot.data.collector import Collector
 from scuttle_bot.data.processor import Processor
+from scuttle_bot.data.pipeline import CollectionPipeline, StageConcurrency, run_pipelines
+from scuttle_bot.data.frontier import CollectionFrontier, PLAYER, MATCH, ENRICHMENT
+from scuttle_bot.data.dedup import MatchDedup
+from scuttle_bot.data.ingest import IngestWriter
 from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.infra.match_archive import MatchArchive, MATCH as ARCHIVED_MATCH
 from scuttle_bot.utilities.utilities import get_champ_to_idx
 
 MATCH_PARTICIPANTS_SCHEMA_PATH = "src/scuttle_bot/infra/match_participants_schema.sql"
 
+
+@dataclass(frozen=True)
+class CollectionOptions:
+    """How create_dataset samples and collects, the same for every region
+    of a run. See create_dataset for what each option does."""
+    queue: Queue = Queue.RANKED_SOLO_5x5
+    sample_size: int = 300
+    num_matches_per_player: int = 3
+    max_errors_in_a_row: int = 5
+    batch_size: int = 10
+    challenger_league: bool = False
+    master_league: bool = True
+    grandmaster_league: bool = False
+    stratified_sampling: bool = True
+    on_batch_committed: Optional[Callable[[], None]] = None
+    concurrency: Optional[StageConcurrency] = None
+    resumable: bool = True
+    crawl: bool = False
+    max_matches_per_player: int = 5
+    archive: Optional[MatchArchive] = None
+    archive_timelines: bool = False
+    batches_per_transaction: int = 1
+    bulk_load: bool = False
+
+
 class Dataset(DatabaseClient):
+    COLUMN_MIGRATIONS = {}
+    MIGRATED_INDEXES = {}
+
     def __init__(self, db_path: str):
         self.collector = Collector()
         self.processor = Processor(self.collector)
-        super().__init__(db_path, sql_script_path="src/scuttle_bot/infra/ml_schema.sql")
+        # Synced to S3 from its raw file (aws_client.sync_database_to_s3),
+        # so kept in rollback-journal mode rather than WAL.
+        super().__init__(db_path, sql_script_path="src/scuttle_bot/infra/ml_schema.sql", wal=False)
         self._ensure_match_participants_table()
 
     def _ensure_match_participants_table(self):
@@ -27,103 +62,158 @@ class Dataset(DatabaseClient):
         self.connection.executescript(schema)
         self.connection.commit()
 
-    def create_dataset(self, region = Region.NA, queue = Queue.RANKED_SOLO_5x5, sample_size: int = 300, num_matches_per_player: int = 3, max_errors_in_a_row: int = 5,
-                       batch_size: int = 10, challenger_league: bool = False, master_league: bool = True, grandmaster_league: bool = False, stratified_sampling: bool = True,
-                       on_batch_committed: Optional[Callable[[], None]] = None):
+    def create_dataset(self, region = Region.NA, options: Optional[CollectionOptions] = None, regions: Optional[list] = None):
         """
+        Samples players from the league lists of region and collects their
+        recent matches, as options (a CollectionOptions) says; its fields
+        are described below.
+
         on_batch_committed, if given, is called right after each batch is
         written to the local db (both the periodic BATCH_SIZE flush and the
         final leftover flush) -- e.g. to push a durable copy somewhere after
         every commit instead of only once the whole run finishes.
+
+        The sampled players are collected by a staged, concurrent pipeline
+        (see pipeline.py); concurrency sets its per-stage worker counts and
+        queue bounds.
+
+        With resumable, progress is checkpointed in the collection_frontier
+        table (see frontier.py). If a previous run left work unfinished, this
+        run finishes that first, then goes on to its own fresh sample. Work
+        that keeps failing is given up on after the frontier's max_attempts,
+        so it can't hold up later runs.
+
+        crawl turns the run into a snowball crawl: the participants of every
+        collected match join the frontier as players to crawl next, highest
+        tier and most recently seen first, and sample_size becomes the number
+        of players crawled per run (the sampled league-list players only
+        seed the crawl, whenever it has no players left to lease). A player
+        already seen in max_matches_per_player collected matches is skipped.
+        Implies resumable -- the frontier is what the crawl grows.
+
+        regions, if given, collects all of them at once (region is then
+        ignored): each gets its own league lists, sample, frontier and
+        pipeline, at sample_size players per region, and every match lands
+        in this one dataset under its region-qualified ID. Each region's
+        calls are budgeted per routing host by the shared rate limiter, so
+        regions on one match-v5 cluster share that cluster's budget.
+
+        archive, if given, keeps the raw JSON of every collected match (see
+        match_archive.py), so later feature work can reprocess it without
+        refetching; archive_timelines also fetches and keeps each match's
+        timeline, at the cost of one more match-v5 call per match.
+
+        batches_per_transaction lets the writer commit several batches at
+        once (on_batch_committed then runs per commit), and bulk_load runs
+        it under the bulk-load PRAGMA profile -- see ingest.py.
         """
-        challenger_leagues = self.collector.collect_challenger_leagues(region, queue) or {}
-        master_leagues = self.collector.collect_master_leagues(region, queue) or {}
-        grandmaster_leagues = self.collector.collect_grandmaster_leagues(region, queue) or {}
+        options = options or CollectionOptions()
+        seen_matches = self.get_seen_matches()
+        runs = []
+        for collection_region in regions or [region]:
+            run = self._prepare_region_run(collection_region, seen_matches, options)
+            if run is not None:
+                runs.append(run)
+
+        total_matches_collected = run_pipelines(runs) if runs else 0
+        for pipeline, _ in runs:
+            if pipeline.frontier is not None:
+                pipeline.frontier.close()
+        seen_matches.close()
+        print(f"Dataset creation complete. Total matches collected: {total_matches_collected}")
+
+    def _prepare_region_run(self, region: Region, seen_matches: MatchDedup, options: CollectionOptions) -> Optional[tuple]:
+        """One region's (pipeline, players) for run_pipelines, or None if
+        it has nothing to collect. See create_dataset for the options."""
+        if region == Region.NA:
+            collector, processor = self.collector, self.processor
+        else:
+            collector = Collector(region)
+            processor = Processor(collector)
+
+        challenger_leagues = collector.collect_challenger_leagues(region, options.queue) or {}
+        master_leagues = collector.collect_master_leagues(region, options.queue) or {}
+        grandmaster_leagues = collector.collect_grandmaster_leagues(region, options.queue) or {}
+        indexed = processor.set_rank_index([challenger_leagues, grandmaster_leagues, master_leagues])
+        print(f"Indexed rank data for {indexed} apex players in {region.value} from the league lists.")
 
         grouped_players = []
-        if challenger_league:
+        if options.challenger_league:
             grouped_players.append(challenger_leagues.get("entries", []))
-        if master_league:
+        if options.master_league:
             grouped_players.append(master_leagues.get("entries", []))
-        if grandmaster_league:
+        if options.grandmaster_league:
             grouped_players.append(grandmaster_leagues.get("entries", []))
 
-        if stratified_sampling:
-            random_players = self.collector.get_stratified_random_players(
+        frontier = None
+        resuming = False
+        if options.resumable or options.crawl:
+            frontier = CollectionFrontier(self.db_path, region=region)
+            frontier.reclaim()
+            frontier.reconcile_written()
+            resuming = frontier.has_unfinished()
+            # Match IDs already claimed by the interrupted run aren't in
+            # matches yet, but mustn't be claimed a second time.
+            seen_matches.add(frontier.unfinished_ids(MATCH) + frontier.unfinished_ids(ENRICHMENT))
+
+        if resuming:
+            print(f"Resuming unfinished collection in {region.value}: {frontier.counts()}")
+        if options.crawl and frontier.has_pending(PLAYER):
+            random_players = None  # the crawl's own players come first
+        elif options.stratified_sampling:
+            random_players = collector.get_stratified_random_players(
                 grouped_players=grouped_players,
-                num_players=sample_size
+                num_players=options.sample_size
             )
         else:
-            random_players = self.collector.get_random_players([player for group in grouped_players for player in group], num_players=sample_size)
+            random_players = collector.get_random_players([player for group in grouped_players for player in group], num_players=options.sample_size)
 
-        total_matches_collected = 0
-        batch = []
-        participant_batch = []
-        seen_matches = self.get_seen_matches()
-        errors_in_a_row = 0
-        BATCH_SIZE = batch_size
-
-        if random_players:
-            for i, puuid in enumerate(random_players):
-                print(f"Processing player {i+1} with PUUID: {puuid}")
-                time.sleep(1)  # To avoid hitting rate limits
-                match_history = self.collector.collect_match_history(puuid, count=num_matches_per_player, queue_id=MATCH_QUEUE_IDS.get(queue)) # list of match idss
-                time.sleep(1)
-                rank_json = self.collector.collect_ranked_stats(puuid) or {} # ranked stats for player
-                if match_history is None:
-                    continue
-                for match_id in match_history:
-                    try:
-                        shortened_match_id = match_id[4:]  # Remove "NA1_" prefix
-                        if shortened_match_id in seen_matches:
-                            print(f"Skipping duplicate match ID: {match_id}")
-                            continue
-                        seen_matches.add(shortened_match_id)
-
-                        time.sleep(2)  # To avoid hitting rate limits
-                        match_json = self.collector.collect_match_details(match_id)
-                        if match_json is None:
-                            continue
-
-                        processed_data = self.processor.process_data(match_json, rank_json)
-                        if processed_data is None:
-                            continue
-
-                        batch.append(processed_data)
-                        participant_batch.extend(self.processor.process_participants(match_json))
-                        print(f"Added match ID {match_id} to batch. Current batch size: {len(batch)}")
-                        if len(batch) >= BATCH_SIZE:
-                            print(f"Inserting batch of {len(batch)} records into the database...")
-                            self.insert_batch(batch, batch_size=BATCH_SIZE)
-                            self.insert_participant_batch(participant_batch)
-                            total_matches_collected += len(batch)
-                            batch = []
-                            participant_batch = []
-                            if on_batch_committed:
-                                on_batch_committed()
-                        errors_in_a_row = 0  # Reset error count after a successful match processing
-                    except Exception as e:
-                        print(f"\n\nError processing player with PUUID {puuid}: {e} \n Match ID: {match_id} \n\n")
-                        errors_in_a_row += 1
-                        if errors_in_a_row >= max_errors_in_a_row:
-                            print("Too many errors in a row, stopping dataset creation.")
-                            break
-                        continue
-        else:
-            print("No players found for the specified leagues and region.")
-        if batch:
-            print(f"Inserting final batch of {len(batch)} records into the database...")
-            self.insert_batch(batch, batch_size=BATCH_SIZE)
-            self.insert_participant_batch(participant_batch)
-            total_matches_collected += len(batch)
-            if on_batch_committed:
-                on_batch_committed()
-        print(f"Dataset creation complete. Total matches collected: {total_matches_collected}")
+        if frontier is not None and random_players:
+            priorities = {
+                puuid: processor.process_ranked_stats(processor.rank_index[puuid][0])
+                for puuid in random_players if puuid in processor.rank_index
+            }
+            frontier.add(PLAYER, [(puuid, None) for puuid in random_players], requeue_done=True, priorities=priorities)
+
+        if not (random_players or resuming):
+            print(f"No players found for the specified leagues in {region.value}.")
+            if frontier is not None:
+                frontier.close()
+            return None
+
+        pipeline = CollectionPipeline(
+            self,
+            seen_matches=seen_matches,
+            queue_id=MATCH_QUEUE_IDS.get(options.queue),
+            num_matches_per_player=options.num_matches_per_player,
+            batch_size=options.batch_size,
+            max_errors_in_a_row=options.max_errors_in_a_row,
+            on_batch_committed=options.on_batch_committed,
+            concurrency=options.concurrency,
+            frontier=frontier,
+            crawl=options.crawl,
+            max_players=options.sample_size if options.crawl else None,
+            max_matches_per_player=options.max_matches_per_player,
+            collector=collector,
+            processor=processor,
+            archive=options.archive,
+            archive_timelines=options.archive_timelines,
+            batches_per_transaction=options.batches_per_transaction,
+            bulk_load=options.bulk_load,
+        )
+        return pipeline, random_players
     
-    def backfill_participants(self, region_prefix: str = "NA1", limit: Optional[int] = None, max_errors_in_a_row: int = 5, batch_size: int = 10):
+    def backfill_participants(self, region_prefix: str = "NA1", limit: Optional[int] = None, max_errors_in_a_row: int = 5, batch_size: int = 10,
+                              archive: Optional[MatchArchive] = None, batches_per_transaction: int = 10, bulk_load: bool = False):
         """Collect participant info for matches already in the matches table that
-        have no rows in match_participants yet. match_ids are stored as bare
-        gameIds, so the region prefix is re-added to query the match-v5 API."""
+        have no rows in match_participants yet. Older match_ids are stored as
+        bare gameIds, so region_prefix is added to those to query the match-v5
+        API; region-qualified ones are used as they are. With an archive,
+        archived matches are read from it instead of refetched, and fetched
+        ones are archived.
+
+        Batches are committed batches_per_transaction at a time, under the
+        bulk-load PRAGMA profile if bulk_load (see ingest.py)."""
         pending = [
             row[0] for row in self.execute_query(
                 """
@@ -140,12 +230,18 @@ class Dataset(DatabaseClient):
         participant_batch = []
         total_backfilled = 0
         errors_in_a_row = 0
+        writer = self.ingest_writer(bulk_load=bulk_load)
+        batches_written = 0
 
         for i, match_id in enumerate(pending):
             try:
                 print(f"Backfilling match {i+1}/{len(pending)}: {match_id}")
-                time.sleep(1.3)  # Match the per-call pacing of process_participants (100 req / 2 min limit)
-                match_json = self.collector.collect_match_details(f"{region_prefix}_{match_id}")
+                qualified_id = qualify_match_id(match_id, Region(region_prefix.lower()))
+                match_json = archive.get(ARCHIVED_MATCH, qualified_id) if archive is not None else None
+                if match_json is None:
+                    match_json = self.collector.collect_match_details(qualified_id)
+                    if archive is not None and match_json is not None and "info" in match_json:
+                        archive.put(ARCHIVED_MATCH, qualified_id, match_json)
                 if match_json is None or "info" not in match_json:
                     print(f"Skipping match ID {match_id}: could not fetch match details.")
                     errors_in_a_row += 1
@@ -154,14 +250,20 @@ class Dataset(DatabaseClient):
                         break
                     continue
 
-                participant_batch.extend(self.processor.process_participants(match_json))
+                participants = self.processor.process_participants(match_json)
+                for row in participants:
+                    row["match_id"] = match_id  # keyed like the matches row, bare or qualified
+                participant_batch.extend(participants)
                 errors_in_a_row = 0
 
                 if len(participant_batch) >= batch_size * 10:  # 10 participants per match
                     print(f"Inserting {len(participant_batch)} participant records into the database...")
-                    self.insert_participant_batch(participant_batch)
+                    writer.write_batch([], participant_batch)
                     total_backfilled += len(participant_batch)
                     participant_batch = []
+                    batches_written += 1
+                    if batches_written % batches_per_transaction == 0:
+                        writer.commit()
             except Exception as e:
                 print(f"Error backfilling match ID {match_id}: {e}")
                 errors_in_a_row += 1
@@ -172,45 +274,50 @@ class Dataset(DatabaseClient):
 
         if participant_batch:
             print(f"Inserting final {len(participant_batch)} participant records into the database...")
-            self.insert_participant_batch(participant_batch)
+            writer.write_batch([], participant_batch)
             total_backfilled += len(participant_batch)
+        writer.close()
         print(f"Backfill complete. Total participant records inserted: {total_backfilled}")
 
-    def get_seen_matches(self):
-        return set(
-            pd.read_sql_query(
-                "SELECT match_id FROM matches",
-                self.connection
-            )["match_id"]
-        )
+    def get_seen_matches(self) -> MatchDedup:
+        """Every match ID already in the dataset, as a compact MatchDedup
+        (see dedup.py) rather than a set of strings -- bare and
+        region-qualified IDs of the same match count as one."""
+        return MatchDedup(self.db_path)
     
-    def insert_batch(self, batch: list, batch_size: int = 100):
-        df = pd.DataFrame(batch)
-        df.drop_duplicates(subset=["match_id"], inplace=True)  # Remove duplicates based on match_id
-        df.to_sql("matches", self.connection, if_exists="append", index=False, method="multi", chunksize=batch_size)
+    def ingest_writer(self, bulk_load: bool = False) -> IngestWriter:
+        """A writer for many batches in few transactions (see ingest.py),
+        over this Dataset's connection and under its writer lock."""
+        return IngestWriter(self.connection, bulk_load=bulk_load, lock=self._write_lock)
+
+    def insert_batch(self, batch: list):
+        """Inserts match rows in one transaction. Rows already present are
+        skipped by the primary key (INSERT OR IGNORE), duplicates within the
+        batch included."""
+        with self.ingest_writer() as writer:
+            writer.write_batch(batch)
 
     def insert_participant_batch(self, batch: list):
-        if not batch:
-            return
         # INSERT OR IGNORE so rows already present (e.g. from a concurrent run or
         # a batch retried after a partial failure) are skipped instead of failing
         # the whole batch on the (match_id, puuid) primary key.
-        columns = list(batch[0].keys())
-        query = (
-            f"INSERT OR IGNORE INTO match_participants ({', '.join(columns)}) "
-            f"VALUES ({', '.join('?' for _ in columns)})"
-        )
-        with self.connection:
-            self.connection.executemany(query, [[row[col] for col in columns] for row in batch])
+        with self.ingest_writer() as writer:
+            writer.write_batch([], batch)
 
-    def retrieve_dataset(self) -> pd.DataFrame:
-        query = "SELECT * FROM matches"
+    def retrieve_dataset(self, columns: Optional[list] = None) -> pd.DataFrame:
+        """The matches table, or only its columns if given. See
+        snapshot.load_table for the faster columnar path."""
+        query = f"SELECT {self._select_list(columns)} FROM matches"
         return pd.read_sql_query(query, self.connection)
 
-    def retrieve_match_participants(self) -> pd.DataFrame:
-        query = "SELECT * FROM match_participants"
+    def retrieve_match_participants(self, columns: Optional[list] = None) -> pd.DataFrame:
+        query = f"SELECT {self._select_list(columns)} FROM match_participants"
         return pd.read_sql_query(query, self.connection)
 
+    @staticmethod
+    def _select_list(columns: Optional[list]) -> str:
+        return ", ".join(f'"{column}"' for column in columns) if columns else "*"
+
     def clean_dataset(self):
         self.execute_query("DELETE FROM matches")
         self.execute_query("DELETE FROM match_participants")
@@ -230,22 +337,42 @@ class Dataset(DatabaseClient):
         print(f"Deleted {deleted} orphaned match_participants rows.")
         return deleted
 
+    def qualify_legacy_match_ids(self) -> dict:
+        """Rewrites bare-gameId match_ids in matches and match_participants
+        to their region-qualified form (see schemas.qualify_match_id), both
+        tables in one transaction, so every row is keyed the way collection
+        now writes them. A bare row whose qualified twin is already there is
+        a duplicate of it and is deleted. Returns {table: (qualified,
+        duplicates deleted)}."""
+        prefix = f"{LEGACY_MATCH_ID_REGION.value.upper()}_"
+        migrated = {}
+        with self._write_lock, self.connection:
+            for table in ("matches", "match_participants"):
+                qualified = self.connection.execute(
+                    f"UPDATE OR IGNORE {table} SET match_id = ? || match_id WHERE instr(match_id, '_') = 0", (prefix,)
+                ).rowcount
+                # What's left bare was ignored for colliding with its twin.
+                duplicates = self.connection.execute(f"DELETE FROM {table} WHERE instr(match_id, '_') = 0").rowcount
+                migrated[table] = (qualified, duplicates)
+        for table, (qualified, duplicates) in migrated.items():
+            print(f"{table}: qualified the match_id of {qualified} rows, deleted {duplicates} duplicate rows.")
+        return migrated
+
 if __name__ == "__main__":
     dataset = Dataset(db_path="src/scuttle_bot/cache/ml_dataset.db")
     """      
-    config = {
-            "region": Region.NA,
-            "queue": Queue.RANKED_SOLO_5x5,
-            "sample_size": 300,
-            "num_matches_per_player": 5,
-            "max_errors_in_a_row": 5,
-            "batch_size": 10,
-            "challenger_league": True,
-            "master_league": True,
-            "grandmaster_league": True,
-            "stratified_sampling": True
-        }
-        dataset.create_dataset(**config)
+    options = CollectionOptions(
+            queue=Queue.RANKED_SOLO_5x5,
+            sample_size=300,
+            num_matches_per_player=5,
+            max_errors_in_a_row=5,
+            batch_size=10,
+            challenger_league=True,
+            master_league=True,
+            grandmaster_league=True,
+            stratified_sampling=True,
+        )
+        dataset.create_dataset(region=Region.NA, options=options)
     """
     backfilling_config = {
         "region_prefix": "NA1",
@@ -0,0 +1,149 @@
+"""
+Which match IDs ml_dataset.db already has, without loading them all into
+pandas. get_seen_matches used to read the whole matches.match_id column into
+a DataFrame and then a set of Python strings -- at millions of rows that's
+hundreds of MB and seconds of startup before the first API call.
+
+MatchDedup instead keeps the primary key as one sorted int64 array: a match
+ID is a platform plus a numeric gameId, which packs into a single integer
+(see encode_match_id), so membership is a binary search and a whole
+matchlist is checked in one vectorized call. Bare legacy gameIds and
+region-qualified IDs encode to the same key (bare ones being NA1's, per
+schemas.qualify_match_id), so "5012345678" and "NA1_5012345678" are the same
+match here whichever form a row or a caller uses. IDs that don't fit the
+encoding fall back to an indexed point query on the primary key.
+"""
+
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+
+from scuttle_bot.utilities.schemas import Region, qualify_match_id
+
+# gameIds are ~5e9 today; 2**40 leaves plenty of headroom below the platform
+# code packed above them.
+_GAME_ID_BITS = 40
+_PLATFORM_CODES = {region.value.upper(): code for code, region in enumerate(Region, start=1)}
+
+
+def encode_match_id(match_id) -> Optional[int]:
+    """The int64 key for a bare or region-qualified match ID, or None if it
+    isn't of the PLATFORM_gameId form."""
+    platform, _, game_id = qualify_match_id(match_id).partition("_")
+    code = _PLATFORM_CODES.get(platform.upper())
+    if code is None or not game_id.isdigit():
+        return None
+    game_id = int(game_id)
+    if game_id >= 1 << _GAME_ID_BITS:
+        return None
+    return (code << _GAME_ID_BITS) | game_id
+
+
+class MatchDedup:
+    """Thread-safe set of match IDs in the dataset, plus any claimed since
+    it was loaded. Pipeline workers claim from their own threads, so the
+    point-query fallback uses a connection of its own."""
+
+    def __init__(self, db_path: str, table: str = "matches"):
+        self.db_path = db_path
+        self.table = table
+        self._lock = threading.Lock()
+        self._connection = None
+        self._added = set()  # keys claimed since load
+        self._added_unencodable = set()
+        self._keys = self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        return self._connection
+
+    def _load(self) -> np.ndarray:
+        with self._lock:
+            rows = self._connect().execute(f"SELECT match_id FROM {self.table}")
+            keys = np.fromiter(
+                (key for key in (encode_match_id(match_id) for (match_id,) in rows) if key is not None),
+                dtype=np.int64
+            )
+        keys.sort()
+        return keys
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._added) + len(self._added_unencodable)
+
+    def __contains__(self, match_id) -> bool:
+        return not self.new_ids([match_id])
+
+    def _stored_unencodable(self, match_id: str) -> bool:
+        """Point query on the primary key, for IDs the array can't hold.
+        Caller holds self._lock."""
+        bare = match_id.split("_", 1)[-1]
+        return self._connect().execute(
+            f"SELECT 1 FROM {self.table} WHERE match_id IN (?, ?) LIMIT 1", (match_id, bare)
+        ).fetchone() is not None
+
+    def _unseen_mask(self, match_ids: list) -> tuple[list, np.ndarray]:
+        """(keys, mask of match_ids not yet seen). Caller holds self._lock."""
+        keys = [encode_match_id(match_id) for match_id in match_ids]
+        encoded = np.array([key if key is not None else -1 for key in keys], dtype=np.int64)
+        positions = np.searchsorted(self._keys, encoded)
+        in_array = (positions < len(self._keys)) & (self._keys[np.minimum(positions, len(self._keys) - 1)] == encoded) \
+            if len(self._keys) else np.zeros(len(keys), dtype=bool)
+        unseen = ~in_array
+        for i, key in enumerate(keys):
+            if not unseen[i]:
+                continue
+            if key is None:
+                match_id = qualify_match_id(match_ids[i])
+                unseen[i] = match_id not in self._added_unencodable and not self._stored_unencodable(match_id)
+            else:
+                unseen[i] = key not in self._added
+        return keys, unseen
+
+    def new_ids(self, match_ids: Iterable) -> list:
+        """The match_ids (a whole matchlist at once) not in the dataset or
+        claimed yet, in their original order. Doesn't claim them."""
+        match_ids = list(match_ids)
+        if not match_ids:
+            return []
+        with self._lock:
+            _, unseen = self._unseen_mask(match_ids)
+        return [match_id for match_id, is_new in zip(match_ids, unseen) if is_new]
+
+    def claim(self, match_ids: Iterable) -> list:
+        """new_ids, additionally marking the returned ones as seen in the
+        same step -- so of two workers claiming overlapping matchlists, each
+        match goes to exactly one. Duplicates within match_ids count once."""
+        match_ids = list(match_ids)
+        if not match_ids:
+            return []
+        claimed = []
+        with self._lock:
+            keys, unseen = self._unseen_mask(match_ids)
+            for match_id, key, is_new in zip(match_ids, keys, unseen):
+                if not is_new:
+                    continue
+                if key is None:
+                    qualified = qualify_match_id(match_id)
+                    if qualified in self._added_unencodable:
+                        continue
+                    self._added_unencodable.add(qualified)
+                elif key in self._added:
+                    continue
+                else:
+                    self._added.add(key)
+                claimed.append(match_id)
+        return claimed
+
+    def add(self, match_ids: Iterable):
+        """Marks match_ids as seen without asking, e.g. IDs an interrupted
+        run had already claimed."""
+        self.claim(match_ids)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
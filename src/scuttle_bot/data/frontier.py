@@ -0,0 +1,312 @@
+"""
+Persistent work frontier for collection runs, so a run that crashes or is
+preempted (spot instances get reclaimed mid-run) picks up where it stopped
+instead of resampling players and refetching every matchlist.
+
+Every unit of pipeline work is a row in ml_dataset.db's collection_frontier
+table, keyed by (region, kind, item_id):
+
+- PLAYER: a sampled puuid whose matchlist hasn't been fetched yet.
+- MATCH: a claimed match ID whose details haven't been fetched yet; the
+  payload is the rank data discovery looked up for it.
+- ENRICHMENT: a fetched, processed match awaiting participant enrichment
+  and its write; the payload holds the processed row and the raw match JSON,
+  so resuming it costs no match-v5 call.
+
+Each row moves pending -> in_flight -> done. Leasing stamps leased_at; an
+in_flight row whose lease is older than LEASE_SECONDS is treated as
+abandoned and can be leased again. A kind's row is marked done only once the
+next kind's row exists (or, for ENRICHMENT, once the match is written), so
+work is never lost between stages -- at worst it's redone from the last
+recorded step.
+
+A step that fails -- a fetch that comes back empty, or raises -- counts an
+attempt against its row, which stays in flight for a later run to retry.
+After max_attempts the row is marked failed and never leased again, so a
+match that's gone (a 404) or a player whose matchlist can't be fetched
+doesn't come back on every run forever.
+
+PLAYER rows also carry a crawl priority (see sight_players): the tier a
+player was last seen at, then how recently, so leasing hands out the most
+valuable players first -- seeded ones as well as the ones the snowball
+crawl picks up from the participants of collected matches.
+
+Rows are scoped by region: each CollectionFrontier only sees its own
+region's, so per-region pipelines can share the table (and one db) without
+leasing each other's players. Match IDs are region-qualified, so they can't
+collide across regions either.
+"""
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.utilities.schemas import Region, LEGACY_MATCH_ID_REGION
+
+COLLECTION_FRONTIER_SCHEMA_PATH = "src/scuttle_bot/infra/collection_frontier_schema.sql"
+
+PLAYER = "player"
+MATCH = "match"
+ENRICHMENT = "enrichment"
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+# Long enough that nothing still queued inside a live run outlasts its
+# lease, short enough that work abandoned by a dead run comes back promptly.
+LEASE_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+
+
+class CollectionFrontier(DatabaseClient):
+    """One region's view of the frontier, over its own connections to the
+    dataset db. Pipeline workers record progress from their own threads;
+    every direct use of the writer connection holds self._write_lock, so a
+    lease's read-then-update can't interleave with another's."""
+
+    COLUMN_MIGRATIONS = {
+        "collection_frontier": {
+            "priority": "INTEGER NOT NULL DEFAULT 0",
+            "last_seen": "REAL",
+            "matches_seen": "INTEGER NOT NULL DEFAULT 0",
+            "region": "TEXT NOT NULL DEFAULT 'na1'",
+            "attempts": "INTEGER NOT NULL DEFAULT 0",
+        },
+    }
+    MIGRATED_INDEXES = {}
+
+    def __init__(self, db_path: str, region: Region = Region.NA, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.region = region.value
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # The dataset db is synced to S3 from its raw file, so it stays out
+        # of WAL mode (see DatabaseClient).
+        super().__init__(db_path, sql_script_path=COLLECTION_FRONTIER_SCHEMA_PATH, wal=False)
+        self._migrate_primary_key()
+        # Created here rather than in the schema file: on a frontier table
+        # from before these columns existed, the schema runs before
+        # _migrate_columns has added them.
+        self.execute_query("DROP INDEX IF EXISTS idx_collection_frontier_priority")
+        self.execute_query(
+            "CREATE INDEX IF NOT EXISTS idx_collection_frontier_lease "
+            "ON collection_frontier (region, kind, state, priority DESC, last_seen DESC)"
+        )
+
+    def _migrate_primary_key(self):
+        """Rebuilds a frontier table from before rows were keyed by region
+        too, whose (kind, item_id) key tied a puuid to the first region
+        that saw it. sqlite can't change a primary key in place, so the
+        table is recreated from the schema and its rows copied across, in
+        one transaction."""
+        columns = self.execute_query("PRAGMA table_info(collection_frontier)")
+        key = [name for _, name, _, _, _, position in sorted(columns, key=lambda column: column[5]) if position]
+        if key == ["region", "kind", "item_id"]:
+            return
+        names = ", ".join(column[1] for column in columns)
+        schema = Path(COLLECTION_FRONTIER_SCHEMA_PATH).read_text()
+        with self._write_lock:
+            try:
+                self.connection.executescript(f"""
+                    BEGIN IMMEDIATE;
+                    ALTER TABLE collection_frontier RENAME TO collection_frontier_unscoped;
+                    DROP INDEX IF EXISTS idx_collection_frontier_state;
+                    DROP INDEX IF EXISTS idx_collection_frontier_lease;
+                    DROP INDEX IF EXISTS idx_collection_frontier_priority;
+                    {schema}
+                    INSERT INTO collection_frontier ({names}) SELECT {names} FROM collection_frontier_unscoped;
+                    DROP TABLE collection_frontier_unscoped;
+                    COMMIT;
+                """)
+            except sqlite3.Error:
+                if self.connection.in_transaction:
+                    self.connection.rollback()
+                raise
+
+    def add(self, kind: str, items: list, state: str = PENDING, requeue_done: bool = False, priorities: Optional[dict] = None):
+        """items is a list of (item_id, payload), payload being anything
+        JSON-serializable (or None). Rows already on the frontier are left
+        alone -- unless requeue_done, in which case a finished or failed row
+        is reset with the new payload and no attempts (e.g. a player sampled
+        again by a later run, who will have played new games since).
+        priorities optionally maps item_id to its lease priority."""
+        if not items:
+            return
+        now = time.time()
+        priorities = priorities or {}
+        leased_at = now if state == IN_FLIGHT else None
+        conflict = (
+            "DO UPDATE SET payload = excluded.payload, state = excluded.state, leased_at = excluded.leased_at, "
+            "priority = excluded.priority, updated_at = excluded.updated_at, attempts = 0 "
+            "WHERE collection_frontier.state IN ('done', 'failed')"
+            if requeue_done else "DO NOTHING"
+        )
+        rows = [
+            (kind, item_id, self.region, None if payload is None else json.dumps(payload), state, leased_at, now, priorities.get(item_id, 0))
+            for item_id, payload in items
+        ]
+        with self._write_lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO collection_frontier (kind, item_id, region, payload, state, leased_at, updated_at, priority) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (region, kind, item_id) {conflict}",
+                rows
+            )
+
+    def sight_players(self, sightings: list, max_matches_per_player: int):
+        """Snowball crawl bookkeeping for the participants of one or more
+        collected matches. sightings is a list of (puuid, priority,
+        seen_at): priority being the tier score they played at, seen_at the
+        match's end time. A new puuid joins the frontier as a pending
+        player; a known one keeps its best priority and latest sighting.
+
+        Every sighting also counts toward matches_seen, and a still-pending
+        player seen in max_matches_per_player collected matches is dropped
+        unleased: most of their recent games are already in the dataset, so
+        their matchlist would mostly turn up duplicates. Players already
+        crawled are never requeued by a sighting."""
+        if not sightings:
+            return
+        now = time.time()
+        with self._write_lock, self.connection:
+            self.connection.executemany(
+                """
+                INSERT INTO collection_frontier (kind, item_id, region, state, updated_at, priority, last_seen, matches_seen)
+                VALUES ('player', ?, ?, 'pending', ?, ?, ?, 1)
+                ON CONFLICT (region, kind, item_id) DO UPDATE SET
+                    matches_seen = collection_frontier.matches_seen + 1,
+                    priority = max(collection_frontier.priority, excluded.priority),
+                    last_seen = max(coalesce(collection_frontier.last_seen, 0), excluded.last_seen)
+                """,
+                [(puuid, self.region, now, priority, seen_at) for puuid, priority, seen_at in sightings]
+            )
+            self.connection.execute(
+                "UPDATE collection_frontier SET state = 'done', updated_at = ? "
+                "WHERE region = ? AND kind = 'player' AND state = 'pending' AND matches_seen >= ?",
+                (now, self.region, max_matches_per_player)
+            )
+
+    def lease(self, kind: str, limit: int) -> list:
+        """Up to limit (item_id, payload) pairs of kind that are pending or
+        whose lease has expired, marked in_flight: highest priority first,
+        then most recently sighted, then oldest."""
+        now = time.time()
+        with self._write_lock, self.connection:
+            rows = self.connection.execute(
+                """
+                SELECT item_id, payload FROM collection_frontier
+                WHERE region = ? AND kind = ? AND (state = 'pending' OR (state = 'in_flight' AND leased_at < ?))
+                ORDER BY priority DESC, last_seen DESC, updated_at
+                LIMIT ?
+                """,
+                (self.region, kind, now - self.lease_seconds, limit)
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE collection_frontier SET state = 'in_flight', leased_at = ? WHERE region = ? AND kind = ? AND item_id = ?",
+                [(now, self.region, kind, item_id) for item_id, _ in rows]
+            )
+        return [(item_id, None if payload is None else json.loads(payload)) for item_id, payload in rows]
+
+    def complete(self, kind: str, item_ids: list):
+        """Marks item_ids done, dropping their payloads -- nothing reads a
+        finished row's payload, and an ENRICHMENT one is a whole match."""
+        if not item_ids:
+            return
+        now = time.time()
+        with self._write_lock, self.connection:
+            self.connection.executemany(
+                "UPDATE collection_frontier SET state = 'done', payload = NULL, leased_at = NULL, updated_at = ? "
+                "WHERE region = ? AND kind = ? AND item_id = ?",
+                [(now, self.region, kind, item_id) for item_id in item_ids]
+            )
+
+    def fail(self, kind: str, item_ids: list):
+        """Counts a failed attempt at each of item_ids. A row is left in
+        flight, for a later run to retry, until it has failed max_attempts
+        times; then it's marked failed for good."""
+        if not item_ids:
+            return
+        now = time.time()
+        with self._write_lock, self.connection:
+            self.connection.executemany(
+                "UPDATE collection_frontier SET attempts = attempts + 1, updated_at = ?, "
+                "state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE state END, "
+                "payload = CASE WHEN attempts + 1 >= ? THEN NULL ELSE payload END "
+                "WHERE region = ? AND kind = ? AND item_id = ? AND state != 'done'",
+                [(now, self.max_attempts, self.max_attempts, self.region, kind, item_id) for item_id in item_ids]
+            )
+
+    def advance(self, kind: str, item_id: str, next_kind: str, next_items: list):
+        """Records item_id's outcome as next_items of next_kind (in flight,
+        since the caller hands them straight to the next stage) and marks
+        item_id done, in one transaction -- a crash leaves either the old row
+        to redo or the new rows to continue from, never neither."""
+        now = time.time()
+        with self._write_lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO collection_frontier (kind, item_id, region, payload, state, leased_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'in_flight', ?, ?) ON CONFLICT (region, kind, item_id) DO NOTHING",
+                [(next_kind, next_id, self.region, None if payload is None else json.dumps(payload), now, now) for next_id, payload in next_items]
+            )
+            self.connection.execute(
+                "UPDATE collection_frontier SET state = 'done', payload = NULL, leased_at = NULL, updated_at = ? "
+                "WHERE region = ? AND kind = ? AND item_id = ?",
+                (now, self.region, kind, item_id)
+            )
+
+    def reclaim(self):
+        """Returns every in_flight row to pending. Only safe when no other
+        run is working this frontier -- i.e. at the start of a run, one
+        collection job per dataset db -- and lets a quick restart resume at
+        once rather than waiting out the dead run's leases."""
+        self.execute_query(
+            "UPDATE collection_frontier SET state = 'pending', leased_at = NULL WHERE region = ? AND state = 'in_flight'",
+            (self.region,)
+        )
+
+    def reconcile_written(self):
+        """Marks ENRICHMENT rows done whose match already made it into the
+        matches table -- a crash between the writer's commit and its
+        complete() call would otherwise write that match a second time.
+        Rows written before match IDs were region-qualified hold the bare
+        gameId, so for the legacy region that form is checked too."""
+        self.execute_query(
+            """
+            UPDATE collection_frontier SET state = 'done', payload = NULL, leased_at = NULL
+            WHERE region = ? AND kind = 'enrichment' AND state != 'done'
+              AND (item_id IN (SELECT match_id FROM matches)
+                   OR (region = ? AND substr(item_id, instr(item_id, '_') + 1) IN (SELECT match_id FROM matches)))
+            """,
+            (self.region, LEGACY_MATCH_ID_REGION.value)
+        )
+
+    def has_unfinished(self) -> bool:
+        """Whether any row is still to be worked -- pending or in flight,
+        failed ones not counted."""
+        return bool(self.execute_query(
+            "SELECT 1 FROM collection_frontier WHERE region = ? AND state IN ('pending', 'in_flight') LIMIT 1", (self.region,)
+        ))
+
+    def has_pending(self, kind: str) -> bool:
+        return bool(self.execute_query(
+            "SELECT 1 FROM collection_frontier WHERE region = ? AND kind = ? AND state = 'pending' LIMIT 1", (self.region, kind)
+        ))
+
+    def unfinished_ids(self, kind: str) -> list:
+        """IDs of kind's rows that aren't done -- failed ones included, so a
+        match given up on is never claimed again."""
+        return [row[0] for row in self.execute_query(
+            "SELECT item_id FROM collection_frontier WHERE region = ? AND kind = ? AND state != 'done'", (self.region, kind)
+        )]
+
+    def counts(self) -> dict:
+        """{(kind, state): rows}, for progress reporting."""
+        return {
+            (kind, state): count for kind, state, count in self.execute_query(
+                "SELECT kind, state, COUNT(*) FROM collection_frontier WHERE region = ? GROUP BY kind, state", (self.region,)
+            )
+        }
@@ -0,0 +1,207 @@
+"""
+Bulk harvest of the bot's cached matches into the ML dataset.
+
+scuttle_bot.db's matches table holds the full match-v5 JSON of every game
+the bot has looked up for someone, while ml_dataset.db only ever grew
+through fresh Riot calls. Those cached games are free training rows:
+harvest_cached_matches streams them out of the bot's db, turns each into a
+dataset row with Processor.process_data and writes the new ones -- no API
+call anywhere, so it runs as fast as the cores allow.
+
+- Only ranked solo/duo games are harvested. Rows still holding JSON text
+  are filtered by sqlite (json_extract), so other queues' never leave the
+  db; compressed rows (see DatabaseClient's payload compression) can only
+  be filtered once a worker has decompressed them.
+- Rows are read in rowid order a chunk at a time, each chunk in its own
+  short read, so the live bot is never locked out of its own db for long.
+- Each chunk's match IDs are checked against the dataset (MatchDedup)
+  before any parsing, so a rerun only processes what's new.
+- JSON parsing and process_data run in a pool of worker processes, the
+  next chunk being processed while the last one's results are written.
+- Rows are written TRANSACTION_ROWS at a time, one transaction each,
+  through an IngestWriter under its bulk-load PRAGMA profile.
+
+The bot never looked up a rank for these games, so their average_tier is
+NULL -- the feature encoder imputes it, as it does for any other missing
+rank. Participants aren't harvested (they need rank and mastery calls);
+Dataset.backfill_participants fills them in later, from the archive if one
+was given here.
+"""
+
+import json
+import multiprocessing
+import os
+import sqlite3
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+
+from scuttle_bot.data.dataset import Dataset
+from scuttle_bot.data.processor import Processor
+from scuttle_bot.infra.match_archive import MatchArchive, MATCH as ARCHIVED_MATCH
+from scuttle_bot.infra.payload_codec import PayloadCodec
+from scuttle_bot.utilities.schemas import Queue, MATCH_QUEUE_IDS
+
+BOT_DB_PATH = os.getenv("DB_PATH", "src/scuttle_bot/cache/scuttle_bot.db")
+DATASET_DB_PATH = "src/scuttle_bot/cache/ml_dataset.db"
+
+CHUNK_ROWS = 2000
+TRANSACTION_ROWS = 10000
+
+# A worker's answer for a compressed row that turned out not to be a
+# queue_id game.
+_OTHER_QUEUE = "other queue"
+
+# Set in each worker process by _init_worker.
+_processor = None
+_codec = None
+_queue_id = None
+
+
+def _payload_codec(dictionaries: list) -> PayloadCodec:
+    codec = PayloadCodec()
+    for dict_id, kind, data in dictionaries:
+        codec.add_dictionary(dict_id, kind, data)
+    return codec
+
+
+def _decode_cached_match(codec: PayloadCodec, data, dict_id: Optional[int]) -> dict:
+    return json.loads(data if dict_id is None else codec.decompress(dict_id, data))
+
+
+def _init_worker(dictionaries: list, queue_id: int):
+    global _processor, _codec, _queue_id
+    _processor = Processor()
+    _codec = _payload_codec(dictionaries)
+    _queue_id = queue_id
+
+
+def _process_cached_match(row: tuple) -> tuple:
+    """(match_id, dataset row, None, or _OTHER_QUEUE) for one (match_id,
+    data, dict_id) row of the bot's matches table. Runs in a worker
+    process."""
+    match_id, data, dict_id = row
+    try:
+        match = _decode_cached_match(_codec, data, dict_id)
+        if match["info"].get("queueId") != _queue_id:
+            return match_id, _OTHER_QUEUE
+        return match_id, _processor.process_data(match, [])
+    except Exception:
+        # Remakes and other malformed games (no team positions, missing
+        # teams) can't make a dataset row; they're counted, not fatal.
+        return match_id, None
+
+
+def _cached_chunks(source: sqlite3.Connection, queue_id: int, chunk_rows: int) -> Iterator[list]:
+    """(match_id, data, dict_id) rows of the bot's matches table that are,
+    or (compressed) may be, queue_id games, chunk_rows at a time."""
+    columns = {row[1] for row in source.execute("PRAGMA table_info(matches)")}
+    # A db the bot hasn't run against since compression came in has no
+    # dict_id column yet: all of its rows are JSON text.
+    dict_id = "dict_id" if "dict_id" in columns else "NULL"
+    after_rowid = 0
+    while True:
+        rows = source.execute(
+            f"""
+            SELECT rowid, match_id, data, {dict_id} FROM matches
+            WHERE rowid > ? AND ({dict_id} IS NOT NULL
+                OR CASE WHEN json_valid(data) THEN json_extract(data, '$.info.queueId') END = ?)
+            ORDER BY rowid LIMIT ?
+            """,
+            (after_rowid, queue_id, chunk_rows)
+        ).fetchall()
+        if not rows:
+            return
+        after_rowid = rows[-1][0]
+        yield [row[1:] for row in rows]
+
+
+def _dictionaries(source: sqlite3.Connection) -> list:
+    """(dict_id, kind, data) of every payload dictionary in the bot's db."""
+    if not source.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'payload_dictionaries'").fetchone():
+        return []
+    return source.execute("SELECT dict_id, kind, data FROM payload_dictionaries").fetchall()
+
+
+def harvest_cached_matches(dataset: Dataset, source_db_path: str = BOT_DB_PATH, workers: Optional[int] = None,
+                           chunk_rows: int = CHUNK_ROWS, transaction_rows: int = TRANSACTION_ROWS,
+                           archive: Optional[MatchArchive] = None) -> int:
+    """Writes every ranked solo/duo match cached in source_db_path that the
+    dataset doesn't have yet, processed by workers processes (default: one
+    per core). With an archive, each harvested match's raw JSON is archived
+    too. Returns how many matches were written."""
+    workers = workers or os.cpu_count() or 1
+    queue_id = MATCH_QUEUE_IDS[Queue.RANKED_SOLO_5x5]
+    seen_matches = dataset.get_seen_matches()
+    # Read-only, so a harvest can never write to the bot's db.
+    source = sqlite3.connect(f"file:{source_db_path}?mode=ro", uri=True, timeout=30)
+    dictionaries = _dictionaries(source)
+    codec = _payload_codec(dictionaries)
+
+    scanned = duplicates = other_queue = failed = written = 0
+    pending = []  # (match_id, dataset row)
+    raw_payloads = {}  # match_id -> (data, dict_id) as cached, kept for the archive
+
+    writer = dataset.ingest_writer(bulk_load=True)
+
+    def write(entries: list):
+        nonlocal written
+        if archive is not None:
+            archive.put_many(ARCHIVED_MATCH, [
+                (match_id, _decode_cached_match(codec, *raw_payloads.pop(match_id))) for match_id, _ in entries
+            ])
+        writer.write_batch([row for _, row in entries])
+        writer.commit()
+        written += len(entries)
+        print(f"Harvested {written} matches so far ({scanned} cached games scanned)...")
+
+    def collect(results: list):
+        nonlocal failed, other_queue
+        for match_id, processed in results:
+            if processed == _OTHER_QUEUE:  # a string once pickled back, so not "is"
+                other_queue += 1
+                raw_payloads.pop(match_id, None)
+            elif processed is None:
+                failed += 1
+                raw_payloads.pop(match_id, None)
+            else:
+                pending.append((match_id, processed))
+        while len(pending) >= transaction_rows:
+            write(pending[:transaction_rows])
+            del pending[:transaction_rows]
+
+    try:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(dictionaries, queue_id)) as pool:
+            in_flight = None
+            for chunk in _cached_chunks(source, queue_id, chunk_rows):
+                scanned += len(chunk)
+                new_ids = set(seen_matches.claim(match_id for match_id, _, _ in chunk))
+                duplicates += len(chunk) - len(new_ids)
+                chunk = [row for row in chunk if row[0] in new_ids]
+                if archive is not None:
+                    raw_payloads.update((match_id, (data, dict_id)) for match_id, data, dict_id in chunk)
+                # Submit this chunk before writing the last one's results,
+                # so the workers are busy while the writer is.
+                next_in_flight = pool.map_async(_process_cached_match, chunk, chunksize=max(1, len(chunk) // (workers * 4)))
+                if in_flight is not None:
+                    collect(in_flight.get())
+                in_flight = next_in_flight
+            if in_flight is not None:
+                collect(in_flight.get())
+        if pending:
+            write(pending)
+    finally:
+        writer.close()
+        source.close()
+        seen_matches.close()
+
+    print(
+        f"Harvest complete: {written} new matches written from {scanned} cached games "
+        f"({duplicates} already in the dataset, {other_queue} from other queues, {failed} unprocessable)."
+    )
+    return written
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    harvest_cached_matches(Dataset(db_path=DATASET_DB_PATH), archive=MatchArchive())
@@ -0,0 +1,157 @@
+"""
+Bulk writer for the dataset's matches and match_participants tables.
+
+Rows used to go in through DataFrame.to_sql (building a DataFrame and
+dropping duplicates on every batch) and a participant insert that rebuilt
+its column list per batch, each batch its own transaction. That was fine at
+ten matches a batch; reprocessing millions of archived or harvested matches,
+the per-row and per-commit overhead is most of the run.
+
+IngestWriter keeps one INSERT OR IGNORE statement per table, built once from
+the table's columns -- the connection's statement cache then reuses the
+prepared statement for every batch -- and lets many batches share one
+transaction, committed when the caller chooses. Duplicates are the schema's
+job: both tables have primary keys, so a row already present is skipped by
+the insert itself. Each batch goes in under a savepoint, so a batch that
+fails rolls back alone without taking the rest of the open transaction with
+it.
+
+With bulk_load, the connection also runs under BULK_LOAD_PRAGMAS for the
+writer's lifetime: no fsync per commit, a large page cache, and a cap on the
+journal file left behind. That trades durability against an OS crash or
+power loss (not a process crash) for speed -- right for a harvest or
+backfill that can simply be rerun, and for collection only when its db is
+being synced to S3 anyway.
+"""
+
+import sqlite3
+import threading
+from typing import Optional
+
+MATCHES_TABLE = "matches"
+PARTICIPANTS_TABLE = "match_participants"
+
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": -256 * 1024,  # KiB, i.e. 256 MiB
+    "journal_size_limit": 64 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+class IngestWriter:
+    """Writes batches of processed match rows (Processor.process_data) and
+    participant rows (Processor.process_participants) over connection,
+    which it shares with its owner (the Dataset). Nothing is committed
+    until commit(), or leaving a with block without an exception.
+
+    lock is the owner's writer lock (DatabaseClient._write_lock). It's
+    held from the first batch of a transaction until that transaction's
+    commit or rollback, so no other thread's write lands in -- or commits
+    -- the open transaction; use the writer from one thread, as an RLock
+    is released by the thread that took it."""
+
+    def __init__(self, connection: sqlite3.Connection, bulk_load: bool = False, lock: Optional[threading.RLock] = None):
+        self.connection = connection
+        self._lock = lock or threading.RLock()
+        self._locked = False
+        self._statements = {}  # table -> (columns, INSERT statement)
+        self._restore_pragmas = {}
+        self.pending_matches = 0
+        if bulk_load:
+            self._apply_pragmas(BULK_LOAD_PRAGMAS)
+
+    def _apply_pragmas(self, pragmas: dict):
+        with self._lock:
+            # synchronous can't change inside a transaction.
+            if self.connection.in_transaction:
+                self.connection.commit()
+            for pragma, value in pragmas.items():
+                self._restore_pragmas[pragma] = self.connection.execute(f"PRAGMA {pragma}").fetchone()[0]
+                self.connection.execute(f"PRAGMA {pragma} = {value}")
+
+    def _begin(self):
+        self._lock.acquire()
+        self._locked = True
+        if not self.connection.in_transaction:
+            # IMMEDIATE takes the write lock up front, waiting out other
+            # writers (the frontier's) under busy_timeout. A deferred
+            # transaction that reads the schema first would instead get
+            # "database is locked" at once on upgrading its read lock, if
+            # another writer is committing.
+            self.connection.execute("BEGIN IMMEDIATE")
+
+    def _end(self):
+        if self._locked:
+            self._locked = False
+            self._lock.release()
+
+    def _statement(self, table: str) -> tuple:
+        if table not in self._statements:
+            columns = [row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")]
+            quoted = ", ".join(f'"{column}"' for column in columns)
+            placeholders = ", ".join("?" for _ in columns)
+            self._statements[table] = (columns, f"INSERT OR IGNORE INTO {table} ({quoted}) VALUES ({placeholders})")
+        return self._statements[table]
+
+    def _insert(self, table: str, rows: list) -> int:
+        if not rows:
+            return 0
+        columns, statement = self._statement(table)
+        unknown = rows[0].keys() - set(columns)
+        if unknown:
+            # A processor field with no column to go in (a schema change
+            # without its migration) -- refuse rather than drop it silently.
+            raise ValueError(f"{table} has no column(s) {sorted(unknown)}")
+        before = self.connection.total_changes
+        self.connection.executemany(statement, [tuple(row.get(column) for column in columns) for row in rows])
+        return self.connection.total_changes - before
+
+    def write_batch(self, matches: list, participants: Optional[list] = None) -> int:
+        """Inserts one batch of match rows and their participant rows into
+        the open transaction (starting one if needed), all or nothing.
+        Returns how many match rows were new."""
+        if not self._locked:
+            self._begin()
+        self.connection.execute("SAVEPOINT ingest_batch")
+        try:
+            inserted = self._insert(MATCHES_TABLE, matches)
+            self._insert(PARTICIPANTS_TABLE, participants or [])
+        except BaseException:
+            self.connection.execute("ROLLBACK TO ingest_batch")
+            self.connection.execute("RELEASE ingest_batch")
+            raise
+        self.connection.execute("RELEASE ingest_batch")
+        self.pending_matches += len(matches)
+        return inserted
+
+    def commit(self):
+        try:
+            self.connection.commit()
+        finally:
+            self._end()
+        self.pending_matches = 0
+
+    def rollback(self):
+        try:
+            self.connection.rollback()
+        finally:
+            self._end()
+        self.pending_matches = 0
+
+    def close(self):
+        """Commits anything pending and restores the connection's own
+        PRAGMAs."""
+        self.commit()
+        with self._lock:
+            for pragma, value in self._restore_pragmas.items():
+                self.connection.execute(f"PRAGMA {pragma} = {value}")
+        self._restore_pragmas = {}
+
+    def __enter__(self) -> "IngestWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.rollback()
+        self.close()
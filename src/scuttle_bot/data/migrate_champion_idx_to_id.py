@@ -55,7 +55,7 @@ def migrate(db_path: str = "src/scuttle_bot/cache/ml_dataset.db"):
     query = f"UPDATE matches SET {set_clause} WHERE match_id = ?"
 
     with dataset.connection:
-        dataset.cursor.executemany(query, updates)
+        dataset.connection.executemany(query, updates)
 
     print(f"Migrated {len(updates)} rows: champion indices -> champion ids.")
 
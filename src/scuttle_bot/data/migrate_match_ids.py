@@ -0,0 +1,18 @@
+import argparse
+
+from scuttle_bot.data.dataset import Dataset
+
+
+def migrate(db_path: str = "src/scuttle_bot/cache/ml_dataset.db"):
+    dataset = Dataset(db_path=db_path)
+    dataset.qualify_legacy_match_ids()
+    dataset.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="One-time migration: rewrite bare gameId match_ids in ml_dataset.db to region-qualified match IDs."
+    )
+    parser.add_argument("--db-path", default="src/scuttle_bot/cache/ml_dataset.db")
+    args = parser.parse_args()
+    migrate(args.db_path)
@@ -0,0 +1,496 @@
+"""
+Staged, concurrent collection behind Dataset.create_dataset.
+
+The original loop was strictly serial -- sample a player, fetch their match
+history and rank, then per match fetch details, enrich ~10 participants and
+insert -- so a run's wall time was the sum of every round trip, and most of
+the API quota went unused while one request at a time was in the air. Here
+the same work runs as five stages joined by bounded queues:
+
+    player sampling -> match-ID discovery -> match detail fetch
+        -> participant enrichment -> writer
+
+Each fetching stage has its own pool of worker threads (StageConcurrency).
+They all call Riot through riot_get and so draw from the one process-wide
+rate limiter, which makes the quota -- not latency -- the bottleneck. Queues
+are bounded, so once a stage falls behind, the one feeding it blocks on
+put() instead of piling up match payloads in memory: a run's footprint stays
+flat however many players it samples. Only the writer touches the database,
+and it runs on the thread that called run(), the one that owns the Dataset's
+sqlite connection.
+
+Given a CollectionFrontier, every step is also recorded there as it
+completes, and run() starts by draining whatever a previous, interrupted run
+left unfinished -- each item re-entering the pipeline at the stage it had
+reached -- before leasing fresh players. A failed step (an empty fetch,
+or an exception in a stage or the writer) is counted against its frontier
+row (CollectionFrontier.fail) rather than retried inline.
+
+In crawl mode the frontier also grows as the run goes: every written
+match's participants are sighted onto it (CollectionFrontier.sight_players),
+so match details already paid for keep supplying new players to crawl,
+highest tier and most recently seen first.
+
+run_pipelines runs several pipelines at once into one writer -- one per
+region for multi-region collection. Each region's pipeline has its own
+Collector (so its own platform host) and its own stage threads, so a region
+waiting out its budget never stalls another's workers; budgets themselves
+are the rate limiter's, which keys them by routing host, so regions on the
+same match-v5 cluster (e.g. EUW1 and EUN1 on europe) draw from that
+cluster's one budget while their platform calls are budgeted separately.
+"""
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from scuttle_bot.data.frontier import CollectionFrontier, PLAYER, MATCH, ENRICHMENT
+from scuttle_bot.data.dedup import MatchDedup
+from scuttle_bot.data.ingest import IngestWriter
+from scuttle_bot.infra.match_archive import MatchArchive, MATCH as ARCHIVED_MATCH, TIMELINE as ARCHIVED_TIMELINE
+
+# In crawl mode the writer flushes a partial batch after this long without
+# a new match, so the sightings in it reach the frontier while the sampler
+# is waiting on them for more players to lease.
+CRAWL_IDLE_FLUSH_SECONDS = 1.0
+
+# End-of-stream marker. A stage sends one per downstream worker once its
+# last worker has finished, so every consumer sees exactly one.
+_DONE = object()
+
+# The frontier kind of the items each stage (and the writer) works on.
+_STAGE_KINDS = {"discovery": PLAYER, "detail": MATCH, "enrichment": ENRICHMENT, "writer": ENRICHMENT}
+
+
+class _Resumed:
+    """Frontier work re-entering the pipeline part-way through: every
+    stage before stage passes it along untouched."""
+    __slots__ = ("stage", "item")
+
+    def __init__(self, stage: str, item):
+        self.stage = stage
+        self.item = item
+
+
+@dataclass(frozen=True)
+class StageConcurrency:
+    """Worker threads per stage, plus how many items each queue between
+    stages holds before its producer blocks. Enrichment does most of the
+    calls (ranked stats and mastery for every participant), so it gets the
+    most workers; more workers than the quota can keep busy only means more
+    threads parked in the rate limiter."""
+    discovery_workers: int = 2
+    detail_workers: int = 4
+    enrichment_workers: int = 8
+    queue_size: int = 32
+
+
+class _Stage:
+    """A pool of threads applying handle to each item of inbox and putting
+    everything it returns on outbox."""
+
+    def __init__(self, pipeline: "CollectionPipeline", name: str, handle: Callable[[object], list],
+                 workers: int, inbox: queue.Queue, outbox: queue.Queue, downstream_workers: int):
+        self.pipeline = pipeline
+        self.name = name
+        self.handle = handle
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.downstream_workers = downstream_workers
+        self._remaining = workers
+        self._lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"collect-{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                break
+            # Once stopped, keep draining the inbox (so upstream puts never
+            # block forever) but do no more work.
+            if self.pipeline.stopped.is_set():
+                self.pipeline.track(-1)
+                continue
+            if isinstance(item, _Resumed):
+                if item.stage != self.name:
+                    self.outbox.put(item)
+                    continue
+                item = item.item
+            try:
+                results = self.handle(item)
+            except Exception as e:
+                self.pipeline.record_error(self.name, item, e)
+                self.pipeline.track(-1)
+                continue
+            self.pipeline.track(len(results) - 1)
+            for result in results:
+                self.outbox.put(result)
+            self.pipeline.record_success()
+
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            for _ in range(self.downstream_workers):
+                self.outbox.put(_DONE)
+
+
+class CollectionPipeline:
+    """One collection run in one region. dataset supplies the insert
+    methods, and the collector and processor unless given; seen_matches
+    (a MatchDedup, shareable between regions' pipelines) records each match
+    ID as it's claimed, so no two workers fetch the same match. With a
+    frontier, players are leased from it rather than passed to run(), and
+    progress is recorded back to it.
+
+    crawl (frontier required) sights every written match's participants
+    onto the frontier; max_players caps how many players this run leases,
+    and max_matches_per_player is sight_players' cut-off.
+
+    With an archive, the writer also keeps each written match's raw JSON
+    there (see match_archive.py) -- and its timeline, fetched by the
+    enrichment stage, if archive_timelines.
+
+    The writer commits every batches_per_transaction batches of batch_size
+    matches, under the bulk-load PRAGMA profile if bulk_load (see
+    ingest.py) -- and before it would block waiting for more, so its write
+    transaction is never left open while the fetch stages are recording
+    their own progress on the frontier. Frontier progress and
+    on_batch_committed follow each commit."""
+
+    def __init__(self, dataset, seen_matches: MatchDedup, queue_id: Optional[int] = None, num_matches_per_player: int = 3,
+                 batch_size: int = 10, max_errors_in_a_row: int = 5,
+                 on_batch_committed: Optional[Callable[[], None]] = None,
+                 concurrency: Optional[StageConcurrency] = None, frontier: Optional[CollectionFrontier] = None,
+                 crawl: bool = False, max_players: Optional[int] = None, max_matches_per_player: int = 5,
+                 collector=None, processor=None, archive: Optional[MatchArchive] = None, archive_timelines: bool = False,
+                 batches_per_transaction: int = 1, bulk_load: bool = False):
+        self.dataset = dataset
+        self.collector = collector or dataset.collector
+        self.processor = processor or dataset.processor
+        self.seen_matches = seen_matches
+        self.queue_id = queue_id
+        self.num_matches_per_player = num_matches_per_player
+        self.batch_size = batch_size
+        self.max_errors_in_a_row = max_errors_in_a_row
+        self.on_batch_committed = on_batch_committed
+        self.concurrency = concurrency or StageConcurrency()
+        self.frontier = frontier
+        if crawl and frontier is None:
+            raise ValueError("Crawling requires a CollectionFrontier to queue sighted players on.")
+        self.crawl = crawl
+        self.max_players = max_players
+        self.max_matches_per_player = max_matches_per_player
+        self.archive = archive
+        self.archive_timelines = archive_timelines and archive is not None
+        self.batches_per_transaction = batches_per_transaction
+        self.bulk_load = bulk_load
+
+        self.stopped = threading.Event()
+        # Items somewhere between the sampler and a committed write.
+        self._outstanding = 0
+        self._progress = threading.Condition()
+        self._errors_lock = threading.Lock()
+        self._errors_in_a_row = 0
+
+    def track(self, delta: int):
+        with self._progress:
+            self._outstanding += delta
+            self._progress.notify_all()
+
+    def _wait_for_progress(self) -> bool:
+        """Blocks until in-flight work moves (a stage finishing an item,
+        the writer committing a batch); False if nothing is in flight, i.e.
+        no more sightings can arrive."""
+        with self._progress:
+            if self._outstanding <= 0 or self.stopped.is_set():
+                return False
+            self._progress.wait(timeout=CRAWL_IDLE_FLUSH_SECONDS)
+            return True
+
+    def record_success(self):
+        with self._errors_lock:
+            self._errors_in_a_row = 0
+
+    def record_error(self, stage: str, item, error: Exception):
+        """item is what stage failed on -- for the writer, a list of match
+        IDs."""
+        print(f"\n\nError in {stage} stage: {error} \n Item: {item if isinstance(item, str) else item[0]} \n\n")
+        item_ids = item if isinstance(item, list) else [item if isinstance(item, str) else item[0]]
+        self._fail(_STAGE_KINDS[stage], item_ids)
+        with self._errors_lock:
+            self._errors_in_a_row += 1
+            if self._errors_in_a_row >= self.max_errors_in_a_row and not self.stopped.is_set():
+                print("Too many errors in a row, stopping dataset creation.")
+                self.stopped.set()
+
+    def _fail(self, kind: str, item_ids: list):
+        if self.frontier is None:
+            return
+        try:
+            self.frontier.fail(kind, item_ids)
+        except Exception as e:
+            print(f"Error recording failed {kind} items {item_ids} on the frontier: {e}")
+
+    def _discover(self, puuid: str) -> list:
+        match_history = self.collector.collect_match_history(puuid, count=self.num_matches_per_player, queue_id=self.queue_id)
+        if match_history is None:
+            self._fail(PLAYER, [puuid])
+            return []
+        new_match_ids = self.seen_matches.claim(match_history)
+        rank_json = (self.processor.lookup_ranked_stats(puuid) or {}) if new_match_ids else {}
+        discovered = [(match_id, rank_json) for match_id in new_match_ids]
+        if self.frontier is not None:
+            self.frontier.advance(PLAYER, puuid, MATCH, discovered)
+        return discovered
+
+    def _fetch_details(self, item: tuple) -> list:
+        match_id, rank_json = item
+        match_json = self.collector.collect_match_details(match_id)
+        if match_json is None:
+            self._fail(MATCH, [match_id])
+            return []
+        processed_data = self.processor.process_data(match_json, rank_json)
+        if processed_data is None:
+            if self.frontier is not None:
+                self.frontier.complete(MATCH, [match_id])
+            return []
+        if self.frontier is not None:
+            self.frontier.advance(MATCH, match_id, ENRICHMENT, [(match_id, {"processed": processed_data, "match": match_json})])
+        return [(match_id, processed_data, match_json)]
+
+    def _enrich(self, item: tuple) -> list:
+        match_id, processed_data, match_json = item
+        participants = self.processor.process_participants(match_json)
+        sightings = self._sightings(match_json, participants) if self.crawl else []
+        timeline = self.collector.collect_match_timeline(match_id) if self.archive_timelines else None
+        raw = (match_json, timeline) if self.archive is not None else None
+        return [(self, match_id, processed_data, participants, sightings, raw)]
+
+    def _sightings(self, match_json: dict, participants: list) -> list:
+        """(puuid, tier score, match end time in seconds) per participant,
+        for CollectionFrontier.sight_players."""
+        info = match_json["info"]
+        seen_at = (info.get("gameEndTimestamp") or info.get("gameCreation") or 0) / 1000
+        return [
+            (row["puuid"], self.processor.process_ranked_stats({"tier": row["tier"] or "IRON", "rank": row["rank"]}), seen_at)
+            for row in participants
+        ]
+
+    def _frontier_backlog(self):
+        """Unfinished work from the frontier, furthest-along first (so
+        already-paid-for match payloads are written before anything new is
+        fetched), then its players, leased a queue's worth at a time."""
+        chunk = self.concurrency.queue_size
+        while leased := self.frontier.lease(ENRICHMENT, chunk):
+            for match_id, payload in leased:
+                yield _Resumed("enrichment", (match_id, payload["processed"], payload["match"]))
+        while leased := self.frontier.lease(MATCH, chunk):
+            for match_id, rank_json in leased:
+                yield _Resumed("detail", (match_id, rank_json or {}))
+        remaining = self.max_players
+        while remaining is None or remaining > 0:
+            leased = self.frontier.lease(PLAYER, chunk if remaining is None else min(chunk, remaining))
+            if not leased:
+                # Out of players for now; while crawling, matches still in
+                # flight will sight more.
+                if self.crawl and self._wait_for_progress():
+                    continue
+                break
+            for puuid, _ in leased:
+                yield puuid
+            if remaining is not None:
+                remaining -= len(leased)
+
+    def _sample(self, players: Optional[Iterable[str]], outbox: queue.Queue):
+        source = self._frontier_backlog() if self.frontier is not None else players
+        for item in source:
+            if self.stopped.is_set():
+                break
+            self.track(1)
+            outbox.put(item)
+        for _ in range(self.concurrency.discovery_workers):
+            outbox.put(_DONE)
+
+    def start(self, players: Optional[Iterable[str]], write_queue: queue.Queue) -> list:
+        """Starts the sampler and fetching stages, the last of them feeding
+        write_queue (followed by one _DONE once drained); returns their
+        threads."""
+        c = self.concurrency
+        player_queue = queue.Queue(maxsize=c.queue_size)
+        match_id_queue = queue.Queue(maxsize=c.queue_size)
+        detail_queue = queue.Queue(maxsize=c.queue_size)
+
+        stages = [
+            _Stage(self, "discovery", self._discover, c.discovery_workers, player_queue, match_id_queue, c.detail_workers),
+            _Stage(self, "detail", self._fetch_details, c.detail_workers, match_id_queue, detail_queue, c.enrichment_workers),
+            _Stage(self, "enrichment", self._enrich, c.enrichment_workers, detail_queue, write_queue, 1),
+        ]
+        sampler = threading.Thread(target=self._sample, args=(players, player_queue), name="collect-sampling", daemon=True)
+        sampler.start()
+        for stage in stages:
+            stage.start()
+        return [sampler] + [thread for stage in stages for thread in stage.threads]
+
+    def run(self, players: Optional[Iterable[str]] = None) -> int:
+        """Collects every player's new matches -- players, or the
+        frontier's backlog if there is a frontier -- and returns how many
+        were written. Blocks until all stages have drained."""
+        return run_pipelines([(self, players)])
+
+
+def _archive(entries: list):
+    """Archives the raw payloads of a batch's entries, per pipeline's
+    archive. Goes before the dataset write: archiving is idempotent, so a
+    crash in between only means archiving the batch again on resume. A
+    failure is only logged -- the dataset row matters more than its raw
+    copy."""
+    by_archive = {}
+    for pipeline, match_id, _, _, _, raw in entries:
+        if pipeline.archive is None:
+            continue
+        matches, timelines = by_archive.setdefault(pipeline.archive, ([], []))
+        match_json, timeline = raw
+        matches.append((match_id, match_json))
+        if timeline is not None:
+            timelines.append((match_id, timeline))
+    for archive, (matches, timelines) in by_archive.items():
+        try:
+            archive.put_many(ARCHIVED_MATCH, matches)
+            archive.put_many(ARCHIVED_TIMELINE, timelines)
+        except Exception as e:
+            print(f"Error archiving raw payloads for {len(matches)} matches: {e}")
+
+
+def _write(writer: IngestWriter, entries: list) -> Optional[Exception]:
+    """Writes one batch of (pipeline, match_id, processed_data,
+    participants, sightings, raw payloads) entries into the writer's open
+    transaction, all or nothing. Returns the error if the batch failed --
+    for the caller to record once the transaction is over."""
+    print(f"Inserting batch of {len(entries)} records into the database...")
+    _archive(entries)
+    try:
+        writer.write_batch([entry[2] for entry in entries], [row for entry in entries for row in entry[3]])
+    except Exception as e:
+        return e
+    return None
+
+
+def _record_write_error(entries: list, error: Exception):
+    by_pipeline = {}
+    for entry in entries:
+        by_pipeline.setdefault(entry[0], []).append(entry[1])
+    for pipeline, match_ids in by_pipeline.items():
+        pipeline.record_error("writer", match_ids, error)
+
+
+def _commit(writer: IngestWriter, entries: list) -> int:
+    """Commits the writer's transaction, holding every entry written since
+    the last commit, then records them on each entry's pipeline's frontier.
+    Returns how many matches were committed."""
+    lead = entries[0][0]
+    try:
+        writer.commit()
+    except Exception as e:
+        writer.rollback()
+        _record_write_error(entries, e)
+        return 0
+
+    by_pipeline = {}
+    for pipeline, match_id, _, _, sightings, _ in entries:
+        match_ids, pipeline_sightings = by_pipeline.setdefault(pipeline, ([], []))
+        match_ids.append(match_id)
+        pipeline_sightings.extend(sightings)
+    for pipeline, (match_ids, sightings) in by_pipeline.items():
+        if pipeline.frontier is not None:
+            pipeline.frontier.complete(ENRICHMENT, match_ids)
+        if pipeline.crawl:
+            pipeline.frontier.sight_players(sightings, pipeline.max_matches_per_player)
+    if lead.on_batch_committed:
+        lead.on_batch_committed()
+    return len(entries)
+
+
+def _settle(entries: list):
+    """Takes entries off their pipelines' in-flight counts."""
+    for pipeline in {entry[0] for entry in entries}:
+        pipeline.track(-sum(1 for entry in entries if entry[0] is pipeline))
+
+
+def run_pipelines(runs: list) -> int:
+    """Runs (pipeline, players) pairs concurrently -- e.g. one per region --
+    with every written match going through one writer on the calling
+    thread, which must own the pipelines' Dataset connection. Batching and
+    on_batch_committed follow the first pipeline's settings. Returns how
+    many matches were written; blocks until every pipeline has drained."""
+    pipelines = [pipeline for pipeline, _ in runs]
+    lead = pipelines[0]
+    crawling = any(pipeline.crawl for pipeline in pipelines)
+    write_queue = queue.Queue(maxsize=lead.concurrency.queue_size * len(runs))
+    threads = []
+    for pipeline, players in runs:
+        threads.extend(pipeline.start(players, write_queue))
+
+    writer = lead.dataset.ingest_writer(bulk_load=lead.bulk_load)
+    total_matches_collected = 0
+    running = len(runs)
+    batch = []
+    uncommitted = []  # written into the open transaction, not yet committed
+    batches_in_transaction = 0
+
+    def commit():
+        nonlocal total_matches_collected, uncommitted, batches_in_transaction
+        total_matches_collected += _commit(writer, uncommitted)
+        # Only settled once committed, so a crawl doesn't run dry while its
+        # latest sightings are still uncommitted.
+        _settle(uncommitted)
+        uncommitted = []
+        batches_in_transaction = 0
+
+    while running:
+        if uncommitted and write_queue.empty():
+            # Nothing to write for now: commit rather than hold the write
+            # lock on the dataset db while waiting, which would lock out the
+            # fetch workers' frontier updates on that same file.
+            commit()
+        try:
+            item = write_queue.get(timeout=CRAWL_IDLE_FLUSH_SECONDS if crawling else None)
+        except queue.Empty:
+            item = None  # idle while crawling: commit what's there
+        if item is _DONE:
+            running -= 1
+        elif item is not None:
+            batch.append(item)
+            print(f"Added match ID {item[1]} to batch. Current batch size: {len(batch)}")
+        idle_or_done = item is None or not running
+        if batch and (idle_or_done or len(batch) >= lead.batch_size):
+            error = _write(writer, batch)
+            if error is None:
+                uncommitted.extend(batch)
+                batches_in_transaction += 1
+            else:
+                # End the transaction, keeping the batches already in it,
+                # before recording the failure: the frontier's update would
+                # otherwise wait on this connection's own write lock.
+                if uncommitted:
+                    commit()
+                else:
+                    writer.commit()
+                _record_write_error(batch, error)
+                _settle(batch)
+            batch = []
+        if uncommitted and (idle_or_done or batches_in_transaction >= lead.batches_per_transaction):
+            commit()
+
+    writer.close()
+    for thread in threads:
+        thread.join()
+    return total_matches_collected
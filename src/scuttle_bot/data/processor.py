@@ -1,5 +1,4 @@
 import re
-import time
 from typing import Optional
 
 from scuttle_bot.utilities.schemas import Region, Queue
@@ -7,6 +6,49 @@ from scuttle_bot.utilities.schemas import Region, Queue
 class Processor:
     def __init__(self, collector=None):
         self.collector = collector
+        self.rank_index = {}
+
+    def set_rank_index(self, leagues: list) -> int:
+        """Indexes the league-v4 apex league lists (challenger/grandmaster/
+        master payloads) a collection run already downloaded, by puuid, in
+        the same entry shape collect_ranked_stats returns. Every entry
+        carries tier, rank, LP, wins and losses, so a participant found here
+        needs no league-v4 call of their own -- in apex collection that's
+        most of them. Replaces any previous index; returns its size."""
+        self.rank_index = {}
+        for league in leagues:
+            if not league:
+                continue
+            for entry in league.get("entries", []):
+                puuid = entry.get("puuid")
+                if puuid is None:
+                    continue
+                self.rank_index[puuid] = [{
+                    "queueType": league.get("queue"),
+                    "tier": league.get("tier"),
+                    "rank": entry.get("rank"),
+                    "leaguePoints": entry.get("leaguePoints"),
+                    "wins": entry.get("wins", 0),
+                    "losses": entry.get("losses", 0),
+                }]
+        return len(self.rank_index)
+
+    def lookup_ranked_stats(self, puuid: str) -> Optional[list]:
+        """League entries for puuid, from the rank index if present, else
+        from the collector (one league-v4 call, itself cached)."""
+        if puuid in self.rank_index:
+            return self.rank_index[puuid]
+        return self.collector.collect_ranked_stats(puuid)
+
+    def match_id(self, match_json: dict) -> str:
+        """The region-qualified match ID ("EUW1_...") rows are keyed by --
+        a bare gameId is only unique within its platform. See
+        schemas.qualify_match_id for how older bare-ID rows are read."""
+        metadata_id = match_json.get("metadata", {}).get("matchId")
+        if metadata_id:
+            return metadata_id
+        info = match_json["info"]
+        return f"{info['platformId']}_{info['gameId']}"
 
     def process_data(self, match_json: dict, rank_json: dict) -> Optional[dict]:
         info = match_json["info"]
@@ -39,17 +81,21 @@ class Processor:
             else:
                 red[role] = champ_id
 
+        # No rank data (e.g. a match harvested from the bot's cache, which
+        # never looked one up) leaves average_tier NULL for the encoder to
+        # impute, rather than failing the whole match.
+        rank_data = None
         for rank_data in rank_json:
             if rank_data["queueType"] == "RANKED_SOLO_5x5":
                 rank_json = rank_data
                 break
 
         return {
-            "match_id": info["gameId"],
+            "match_id": self.match_id(match_json),
             "patch_version": info.get("gameVersion"),
             "blue_win": blue_win,
 
-            "average_tier": self.process_ranked_stats(rank_data),
+            "average_tier": self.process_ranked_stats(rank_data) if rank_data else None,
 
             "blue_top": blue["top"],
             "blue_jungle": blue["jungle"],
@@ -109,15 +155,16 @@ class Processor:
         mmr_like_score = rank_value[tier] * 4 + division_score
         return mmr_like_score
 
-    def process_participants(self, match_json: dict, request_delay: float = 1.3) -> list[dict]:
-        # ~20 extra Riot API calls per match (rank + mastery per participant). The
-        # 1.3s delay keeps a full match (~21 calls incl. match detail) under the
-        # personal-key limit of 100 requests / 2 min.
+    def process_participants(self, match_json: dict) -> list[dict]:
+        # Up to ~20 extra Riot API calls per match (rank + mastery per
+        # participant), paced by the Collector's shared rate limiter rather
+        # than a fixed per-call sleep. Mastery comes from one cached snapshot
+        # per player, so repeat players cost nothing here.
         if self.collector is None:
             raise ValueError("Processor requires a Collector instance to process participants.")
 
         info = match_json["info"]
-        match_id = info["gameId"]
+        match_id = self.match_id(match_json)
 
         rows = []
         for p in info["participants"]:
@@ -126,16 +173,14 @@ class Processor:
             team = "blue" if p["teamId"] == 100 else "red"
             role = p["teamPosition"].lower()
 
-            rank_json = self.collector.collect_ranked_stats(puuid)
+            rank_json = self.lookup_ranked_stats(puuid)
             if not isinstance(rank_json, list):  # None or a Riot error payload
                 rank_json = []
-            time.sleep(request_delay)
             tier, rank, league_points, wins, losses, win_rate = self._extract_solo_queue_stats(rank_json)
 
             mastery_json = self.collector.collect_champion_mastery(puuid, champion_id)
             if not isinstance(mastery_json, dict):
                 mastery_json = {}
-            time.sleep(request_delay)
 
             rows.append({
                 "match_id": match_id,
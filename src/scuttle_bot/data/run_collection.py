@@ -3,35 +3,79 @@ Entrypoint for the scheduled cloud collection job. Pulls the latest dataset
 from S3, samples players and collects their recent ranked matches -- syncing
 the db back to S3 after every local batch commit (not just once at the end),
 so a crash mid-run doesn't lose progress that only ever existed on the
-instance's local disk.
+instance's local disk. The raw JSON of every collected match is kept in the
+match archive, synced every ARCHIVE_SYNC_EVERY_BATCHES batches and once the
+run ends -- it's the larger file by far, and every sync reads and hashes all
+of it.
 """
 
+import os
+from dataclasses import replace
+from typing import Callable
+
 from dotenv import load_dotenv
 
-from scuttle_bot.data.dataset import Dataset
+from scuttle_bot.data.dataset import CollectionOptions, Dataset
 from scuttle_bot.utilities.schemas import Region, Queue
-from scuttle_bot.infra.aws_client import backup_databases_to_s3
+from scuttle_bot.infra.aws_client import sync_database_to_s3
+from scuttle_bot.infra.match_archive import MatchArchive, MATCH_ARCHIVE_DB_PATH
 
 DB_PATH = "src/scuttle_bot/cache/ml_dataset.db"
+ARCHIVE_SYNC_EVERY_BATCHES = int(os.getenv("ARCHIVE_SYNC_EVERY_BATCHES", "50"))
+
+COLLECTION_REGION = Region.NA
+COLLECTION_OPTIONS = CollectionOptions(
+    queue=Queue.RANKED_SOLO_5x5,
+    sample_size=300,
+    num_matches_per_player=5,
+    max_errors_in_a_row=5,
+    batch_size=10,
+    challenger_league=True,
+    master_league=True,
+    grandmaster_league=True,
+    stratified_sampling=True,
+)
+
+
+def collection_regions() -> list:
+    """COLLECTION_REGIONS (comma-separated platforms, e.g. "na1,euw1,kr")
+    collects those regions at once into the same dataset -- each has its own
+    API quota, so every added region adds throughput. Unset, only
+    COLLECTION_REGION is collected."""
+    value = os.getenv("COLLECTION_REGIONS", "")
+    return [Region(platform.strip().lower()) for platform in value.split(",") if platform.strip()]
+
+
+def batch_sync(archive_every: int = ARCHIVE_SYNC_EVERY_BATCHES) -> Callable[[], None]:
+    """on_batch_committed for a run: syncs the dataset after every batch,
+    the archive after every archive_every of them."""
+    batches = 0
+
+    def sync_to_s3():
+        nonlocal batches
+        sync_database_to_s3(DB_PATH)
+        batches += 1
+        if batches % archive_every == 0:
+            sync_database_to_s3(MATCH_ARCHIVE_DB_PATH)
 
-COLLECTION_CONFIG = {
-    "region": Region.NA,
-    "queue": Queue.RANKED_SOLO_5x5,
-    "sample_size": 300,
-    "num_matches_per_player": 5,
-    "max_errors_in_a_row": 5,
-    "batch_size": 10,
-    "challenger_league": True,
-    "master_league": True,
-    "grandmaster_league": True,
-    "stratified_sampling": True,
-}
+    return sync_to_s3
 
 
 def main():
     load_dotenv()
     dataset = Dataset(db_path=DB_PATH)
-    dataset.create_dataset(**COLLECTION_CONFIG, on_batch_committed=lambda: backup_databases_to_s3([DB_PATH]))
+    try:
+        options = replace(
+            COLLECTION_OPTIONS,
+            on_batch_committed=batch_sync(),
+            archive=MatchArchive(),
+            # Timelines are ~10x a match's size and cost a match-v5 call
+            # each, so they're only archived when asked for.
+            archive_timelines=os.getenv("ARCHIVE_TIMELINES", "").lower() in ("1", "true"),
+        )
+        dataset.create_dataset(COLLECTION_REGION, options, regions=collection_regions() or None)
+    finally:
+        sync_database_to_s3(MATCH_ARCHIVE_DB_PATH)
 
 
 if __name__ == "__main__":
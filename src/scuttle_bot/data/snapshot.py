@@ -0,0 +1,227 @@
+"""
+Columnar snapshots of ml_dataset.db for training.
+
+Every trainer and build_champion_roles loaded the dataset with
+Dataset.retrieve_dataset / retrieve_match_participants -- a SELECT * through
+pd.read_sql_query, which builds every value as a Python object before pandas
+sees it, for every column whether the caller uses it or not. As the dataset
+grew, loading it became a real share of training wall time.
+
+export_snapshot writes matches and match_participants out as Parquet, one
+directory per table, partitioned by patch (hive-style, patch=14.3/...), and
+read_snapshot loads them back column-selectively: a reader asking for the
+ten pick columns reads those ten column chunks and nothing else, and one
+asking for a couple of patches only opens those partitions. Champion
+columns are dictionary-encoded in Arrow as well as on disk -- there are
+~170 champions against millions of rows -- and can be read back as pandas
+categoricals for callers that only count them.
+
+A snapshot is a point-in-time copy: export after collecting and before
+training. Its manifest records each table's row count and highest rowid as
+exported, and load_table reads the snapshot only while the db still
+matches them; otherwise -- the db written since, no pyarrow (an optional
+dependency, the "columnar" extra), or no export yet -- it reads the db, so
+a stale snapshot is never trained on by accident.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import time
+from typing import Iterator, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.fs as pa_fs
+except ImportError:  # optional: only needed to export or read snapshots
+    pa = None
+    pa_dataset = None
+    pa_fs = None
+
+SNAPSHOT_DIR = "src/scuttle_bot/cache/ml_snapshot"
+SNAPSHOT_TABLES = ("matches", "match_participants")
+PATCH_COLUMN = "patch"
+
+# Columns holding champion IDs, dictionary-encoded in the snapshot.
+CHAMPION_COLUMNS = {
+    "matches": [
+        f"{team}_{slot}" for team in ("blue", "red")
+        for slot in ("top", "jungle", "mid", "adc", "support", "ban_0", "ban_1", "ban_2", "ban_3", "ban_4")
+    ],
+    "match_participants": ["champion_id"],
+}
+
+EXPORT_CHUNK_ROWS = 50000
+MAX_ROWS_PER_GROUP = 128 * 1024
+
+_SQLITE_TO_ARROW = {"INTEGER": "int64", "REAL": "float64", "TEXT": "string"}
+
+
+def columnar_available() -> bool:
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Columnar snapshots need pyarrow: install scuttle-bot[columnar].")
+
+
+def patch_of(patch_version) -> Optional[str]:
+    """"14.3.571.2354" -> "14.3", the same major.minor FeatureEncoder
+    trains on."""
+    if patch_version is None:
+        return None
+    return ".".join(str(patch_version).split(".")[:2])
+
+
+def _schema(connection: sqlite3.Connection, table: str) -> "pa.Schema":
+    fields = []
+    for _, name, declared_type, *_ in connection.execute(f"PRAGMA table_info({table})"):
+        value_type = getattr(pa, _SQLITE_TO_ARROW.get(declared_type.upper(), "string"))()
+        if name in CHAMPION_COLUMNS[table]:
+            value_type = pa.dictionary(pa.int16(), value_type)
+        fields.append(pa.field(name, value_type))
+    return pa.schema(fields + [pa.field(PATCH_COLUMN, pa.string())])
+
+
+def _record_batches(connection: sqlite3.Connection, table: str, schema: "pa.Schema") -> Iterator["pa.RecordBatch"]:
+    """table's rows, plus each one's patch, EXPORT_CHUNK_ROWS at a time.
+    Participants take their patch from their match."""
+    columns = [name for name in schema.names if name != PATCH_COLUMN]
+    quoted = ['"' + name + '"' for name in columns]
+    if table == "matches":
+        query = f"SELECT {', '.join(quoted)}, patch_version FROM matches"
+    else:
+        query = (
+            f"SELECT {', '.join('p.' + name for name in quoted)}, m.patch_version "
+            "FROM match_participants p JOIN matches m ON m.match_id = p.match_id"
+        )
+    cursor = connection.execute(query)
+    while rows := cursor.fetchmany(EXPORT_CHUNK_ROWS):
+        values = list(zip(*rows))
+        arrays = [pa.array(column, type=schema.field(name).type) for name, column in zip(columns, values)]
+        arrays.append(pa.array([patch_of(version) for version in values[-1]], type=pa.string()))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _table_state(execute, table: str) -> list:
+    """[row count, highest rowid] of table, through execute (a
+    connection's or a DatabaseClient's). Cheap to read, and between them
+    they move with any insert or delete; rows updated in place (a one-off
+    migration) need a fresh export."""
+    return list(execute(f"SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM {table}")[0])
+
+
+def export_snapshot(db_path: str, snapshot_dir: str = SNAPSHOT_DIR) -> dict:
+    """Exports matches and match_participants from db_path to a fresh
+    snapshot at snapshot_dir, replacing any previous one. Rows are streamed
+    out of sqlite a chunk at a time, all of it in one read transaction, so
+    the snapshot is consistent even with a collection run writing. The new
+    snapshot is built next to the old one and swapped in at the end, so a
+    reader never sees half of one. Returns its manifest."""
+    _require_pyarrow()
+    staging_dir = f"{snapshot_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    # write_dataset pulls batches from a thread of its own.
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+    manifest = {"source": os.path.abspath(db_path), "exported_at": time.time(), "tables": {}}
+    try:
+        connection.execute("BEGIN")
+        for table in SNAPSHOT_TABLES:
+            schema = _schema(connection, table)
+            rows = 0
+
+            def counted(batches):
+                nonlocal rows
+                for batch in batches:
+                    rows += batch.num_rows
+                    yield batch
+
+            pa_dataset.write_dataset(
+                counted(_record_batches(connection, table, schema)),
+                os.path.join(staging_dir, table),
+                schema=schema,
+                format="parquet",
+                partitioning=[PATCH_COLUMN],
+                partitioning_flavor="hive",
+                max_rows_per_group=MAX_ROWS_PER_GROUP,
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            manifest["tables"][table] = {
+                "rows": rows,
+                "source_state": _table_state(lambda query: connection.execute(query).fetchall(), table),
+            }
+        connection.rollback()
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    finally:
+        connection.close()
+
+    with open(os.path.join(staging_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    retired_dir = f"{snapshot_dir}.old-{os.getpid()}"
+    if os.path.exists(snapshot_dir):
+        os.replace(snapshot_dir, retired_dir)
+    os.replace(staging_dir, snapshot_dir)
+    shutil.rmtree(retired_dir, ignore_errors=True)
+    print(f"Exported snapshot to {snapshot_dir}: {manifest['tables']}")
+    return manifest
+
+
+def snapshot_manifest(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[dict]:
+    try:
+        with open(os.path.join(snapshot_dir, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_snapshot(table: str, snapshot_dir: str = SNAPSHOT_DIR, columns: Optional[list] = None,
+                  patches: Optional[list] = None, categorical: bool = False) -> pd.DataFrame:
+    """table from the snapshot as a DataFrame, with only columns (default:
+    every column of the table, as retrieve_dataset returns) and only the
+    rows of patches (major.minor strings; default: all). Champion columns
+    come back as plain values, as from the db, unless categorical."""
+    _require_pyarrow()
+    source = pa_dataset.dataset(
+        os.path.join(snapshot_dir, table), format="parquet",
+        partitioning=pa_dataset.partitioning(pa.schema([(PATCH_COLUMN, pa.string())]), flavor="hive"),
+        # Memory-mapped, so column chunks that aren't read are never paged in.
+        filesystem=pa_fs.LocalFileSystem(use_mmap=True),
+    )
+    if columns is None:
+        columns = [name for name in source.schema.names if name != PATCH_COLUMN]
+    row_filter = pa_dataset.field(PATCH_COLUMN).isin(patches) if patches is not None else None
+    data = source.to_table(columns=columns, filter=row_filter)
+    if not categorical:
+        data = data.cast(pa.schema([
+            pa.field(field.name, field.type.value_type if pa.types.is_dictionary(field.type) else field.type)
+            for field in data.schema
+        ]))
+    return data.to_pandas()
+
+
+def load_table(dataset, table: str, columns: Optional[list] = None, snapshot_dir: str = SNAPSHOT_DIR,
+               categorical: bool = False) -> pd.DataFrame:
+    """table's columns from the snapshot if there is one (and pyarrow to
+    read it) and the db hasn't changed since it was exported, otherwise
+    from dataset's db."""
+    manifest = snapshot_manifest(snapshot_dir)
+    if manifest is not None and table in manifest["tables"] and columnar_available():
+        exported = time.ctime(manifest["exported_at"])
+        if manifest["tables"][table].get("source_state") == _table_state(dataset.execute_query, table):
+            print(f"Loading {table} from the snapshot exported at {exported}.")
+            return read_snapshot(table, snapshot_dir, columns=columns, categorical=categorical)
+        print(f"The snapshot exported at {exported} is out of date for {table}; loading it from the db instead.")
+    if table == "matches":
+        return dataset.retrieve_dataset(columns=columns)
+    return dataset.retrieve_match_participants(columns=columns)
+
+
+if __name__ == "__main__":
+    export_snapshot("src/scuttle_bot/cache/ml_dataset.db")
@@ -0,0 +1,84 @@
+"""Riot ID -> puuid resolution cache.
+
+account-v1 was being called on every get_puuid, and one chat turn usually
+resolves the same Riot ID several times (get_complete_summoner_info alone
+does it three times, and each analyzer tool does it again). A puuid is
+permanent, but the Riot ID pointing at it isn't -- players rename -- so
+entries carry a TTL rather than living forever, and names seen on fresh
+match data overwrite whatever a puuid was cached under before.
+
+Two tiers: an in-process LRU in front of the riot_accounts table, so the
+common case is a dict lookup and a restart doesn't lose what was learned.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from scuttle_bot.infra.db_client import DatabaseClient
+
+ACCOUNT_TTL_SECONDS = 7 * 24 * 60 * 60
+MAX_MEMORY_ENTRIES = 2048
+
+
+def _normalize(game_name: str, tag_line: str, region: str) -> tuple:
+    # Riot IDs are case-insensitive ("Faker#KR1" and "faker#kr1" are the
+    # same account), so they share one entry.
+    return game_name.strip().lower(), tag_line.strip().lower(), region
+
+
+class AccountCache:
+    def __init__(self, db: DatabaseClient, ttl_seconds: float = ACCOUNT_TTL_SECONDS, max_entries: int = MAX_MEMORY_ENTRIES):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # normalized key -> (puuid, resolved_at)
+        self._lock = threading.Lock()
+        self.db.seed_riot_accounts_from_registrations(resolved_at=time.time())
+
+    def get(self, game_name: str, tag_line: str, region: str) -> Optional[str]:
+        """Cached puuid for a Riot ID, or None if unknown or expired."""
+        key = _normalize(game_name, tag_line, region)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+
+        row = self.db.retrieve_riot_account(*key)
+        if row is None or now - row[1] >= self.ttl_seconds:
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, game_name: str, tag_line: str, region: str, puuid: str):
+        self.put_many([(game_name, tag_line, region, puuid)])
+
+    def put_many(self, accounts: list):
+        """accounts is a list of (game_name, tag_line, region, puuid) -- e.g.
+        every participant of a freshly fetched match, which is how a renamed
+        player's new name gets picked up without another account-v1 call."""
+        now = time.time()
+        normalized = [
+            (*_normalize(game_name, tag_line, region), puuid)
+            for game_name, tag_line, region, puuid in accounts
+            if game_name and tag_line and puuid
+        ]
+        with self._lock:
+            renamed = {row[3] for row in normalized}
+            for key in [k for k, (puuid, _) in self._entries.items() if puuid in renamed]:
+                del self._entries[key]
+        for game_name, tag_line, region, puuid in normalized:
+            self._remember((game_name, tag_line, region), puuid, now)
+        self.db.store_riot_accounts(normalized, resolved_at=now)
+
+    def _remember(self, key: tuple, puuid: str, resolved_at: float):
+        with self._lock:
+            self._entries[key] = (puuid, resolved_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,10 +1,19 @@
+import gzip
+import io
+import json
 import logging
 import os
+import shutil
+import tempfile
+import time
 from typing import Optional
 
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
+from scuttle_bot.infra.db_client import copy_database
+from scuttle_bot.infra.page_delta import DIGEST_SIZE, apply_delta, file_sha256, scan_pages, write_delta
+
 AWS_REGION = "us-west-1"
 DB_BACKUP_BUCKET = "scuttle-bot-db-backups-314722146857"
 RIOT_API_KEY_SECRET_NAME = "scuttle-bot/riot-api-key"
@@ -14,8 +23,17 @@ GEMINI_API_KEY_SECRET_NAME = "scuttle-bot/gemini-api-key"
 DB_FILES = [
     "src/scuttle_bot/cache/scuttle_bot.db",
     "src/scuttle_bot/cache/ml_dataset.db",
+    "src/scuttle_bot/cache/match_archive.db",
 ]
 
+# Incremental sync (sync_database_to_s3) keeps a full snapshot plus a chain
+# of page deltas under "<db basename>.incremental/". The chain is compacted
+# into a fresh snapshot once it's this long, or once its deltas add up to
+# this fraction of the snapshot's size -- whichever comes first -- so a
+# restore never replays more than a bounded amount.
+COMPACT_AFTER_DELTAS = 500
+COMPACT_DELTA_RATIO = 0.5
+
 
 def _s3_client():
     return boto3.client("s3", region_name=AWS_REGION)
@@ -29,7 +47,9 @@ def backup_databases_to_s3(db_paths: Optional[list] = None, bucket: str = DB_BAC
     """
     Uploads each local sqlite db file to S3 under its basename. The bucket has
     versioning enabled, so this is safe to run repeatedly (e.g. after a
-    training run or on a schedule) without losing prior copies.
+    training run or on a schedule) without losing prior copies. What's
+    uploaded is a copy taken through sqlite's backup API, so a db in use
+    (the bot's, in WAL mode) is backed up as one committed state.
     """
     db_paths = db_paths or DB_FILES
     client = _s3_client()
@@ -39,19 +59,31 @@ def backup_databases_to_s3(db_paths: Optional[list] = None, bucket: str = DB_BAC
             logging.warning(f"Skipping backup for {path}: file not found")
             continue
         key = os.path.basename(path)
-        client.upload_file(path, bucket, key)
+        with tempfile.TemporaryDirectory() as tmp:
+            copy_path = os.path.join(tmp, key)
+            copy_database(path, copy_path)
+            client.upload_file(copy_path, bucket, key)
         uploaded.append(key)
     return uploaded
 
 
 def restore_databases_from_s3(db_paths: Optional[list] = None, bucket: str = DB_BACKUP_BUCKET) -> list:
     """Downloads each db file from S3 back to its local path, overwriting
-    whatever is there. Used to bootstrap a fresh machine/instance."""
+    whatever is there. Used to bootstrap a fresh machine/instance. A db
+    that's been synced incrementally (sync_database_to_s3) is rebuilt from
+    its snapshot and deltas, the newer of its two copies."""
     db_paths = db_paths or DB_FILES
     client = _s3_client()
     restored = []
     for path in db_paths:
         key = os.path.basename(path)
+        try:
+            full_copy_time = client.head_object(Bucket=bucket, Key=key)["LastModified"].timestamp()
+        except ClientError:
+            full_copy_time = None
+        if restore_database_from_s3_incremental(path, bucket, newer_than=full_copy_time):
+            restored.append(f"{_incremental_prefix(path)}manifest.json")
+            continue
         directory = os.path.dirname(path)
         if directory:
             os.makedirs(directory, exist_ok=True)
@@ -63,6 +95,179 @@ def restore_databases_from_s3(db_paths: Optional[list] = None, bucket: str = DB_
     return restored
 
 
+def _incremental_prefix(db_path: str) -> str:
+    return f"{os.path.basename(db_path)}.incremental/"
+
+
+def _sync_state_paths(db_path: str) -> tuple[str, str]:
+    """Local record of what the last sync uploaded: the manifest it wrote,
+    and the per-page digests of the file as uploaded."""
+    return f"{db_path}.s3sync.json", f"{db_path}.s3sync.pages"
+
+
+def _load_sync_state(db_path: str) -> tuple[Optional[dict], Optional[bytes]]:
+    manifest_path, digests_path = _sync_state_paths(db_path)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        with open(digests_path, "rb") as f:
+            digests = f.read()
+    except (OSError, ValueError):
+        return None, None
+    if len(digests) != manifest.get("page_count", -1) * DIGEST_SIZE:
+        return None, None
+    return manifest, digests
+
+
+def _save_sync_state(db_path: str, manifest: dict, digests: bytes):
+    manifest_path, digests_path = _sync_state_paths(db_path)
+    for path, data, mode in ((digests_path, digests, "wb"), (manifest_path, json.dumps(manifest), "w")):
+        with open(f"{path}.tmp", mode) as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+
+def _put_manifest(client, bucket: str, db_path: str, manifest: dict):
+    client.put_object(
+        Bucket=bucket,
+        Key=f"{_incremental_prefix(db_path)}manifest.json",
+        Body=json.dumps(manifest).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def sync_database_to_s3(db_path: str, bucket: str = DB_BACKUP_BUCKET, force_snapshot: bool = False) -> dict:
+    """
+    Incremental alternative to backup_databases_to_s3 for a db that changes
+    a little at a time (ml_dataset.db during collection): uploads only the
+    pages changed since the last sync, as one small gzipped delta, then
+    repoints the S3 manifest at it. The manifest is written last, so a
+    restore only ever sees deltas that finished uploading.
+
+    Falls back to uploading a full snapshot (and starting a new delta chain)
+    when there's no local record of a previous sync, when the page size
+    changed (e.g. after a VACUUM), when the chain is due for compaction, or
+    when force_snapshot is set. Superseded objects are deleted after a
+    compaction; the bucket's versioning still keeps them. Returns the new
+    manifest.
+    """
+    client = _s3_client()
+    prefix = _incremental_prefix(db_path)
+    manifest, digests = _load_sync_state(db_path)
+
+    compact = force_snapshot or manifest is None or (
+        len(manifest["deltas"]) >= COMPACT_AFTER_DELTAS
+        or manifest["delta_bytes"] >= COMPACT_DELTA_RATIO * max(manifest["base_bytes"], 1)
+    )
+
+    if not compact:
+        scan = scan_pages(db_path, previous_digests=digests)
+        if scan.page_size != manifest["page_size"]:
+            compact = True
+        elif scan.sha256 == manifest["sha256"]:
+            return manifest  # nothing committed since the last sync
+        else:
+            body = io.BytesIO()
+            write_delta(body, scan)
+            key = f"{prefix}delta-{manifest['generation']:06d}-{len(manifest['deltas']) + 1:06d}.gz"
+            client.put_object(Bucket=bucket, Key=key, Body=body.getvalue())
+            manifest = {
+                **manifest,
+                "deltas": manifest["deltas"] + [key],
+                "delta_bytes": manifest["delta_bytes"] + body.tell(),
+                "page_count": scan.page_count,
+                "sha256": scan.sha256,
+                "updated_at": time.time(),
+            }
+            _put_manifest(client, bucket, db_path, manifest)
+            _save_sync_state(db_path, manifest, scan.digests)
+            return manifest
+
+    generation = (manifest["generation"] + 1) if manifest else 1
+    superseded = ([manifest["base"]] + manifest["deltas"]) if manifest else []
+    key = f"{prefix}base-{generation:06d}.gz"
+    with tempfile.TemporaryFile() as snapshot:
+        with gzip.GzipFile(fileobj=snapshot, mode="wb") as out:
+            scan = scan_pages(db_path, copy_to=out)
+        base_bytes = snapshot.tell()
+        snapshot.seek(0)
+        client.upload_fileobj(snapshot, bucket, key)
+    manifest = {
+        "format": 1,
+        "generation": generation,
+        "base": key,
+        "base_bytes": base_bytes,
+        "deltas": [],
+        "delta_bytes": 0,
+        "page_size": scan.page_size,
+        "page_count": scan.page_count,
+        "sha256": scan.sha256,
+        "updated_at": time.time(),
+    }
+    _put_manifest(client, bucket, db_path, manifest)
+    _save_sync_state(db_path, manifest, scan.digests)
+
+    stale = [{"Key": stale_key} for stale_key in superseded if stale_key != key]
+    for i in range(0, len(stale), 1000):
+        try:
+            client.delete_objects(Bucket=bucket, Delete={"Objects": stale[i:i + 1000], "Quiet": True})
+        except ClientError as e:
+            logging.warning(f"Could not delete superseded sync objects under {prefix}: {e}")
+    return manifest
+
+
+def restore_database_from_s3_incremental(db_path: str, bucket: str = DB_BACKUP_BUCKET,
+                                         newer_than: Optional[float] = None) -> bool:
+    """Rebuilds db_path from its incremental sync: the manifest's snapshot
+    with every delta in its chain applied in order. The result is checked
+    against the manifest's sha256 before it replaces the local file, so a
+    restore is all-or-nothing. Returns False, leaving db_path alone, if the
+    db has never been synced incrementally or its last sync is older than
+    newer_than (a unix timestamp)."""
+    client = _s3_client()
+    prefix = _incremental_prefix(db_path)
+    try:
+        manifest = json.loads(client.get_object(Bucket=bucket, Key=f"{prefix}manifest.json")["Body"].read())
+    except ClientError as e:
+        logging.info(f"No incremental sync found for {db_path}: {e}")
+        return False
+    if newer_than is not None and manifest["updated_at"] < newer_than:
+        return False
+
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, rebuilt_path = tempfile.mkstemp(dir=directory or ".", suffix=".restore")
+    try:
+        with os.fdopen(fd, "w+b") as rebuilt:
+            with tempfile.TemporaryFile() as base:
+                client.download_fileobj(bucket, manifest["base"], base)
+                base.seek(0)
+                with gzip.GzipFile(fileobj=base, mode="rb") as snapshot:
+                    shutil.copyfileobj(snapshot, rebuilt)
+            for key in manifest["deltas"]:
+                delta = io.BytesIO(client.get_object(Bucket=bucket, Key=key)["Body"].read())
+                apply_delta(delta, rebuilt)
+        if file_sha256(rebuilt_path) != manifest["sha256"]:
+            raise ValueError(f"Restored {db_path} does not match its manifest checksum")
+        # A journal or WAL left over from the old file would be replayed
+        # into the restored one on open.
+        for suffix in ("-journal", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        os.replace(rebuilt_path, db_path)
+    except BaseException:
+        if os.path.exists(rebuilt_path):
+            os.remove(rebuilt_path)
+        raise
+
+    # The restored file is exactly what the manifest describes, so the next
+    # sync can go on shipping deltas against it.
+    scan = scan_pages(db_path)
+    _save_sync_state(db_path, manifest, scan.digests)
+    return True
+
+
 def get_secret(secret_name: str) -> Optional[str]:
     """
     Fetches a secret string from Secrets Manager. Returns None on any failure
@@ -97,6 +302,13 @@ if __name__ == "__main__":
     elif command == "backup":
         uploaded = backup_databases_to_s3()
         print(f"Backed up to s3://{DB_BACKUP_BUCKET}/: {uploaded}")
+    elif command in ("sync", "snapshot"):
+        for path in DB_FILES:
+            if not os.path.exists(path):
+                logging.warning(f"Skipping sync for {path}: file not found")
+                continue
+            manifest = sync_database_to_s3(path, force_snapshot=command == "snapshot")
+            print(f"Synced {path} to s3://{DB_BACKUP_BUCKET}/{manifest['base']} + {len(manifest['deltas'])} deltas")
     else:
-        print(f"Unknown command {command!r}, expected 'backup' or 'restore'")
+        print(f"Unknown command {command!r}, expected 'backup', 'restore', 'sync' or 'snapshot'")
         sys.exit(1)
@@ -0,0 +1,174 @@
+"""
+Size-bounded eviction for the bot db's match and timeline cache.
+
+Nothing ever removed a row from matches or match_timelines, so the cache --
+and with it scuttle_bot.db and its backup -- grew for as long as the bot
+ran. MatchCacheEvictor keeps the two tables within a budget: once their
+payloads add up to more than max_bytes (or their rows to more than
+max_rows), it deletes least-recently-used rows, by the last_accessed that
+DatabaseClient keeps as payloads are stored and read, until they're back
+under LOW_WATER of the budget -- so a full cache isn't trimmed by a row or
+two on every pass.
+
+Each registered user's protected_per_user most recently cached matches, and
+their timelines, are never evicted however long since they were read: the
+daily report and "how have I been doing" questions keep coming back to
+them.
+
+Freed pages are handed back to the filesystem with incremental vacuum and
+the WAL is truncated after, so the file on disk shrinks with the cache
+instead of keeping its high-water mark. That needs the db in
+auto_vacuum=INCREMENTAL, and switching it takes one full VACUUM, with the db
+locked throughout -- so it's a deploy step, run before the bot opens the db:
+running this module calls enable_incremental_vacuum (the bot's systemd unit
+does, before starting it; a no-op once the db has been switched). Neither
+the bot nor an eviction pass ever does it.
+
+The bot runs a pass every MATCH_CACHE_EVICTION_MINUTES, off the event loop
+(ScuttleBot.evict_cache_task).
+"""
+
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+
+from scuttle_bot.infra.db_client import PAYLOAD_TABLES, DatabaseClient
+
+MATCH_CACHE_MAX_BYTES = int(os.getenv("MATCH_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+MATCH_CACHE_MAX_ROWS = int(os.getenv("MATCH_CACHE_MAX_ROWS", "0"))  # 0: no row budget
+MATCH_CACHE_PROTECTED_PER_USER = int(os.getenv("MATCH_CACHE_PROTECTED_PER_USER", "20"))
+MATCH_CACHE_EVICTION_MINUTES = float(os.getenv("MATCH_CACHE_EVICTION_MINUTES", "30"))
+
+LOW_WATER = 0.9
+EVICTION_BATCH = 500
+
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def enable_incremental_vacuum(db_path: str) -> bool:
+    """Switches db_path to auto_vacuum=INCREMENTAL if it isn't already,
+    on a connection of its own. Returns whether it had to (with a full
+    VACUUM, which can take minutes on a large cache)."""
+    connection = sqlite3.connect(db_path, timeout=30)
+    try:
+        if connection.execute("PRAGMA auto_vacuum").fetchone()[0] == _AUTO_VACUUM_INCREMENTAL:
+            return False
+        logging.info(f"Switching {db_path} to incremental vacuum (one full VACUUM)...")
+        connection.execute(f"PRAGMA auto_vacuum = {_AUTO_VACUUM_INCREMENTAL}")
+        connection.execute("VACUUM")
+        return True
+    finally:
+        connection.close()
+
+
+class MatchCacheEvictor:
+    def __init__(self, db: DatabaseClient, max_bytes: int = MATCH_CACHE_MAX_BYTES, max_rows: int = MATCH_CACHE_MAX_ROWS,
+                 protected_per_user: int = MATCH_CACHE_PROTECTED_PER_USER):
+        self.db = db
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.protected_per_user = protected_per_user
+        self._lock = threading.Lock()  # one pass at a time
+
+    def usage(self) -> tuple:
+        """(payload bytes, rows) across matches and match_timelines."""
+        payload_bytes = rows = 0
+        for table in PAYLOAD_TABLES.values():
+            table_bytes, table_rows = self.db.execute_query(f"SELECT COALESCE(SUM(length(data)), 0), COUNT(*) FROM {table}")[0]
+            payload_bytes += table_bytes
+            rows += table_rows
+        return payload_bytes, rows
+
+    def _protected(self) -> set:
+        """Match IDs of each registered user's most recently cached matches
+        -- ones they played in (by cached_match_participants), or that were
+        looked up under their name."""
+        if self.protected_per_user <= 0:
+            return set()
+        rows = self.db.execute_query(
+            """
+            WITH user_matches AS (
+                SELECT r.discord_id, p.match_id FROM registered_users r
+                JOIN cached_match_participants p ON p.puuid = r.puuid
+                UNION
+                SELECT r.discord_id, m.match_id FROM registered_users r
+                JOIN matches m ON lower(m.summoner_name) = lower(r.summoner_name)
+            )
+            SELECT match_id FROM (
+                SELECT u.match_id, ROW_NUMBER() OVER (
+                    PARTITION BY u.discord_id ORDER BY m.cached_at DESC, m.match_id DESC
+                ) AS recency
+                FROM user_matches u JOIN matches m ON m.match_id = u.match_id
+            )
+            WHERE recency <= ?
+            """,
+            (self.protected_per_user,)
+        )
+        return {match_id for match_id, in rows}
+
+    def _victims(self, excess_bytes: int, excess_rows: int) -> list:
+        """(table, match_id) of the least recently used unprotected rows,
+        oldest first, enough to free excess_bytes and excess_rows."""
+        protected = self._protected()
+        cursors = [
+            self.db.reader.execute(
+                f"SELECT last_accessed, ?, match_id, length(data) FROM {table} ORDER BY last_accessed",
+                (table,)
+            )
+            for table in PAYLOAD_TABLES.values()
+        ]
+        victims = []
+        try:
+            for _, table, match_id, size in heapq.merge(*cursors):
+                if excess_bytes <= 0 and excess_rows <= 0:
+                    break
+                if match_id in protected:
+                    continue
+                victims.append((table, match_id))
+                excess_bytes -= size
+                excess_rows -= 1
+        finally:
+            for cursor in cursors:
+                cursor.close()
+        return victims
+
+    def run_once(self) -> dict:
+        """One eviction pass. Returns what it found and did."""
+        with self._lock:
+            self.db.flush_access_times()
+            # Rows cached before last_accessed existed count from when they
+            # were cached.
+            for table in PAYLOAD_TABLES.values():
+                self.db.execute_query(
+                    f"UPDATE {table} SET last_accessed = CAST(strftime('%s', cached_at) AS REAL) WHERE last_accessed IS NULL"
+                )
+
+            payload_bytes, rows = self.usage()
+            excess_bytes = payload_bytes - int(self.max_bytes * LOW_WATER) if payload_bytes > self.max_bytes else 0
+            excess_rows = rows - int(self.max_rows * LOW_WATER) if self.max_rows and rows > self.max_rows else 0
+            evicted = 0
+            if excess_bytes > 0 or excess_rows > 0:
+                victims = self._victims(excess_bytes, excess_rows)
+                for start in range(0, len(victims), EVICTION_BATCH):
+                    self.db.evict_payloads(victims[start:start + EVICTION_BATCH])
+                evicted = len(victims)
+                if self.db.execute_query("PRAGMA auto_vacuum")[0][0] == _AUTO_VACUUM_INCREMENTAL:
+                    self.db.execute_query("PRAGMA incremental_vacuum")
+                else:
+                    # Freed pages are reused, but the file won't shrink.
+                    logging.warning(f"{self.db.db_path} isn't in incremental vacuum mode; see enable_incremental_vacuum.")
+                if self.db.wal:
+                    self.db.execute_query("PRAGMA wal_checkpoint(TRUNCATE)")
+
+            stats = {"payload_bytes": payload_bytes, "rows": rows, "evicted": evicted}
+            if evicted:
+                stats["payload_bytes_after"], stats["rows_after"] = self.usage()
+                logging.info(f"Evicted {evicted} cached matches/timelines: {stats}")
+            return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    enable_incremental_vacuum(os.getenv("DB_PATH", "src/scuttle_bot/cache/scuttle_bot.db"))
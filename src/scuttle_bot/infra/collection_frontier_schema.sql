@@ -0,0 +1,19 @@
+CREATE TABLE IF NOT EXISTS collection_frontier (
+    kind TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    region TEXT NOT NULL DEFAULT 'na1',
+
+    payload TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    leased_at REAL,
+    updated_at REAL NOT NULL,
+
+    priority INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL,
+    matches_seen INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (region, kind, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_collection_frontier_state ON collection_frontier (kind, state, leased_at);
\ No newline at end of file
@@ -1,30 +1,197 @@
 import os
 import sqlite3
 import json
+import logging
+import threading
+import time
+import weakref
 from pathlib import Path
 
 from typing import Optional
 
+from scuttle_bot.infra.payload_codec import MATCH, NO_DICTIONARY, TIMELINE, PayloadCodec, train_dictionary
+
+# Applied to every connection a DatabaseClient opens. busy_timeout makes a
+# connection wait out another's write lock instead of failing on it at once;
+# cache_size (in KiB when negative) and mmap_size let hot pages be served
+# from memory rather than through a read() per page.
+CONNECTION_PRAGMAS = {
+    "busy_timeout": 30000,
+    "cache_size": -32 * 1024,
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+
+# Cached match and timeline payloads are stored zstd-compressed (see
+# payload_codec), in the table of their kind. A kind's dictionary is trained
+# on a background thread once its table has PAYLOAD_TRAIN_AFTER rows (retried
+# every PAYLOAD_TRAIN_AFTER more, if zstd couldn't train one), from its most
+# recent rows -- up to PAYLOAD_TRAINING_SAMPLES of them, or
+# PAYLOAD_TRAINING_BYTES of raw JSON, whichever comes first.
+PAYLOAD_TABLES = {MATCH: "matches", TIMELINE: "match_timelines"}
+PAYLOAD_TRAIN_AFTER = 200
+PAYLOAD_TRAINING_SAMPLES = 2000
+PAYLOAD_TRAINING_BYTES = 32 * 1024 * 1024
+# Reads of cached payloads are noted in memory and written to their rows'
+# last_accessed in one go, once this many are pending (or on
+# flush_access_times) -- not a write per read.
+ACCESS_FLUSH_AFTER = 256
+# Match IDs per IN (...) query: sqlite builds before 3.32 cap a statement at
+# 999 bound parameters.
+IN_QUERY_CHUNK = 500
+
+# cached_match_participants column -> the match-v5 participant field it holds.
+CACHED_PARTICIPANT_FIELDS = {
+    "participant_id": "participantId",
+    "puuid": "puuid",
+    "team_id": "teamId",
+    "team_position": "teamPosition",
+    "champion_id": "championId",
+    "champion": "championName",
+    "kills": "kills",
+    "deaths": "deaths",
+    "assists": "assists",
+    "win": "win",
+    "riot_id_game_name": "riotIdGameName",
+    "riot_id_tagline": "riotIdTagline",
+}
+
+
+def match_participants(match: dict) -> list:
+    """Each participant of a match-v5 detail, cut down to the fields
+    cached_match_participants keeps -- keyed by their match-v5 names, the
+    same shape retrieve_match_participants returns."""
+    return [
+        {field: participant.get(field) for field in CACHED_PARTICIPANT_FIELDS.values()}
+        for participant in match.get("info", {}).get("participants", [])
+    ]
+
+
+def _is_read(query: str) -> bool:
+    return query.lstrip()[:6].upper() == "SELECT"
+
+
+class _Reader:
+    """A thread's reader connection, held in its DatabaseClient._local --
+    so dropped, and closed by its finalizer, once the thread ends."""
+    __slots__ = ("connection", "__weakref__")
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+
+def _release_reader(readers: list, readers_lock: threading.Lock, connection: sqlite3.Connection):
+    with readers_lock:
+        if connection in readers:
+            readers.remove(connection)
+    connection.close()
+
+
+def copy_database(db_path: str, dest_path: str):
+    """Copies db_path to dest_path through sqlite's backup API, so the copy
+    is one committed state of the database even with writers active --
+    unlike copying the file, which for a WAL-mode database also misses
+    whatever hasn't been checkpointed yet."""
+    source = sqlite3.connect(db_path, timeout=30)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest)
+    finally:
+        dest.close()
+        source.close()
+
+
 class DatabaseClient:
-    def __init__(self, db_path: str, sql_script_path: Optional[str] = None):
+    """sqlite access shared by the bot's threads -- the event loop serving
+    chat, and the report and other work it hands to asyncio.to_thread.
+
+    Writes go through one writer connection (self.connection), serialized
+    by self._write_lock. Reads (execute_query with a SELECT) go through a
+    connection of the calling thread's own, so they never queue behind one
+    another or share a cursor; a thread's reader is closed when the thread
+    ends. With wal (the default) the database runs in WAL mode, where
+    readers and the writer don't block each other either: a read sees the
+    last committed state, whatever is being written.
+
+    wal=False keeps a database in rollback-journal mode, for files that are
+    copied by reading the raw file (aws_client.sync_database_to_s3) --
+    committed pages then live only in the database file itself."""
+
+    # Columns added to this client's tables after they were first created,
+    # {table: {column: type}} (see _migrate_columns), and indexes on them,
+    # {name: (table, columns)} -- created after the migration rather than in
+    # the schema file, which runs before an older table has the column.
+    # These are the bot db's; a subclass with a schema file of its own lists
+    # its own tables' instead.
+    COLUMN_MIGRATIONS = {
+        "interactions": {"tool_calls": "TEXT"},
+        **{table: {"dict_id": "INTEGER", "last_accessed": "REAL"} for table in PAYLOAD_TABLES.values()},
+    }
+    MIGRATED_INDEXES = {
+        f"idx_{table}_last_accessed": (table, "last_accessed") for table in PAYLOAD_TABLES.values()
+    }
+
+    def __init__(self, db_path: str, sql_script_path: Optional[str] = None, wal: bool = True):
         self.db_path = db_path
         self.sql_script_path = sql_script_path
+        self.wal = wal
         self._connection = None
-        self._cursor = None
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._payload_codec = None
+        self._training_lock = threading.Lock()
+        self._training_thread = None
+        self._payload_rows = {}  # kind -> rows in its table, counted as they're stored
+        self._next_training = {}  # kind -> row count at which to (re)try training
+        self._access_lock = threading.Lock()
+        self._accessed = {}  # table -> {match_id: read at}, not yet written
         self._initialize_db()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        # Not pinned to the opening thread: the writer is used from any
+        # thread under _write_lock, and close() closes every reader.
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma, value in CONNECTION_PRAGMAS.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        if self.wal:
+            # Durable as of the last checkpoint rather than every commit,
+            # which in WAL mode can't corrupt the database.
+            connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
     @property
     def connection(self):
+        """The writer connection. Hold self._write_lock around anything
+        done with it directly."""
         if self._connection is None:
-            self._connection = sqlite3.connect(self.db_path)
+            with self._write_lock:
+                if self._connection is None:
+                    connection = self._connect()
+                    if self.wal:
+                        connection.execute("PRAGMA journal_mode = WAL")
+                    self._connection = connection
         return self._connection
-    
+
     @property
-    def cursor(self):
-        if self._cursor is None:
-            self._cursor = self.connection.cursor()
-        return self._cursor
-    
+    def reader(self) -> sqlite3.Connection:
+        """The calling thread's read-only connection."""
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            connection = self._connect()
+            connection.execute("PRAGMA query_only = 1")
+            reader = _Reader(connection)
+            # Short-lived threads (asyncio.to_thread workers, pipeline
+            # stages) would otherwise each leave a connection open for as
+            # long as the client lives. Not bound to self, so the finalizer
+            # doesn't keep the client alive.
+            weakref.finalize(reader, _release_reader, self._readers, self._readers_lock, connection)
+            self._local.reader = reader
+            with self._readers_lock:
+                self._readers.append(connection)
+        return reader.connection
+
     def _initialize_db(self):
         """Create the DB directory if needed, then run the schema. Every
         statement in schema.sql is CREATE TABLE IF NOT EXISTS, so running it
@@ -42,19 +209,19 @@ class DatabaseClient:
         """Add columns introduced after a database was first created. CREATE
         TABLE IF NOT EXISTS won't alter an existing table, so a new column on
         an existing table needs an explicit ADD COLUMN -- guarded by a check so
-        it only runs where the table exists (e.g. the interactions table is
-        absent from the ml_dataset db) and only once."""
-        migrations = {
-            "interactions": {"tool_calls": "TEXT"},
-        }
+        it only runs where the table exists and only once. Then creates
+        MIGRATED_INDEXES."""
         tables = {row[0] for row in self.execute_query("SELECT name FROM sqlite_master WHERE type='table'")}
-        for table, columns in migrations.items():
+        for table, columns in self.COLUMN_MIGRATIONS.items():
             if table not in tables:
                 continue
             existing = {row[1] for row in self.execute_query(f"PRAGMA table_info({table})")}
             for column, coltype in columns.items():
                 if column not in existing:
                     self.execute_query(f"ALTER TABLE {table} ADD COLUMN {column} {coltype}")
+        for name, (table, columns) in self.MIGRATED_INDEXES.items():
+            if table in tables:
+                self.execute_query(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
 
     def run_script(self):
         if self.sql_script_path:
@@ -70,10 +237,10 @@ class DatabaseClient:
         conn.close()
 
     def execute_query(self, query: str, params: tuple = ()):
-        with self.connection:
-            self.cursor.execute(query, params)
-        
-        return self.cursor.fetchall()
+        if _is_read(query):
+            return self.reader.execute(query, params).fetchall()
+        with self._write_lock, self.connection:
+            return self.connection.execute(query, params).fetchall()
     
     def store_interaction(self, user_input: str, response: str, user_id: Optional[str] = None, tool_calls: Optional[str] = None):
         """tool_calls is a JSON string of the tool calls + observations made to
@@ -84,20 +251,299 @@ class DatabaseClient:
             (user_id, user_input, response, tool_calls)
         )
     
+    @property
+    def payload_codec(self) -> PayloadCodec:
+        """The codec for cached match and timeline payloads, holding the
+        dictionaries in payload_dictionaries."""
+        if self._payload_codec is None:
+            with self._write_lock:
+                if self._payload_codec is None:
+                    codec = PayloadCodec()
+                    for dict_id, kind, data in self.execute_query("SELECT dict_id, kind, data FROM payload_dictionaries"):
+                        codec.add_dictionary(dict_id, kind, data)
+                    self._payload_codec = codec
+        return self._payload_codec
+
+    def _store_payloads(self, kind: str, columns: tuple, rows: list, index_matches: Optional[dict] = None):
+        """INSERT OR IGNOREs rows into kind's table, each row being columns'
+        values followed by the payload's JSON text, which is stored
+        compressed. Storing a payload counts as accessing it. index_matches
+        ({match_id: match-v5 detail}) has its participants indexed in the
+        same transaction, so a match is never cached without them."""
+        now = time.time()
+        encoded = []
+        for *values, data in rows:
+            dict_id, compressed = self.payload_codec.compress(kind, data.encode("utf-8"))
+            encoded.append((*values, compressed, dict_id, now))
+        names = ", ".join(columns + ("data", "dict_id", "last_accessed"))
+        placeholders = ", ".join("?" for _ in range(len(columns) + 3))
+        participant_rows = self._participant_rows(index_matches) if index_matches else []
+        with self._write_lock:
+            with self.connection:
+                added = self.connection.executemany(
+                    f"INSERT OR IGNORE INTO {PAYLOAD_TABLES[kind]} ({names}) VALUES ({placeholders})",
+                    encoded
+                ).rowcount
+                self._insert_participant_rows(participant_rows)
+            if kind in self._payload_rows:
+                self._payload_rows[kind] += added
+            else:
+                # Once per kind: the highest rowid stands in for the count,
+                # an index lookup rather than a scan of the table.
+                self._payload_rows[kind] = self.connection.execute(
+                    f"SELECT COALESCE(MAX(rowid), 0) FROM {PAYLOAD_TABLES[kind]}"
+                ).fetchone()[0]
+            rows = self._payload_rows[kind]
+        self._maybe_train_payload_dictionary(kind, rows)
+
+    def _decode_payloads(self, kind: str, rows: list) -> dict:
+        """{match_id: parsed payload} for (match_id, data, dict_id) rows of
+        kind's table, noting them as accessed. Rows cached before
+        compression are rewritten compressed on the way, so the table
+        migrates as it's read."""
+        self._note_access(kind, [row[0] for row in rows])
+        payloads = {}
+        uncompressed = []
+        for match_id, data, dict_id in rows:
+            if dict_id is None:
+                payloads[match_id] = json.loads(data)
+                uncompressed.append((match_id, data))
+            else:
+                payloads[match_id] = json.loads(self.payload_codec.decompress(dict_id, data))
+        if uncompressed:
+            updates = []
+            for match_id, data in uncompressed:
+                dict_id, compressed = self.payload_codec.compress(kind, data.encode("utf-8"))
+                updates.append((compressed, dict_id, match_id))
+            with self._write_lock, self.connection:
+                self.connection.executemany(
+                    f"UPDATE {PAYLOAD_TABLES[kind]} SET data = ?, dict_id = ? WHERE match_id = ? AND dict_id IS NULL",
+                    updates
+                )
+        return payloads
+
+    def _note_access(self, kind: str, match_ids: list):
+        if not match_ids:
+            return
+        now = time.time()
+        with self._access_lock:
+            self._accessed.setdefault(PAYLOAD_TABLES[kind], {}).update(dict.fromkeys(match_ids, now))
+            pending = sum(len(accessed) for accessed in self._accessed.values())
+        if pending >= ACCESS_FLUSH_AFTER:
+            self.flush_access_times()
+
+    def flush_access_times(self):
+        """Writes the reads noted since the last flush to last_accessed."""
+        with self._access_lock:
+            accessed, self._accessed = self._accessed, {}
+        if not accessed:
+            return
+        with self._write_lock, self.connection:
+            for table, times in accessed.items():
+                self.connection.executemany(
+                    f"UPDATE {table} SET last_accessed = MAX(COALESCE(last_accessed, 0), ?) WHERE match_id = ?",
+                    [(read_at, match_id) for match_id, read_at in times.items()]
+                )
+
+    def evict_payloads(self, entries: list):
+        """Deletes cached payloads, entries being (table, match_id) -- see
+        cache_eviction -- along with an evicted match's participants. One
+        transaction for the lot."""
+        with self._write_lock, self.connection:
+            for table in PAYLOAD_TABLES.values():
+                match_ids = [(match_id,) for entry_table, match_id in entries if entry_table == table]
+                if match_ids:
+                    self.connection.executemany(f"DELETE FROM {table} WHERE match_id = ?", match_ids)
+                    if table == PAYLOAD_TABLES[MATCH]:
+                        self.connection.executemany("DELETE FROM cached_match_participants WHERE match_id = ?", match_ids)
+
+    def _maybe_train_payload_dictionary(self, kind: str, rows: int):
+        """Starts training kind's first dictionary once its table has rows
+        enough -- on a thread of its own, as reading and decompressing the
+        samples takes far longer than the store that tipped it over should."""
+        if self.payload_codec.current_dictionary(kind) != NO_DICTIONARY:
+            return
+        if rows < self._next_training.get(kind, PAYLOAD_TRAIN_AFTER):
+            return
+        # One training at a time; a store that finds one running moves on.
+        if not self._training_lock.acquire(blocking=False):
+            return
+        self._next_training[kind] = rows + PAYLOAD_TRAIN_AFTER
+
+        def train():
+            try:
+                self.train_payload_dictionary(kind)
+            except Exception as e:
+                logging.warning(f"Training a {kind} payload dictionary failed: {e}")
+            finally:
+                self._training_lock.release()
+
+        self._training_thread = threading.Thread(target=train, name=f"payload-dictionary-{kind}", daemon=True)
+        self._training_thread.start()
+
+    def train_payload_dictionary(self, kind: str) -> Optional[int]:
+        """Trains a new dictionary for kind (MATCH or TIMELINE) from its
+        most recently cached payloads and makes it the one new payloads are
+        compressed with. Returns its dict_id, or None if zstd couldn't train
+        one from what's cached."""
+        samples = []
+        sample_bytes = 0
+        rows = self.reader.execute(
+            f"SELECT data, dict_id FROM {PAYLOAD_TABLES[kind]} ORDER BY rowid DESC LIMIT ?",
+            (PAYLOAD_TRAINING_SAMPLES,)
+        )
+        for data, dict_id in rows:
+            raw = data.encode("utf-8") if dict_id is None else self.payload_codec.decompress(dict_id, data)
+            samples.append(raw)
+            sample_bytes += len(raw)
+            if sample_bytes >= PAYLOAD_TRAINING_BYTES:
+                break
+        rows.close()
+        dictionary = train_dictionary(kind, samples)
+        if dictionary is None:
+            logging.warning(f"Could not train a {kind} payload dictionary from {len(samples)} samples")
+            return None
+        with self._write_lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO payload_dictionaries (kind, data, samples, trained_at) VALUES (?, ?, ?, ?)",
+                (kind, dictionary, len(samples), time.time())
+            )
+        self.payload_codec.add_dictionary(cursor.lastrowid, kind, dictionary)
+        return cursor.lastrowid
+
+    @staticmethod
+    def _participant_rows(matches: dict) -> list:
+        """cached_match_participants rows for {match_id: match-v5 detail}."""
+        return [
+            (match_id, *(participant[field] for field in CACHED_PARTICIPANT_FIELDS.values()))
+            for match_id, match in matches.items()
+            for participant in match_participants(match)
+        ]
+
+    def _insert_participant_rows(self, rows: list):
+        """Hold self._write_lock, inside a transaction on self.connection."""
+        if not rows:
+            return
+        columns = list(CACHED_PARTICIPANT_FIELDS)
+        self.connection.executemany(
+            f"INSERT OR IGNORE INTO cached_match_participants (match_id, {', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in range(len(columns) + 1))})",
+            rows
+        )
+
+    def _index_participants(self, matches: dict):
+        """Writes cached_match_participants rows for {match_id: match-v5
+        detail} of matches already cached."""
+        rows = self._participant_rows(matches)
+        with self._write_lock, self.connection:
+            self._insert_participant_rows(rows)
+
     def store_match(self, match_id: str, summoner_name: str, data: str):
-        self.execute_query(
-            "INSERT OR IGNORE INTO matches (match_id, summoner_name, data) VALUES (?, ?, ?)",
-            (match_id, summoner_name, data)
+        self.store_matches([(match_id, summoner_name, data)])
+
+    def store_matches(self, matches: list):
+        """Batch store_match: matches is a list of (match_id, summoner_name,
+        data), written in one transaction rather than one commit each, their
+        participants indexed in cached_match_participants."""
+        if not matches:
+            return
+        self._store_payloads(
+            MATCH, ("match_id", "summoner_name"), matches,
+            index_matches={match_id: json.loads(data) for match_id, _, data in matches}
         )
 
+    def put_many(self, kind: str, payloads: dict, summoner_name: Optional[str] = None):
+        """Caches {match_id: parsed payload} of kind (MATCH or TIMELINE) in
+        one transaction. Matches are cached under the summoner_name they
+        were looked up for."""
+        if not payloads:
+            return
+        if kind == MATCH:
+            if summoner_name is None:
+                raise ValueError("Caching matches needs the summoner_name they were looked up for")
+            rows = [(match_id, summoner_name, json.dumps(match)) for match_id, match in payloads.items()]
+            self._store_payloads(MATCH, ("match_id", "summoner_name"), rows, index_matches=payloads)
+        else:
+            self._store_payloads(kind, ("match_id",), [(match_id, json.dumps(payload)) for match_id, payload in payloads.items()])
+
+    def _get_payloads(self, kind: str, match_ids: list) -> tuple:
+        match_ids = list(dict.fromkeys(match_ids))
+        rows = []
+        for start in range(0, len(match_ids), IN_QUERY_CHUNK):
+            chunk = match_ids[start:start + IN_QUERY_CHUNK]
+            rows += self.execute_query(
+                f"SELECT match_id, data, dict_id FROM {PAYLOAD_TABLES[kind]} WHERE match_id IN ({','.join('?' for _ in chunk)})",
+                tuple(chunk)
+            )
+        hits = self._decode_payloads(kind, rows)
+        return hits, [match_id for match_id in match_ids if match_id not in hits]
+
+    def get_matches(self, match_ids: list) -> tuple:
+        """(hits, missing) for a matchlist in one query: hits is
+        {match_id: match} for the cached ones, missing the rest of
+        match_ids, in their order -- the ones to fetch."""
+        return self._get_payloads(MATCH, match_ids)
+
+    def get_timelines(self, match_ids: list) -> tuple:
+        """get_matches for timelines."""
+        return self._get_payloads(TIMELINE, match_ids)
+
+    def retrieve_match_participants(self, match_ids: list, puuid: Optional[str] = None) -> dict:
+        """{match_id: [participant, ...]} for the cached ones of match_ids,
+        from cached_match_participants -- each participant a dict of
+        CACHED_PARTICIPANT_FIELDS' match-v5 fields, in participantId order.
+        With puuid, only that player's entry is looked up (through the
+        (puuid, match_id) index), and a cached match they weren't in maps to
+        []. Matches cached before the table existed are indexed from their
+        JSON the first time they're asked for."""
+        match_ids = list(dict.fromkeys(match_ids))
+        if not match_ids:
+            return {}
+        columns = list(CACHED_PARTICIPANT_FIELDS)
+        placeholders = ",".join("?" for _ in match_ids)
+        if puuid is None:
+            rows = self.execute_query(
+                f"SELECT match_id, {', '.join(columns)} FROM cached_match_participants "
+                f"WHERE match_id IN ({placeholders}) ORDER BY match_id, participant_id",
+                tuple(match_ids)
+            )
+        else:
+            rows = self.execute_query(
+                f"SELECT match_id, {', '.join(columns)} FROM cached_match_participants "
+                f"WHERE puuid = ? AND match_id IN ({placeholders})",
+                (puuid, *match_ids)
+            )
+        participants = {}
+        for match_id, *values in rows:
+            participant = dict(zip(CACHED_PARTICIPANT_FIELDS.values(), values))
+            if participant["win"] is not None:
+                participant["win"] = bool(participant["win"])
+            participants.setdefault(match_id, []).append(participant)
+        self._note_access(MATCH, list(participants))
+
+        rest = [match_id for match_id in match_ids if match_id not in participants]
+        if rest and puuid is not None:
+            # Indexed matches this player wasn't in.
+            placeholders = ",".join("?" for _ in rest)
+            for match_id, in self.execute_query(
+                f"SELECT DISTINCT match_id FROM cached_match_participants WHERE match_id IN ({placeholders})",
+                tuple(rest)
+            ):
+                participants[match_id] = []
+            rest = [match_id for match_id in rest if match_id not in participants]
+        if rest:
+            unindexed, _ = self.get_matches(rest)
+            self._index_participants(unindexed)
+            for match_id, match in unindexed.items():
+                participants[match_id] = [
+                    participant for participant in match_participants(match)
+                    if puuid is None or participant["puuid"] == puuid
+                ]
+        return participants
+
     def retrieve_match(self, match_id: str):
-        result = self.execute_query(
-            "SELECT data FROM matches WHERE match_id = ?",
-            (match_id,)
-        )
-        if result:
-            return json.loads(result[0][0])
-        return None
+        hits, _ = self.get_matches([match_id])
+        return hits.get(match_id)
     
     def exists_match(self, match_id: str) -> bool:
         result = self.execute_query(
@@ -107,19 +553,11 @@ class DatabaseClient:
         return len(result) > 0
     
     def store_match_timeline(self, match_id: str, data: str):
-        self.execute_query(
-            "INSERT OR IGNORE INTO match_timelines (match_id, data) VALUES (?, ?)",
-            (match_id, data)
-        )
+        self._store_payloads(TIMELINE, ("match_id",), [(match_id, data)])
 
     def retrieve_match_timeline(self, match_id: str):
-        result = self.execute_query(
-            "SELECT data FROM match_timelines WHERE match_id = ?",
-            (match_id,)
-        )
-        if result:
-            return json.loads(result[0][0])
-        return None
+        hits, _ = self.get_timelines([match_id])
+        return hits.get(match_id)
 
     def exists_match_timeline(self, match_id: str) -> bool:
         result = self.execute_query(
@@ -129,10 +567,8 @@ class DatabaseClient:
         return len(result) > 0
 
     def retrieve_all_matches(self, match_ids: list):
-        placeholders = ','.join('?' for _ in match_ids)
-        query = f"SELECT match_id, data FROM matches WHERE match_id IN ({placeholders})"
-        results = self.execute_query(query, tuple(match_ids))
-        return {match_id: json.loads(data) for match_id, data in results}
+        hits, _ = self.get_matches(match_ids)
+        return hits
     
     def retrieve_recent_interactions(self, user_id: str, limit: int = 5) -> list:
         """Most recent interactions for this user, oldest first (ready to
@@ -227,8 +663,62 @@ class DatabaseClient:
             }
         return None
 
+    def store_riot_accounts(self, accounts: list, resolved_at: float):
+        """accounts is a list of (game_name, tag_line, region, puuid), with
+        game_name/tag_line already normalized by the caller. A puuid has
+        exactly one current Riot ID, so any other name it was cached under in
+        the same region is dropped -- otherwise a rename would leave the old
+        name resolving to it until its TTL ran out."""
+        if not accounts:
+            return
+        with self._write_lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM riot_accounts WHERE puuid = ? AND region = ? AND NOT (game_name = ? AND tag_line = ?)",
+                [(puuid, region, game_name, tag_line) for game_name, tag_line, region, puuid in accounts]
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO riot_accounts (game_name, tag_line, region, puuid, resolved_at) VALUES (?, ?, ?, ?, ?)",
+                [(game_name, tag_line, region, puuid, resolved_at) for game_name, tag_line, region, puuid in accounts]
+            )
+
+    def retrieve_riot_account(self, game_name: str, tag_line: str, region: str) -> Optional[tuple]:
+        """(puuid, resolved_at) for a normalized Riot ID, or None. Freshness is
+        the caller's call -- see AccountCache."""
+        result = self.execute_query(
+            "SELECT puuid, resolved_at FROM riot_accounts WHERE game_name = ? AND tag_line = ? AND region = ?",
+            (game_name, tag_line, region)
+        )
+        return result[0] if result else None
+
+    def seed_riot_accounts_from_registrations(self, resolved_at: float):
+        """Registered users already had their puuid resolved at registration
+        time; copying them into riot_accounts means the daily report and
+        "how did I do" lookups for them never need account-v1. Only puuids
+        with no entry yet are seeded -- one already there is at least as
+        fresh, and may reflect a rename since registration."""
+        self.execute_query(
+            """
+            INSERT OR IGNORE INTO riot_accounts (game_name, tag_line, region, puuid, resolved_at)
+            SELECT lower(trim(r.summoner_name)), lower(trim(r.tag_line)), r.game_region, r.puuid, ?
+            FROM registered_users r
+            WHERE NOT EXISTS (SELECT 1 FROM riot_accounts a WHERE a.puuid = r.puuid AND a.region = r.game_region)
+            """,
+            (resolved_at,)
+        )
+
     def close(self):
-        self.connection.close()
+        if self._training_thread is not None:
+            self._training_thread.join()
+        self.flush_access_times()
+        with self._readers_lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+        self._local = threading.local()
+        with self._write_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
 
 if __name__ == "__main__":
     db = DatabaseClient(os.getenv("DB_PATH", "src/scuttle_bot/cache/scuttle_bot.db"))
@@ -0,0 +1,157 @@
+"""
+Append-only archive of raw match-v5 payloads, so new features can be
+computed from matches already collected instead of refetching them.
+
+Processor.process_data keeps ~25 columns of a match, and collection used to
+throw the rest away -- any feature it didn't anticipate meant spending days
+of rate-limited quota refetching the same matches. Every match the
+collection pipeline writes (and, optionally, its timeline) is now also kept
+here, keyed by its region-qualified match ID, so a re-feature run is a local
+job: iter_payloads streams the archive in the order it was written, and get
+looks one up.
+
+Payloads are compressed with zstd (see payload_codec). Once a kind has
+TRAIN_AFTER_PAYLOADS entries a dictionary is trained from them and used for
+everything archived after; train_dictionary can be rerun -- say after a
+patch adds fields -- without touching what's already archived.
+
+It's a file of its own (MATCH_ARCHIVE_DB_PATH) rather than more tables in
+ml_dataset.db: it grows far faster than the dataset, which is synced to S3
+after every batch. The archive is synced far less often (see
+run_collection), so its size doesn't slow down every batch's sync.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Iterable, Iterator, Optional
+
+from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.infra.payload_codec import (
+    COMPRESSION_LEVEL, MATCH, NO_DICTIONARY, TIMELINE, PayloadCodec, train_dictionary,
+)
+from scuttle_bot.utilities.schemas import qualify_match_id
+
+MATCH_ARCHIVE_DB_PATH = os.getenv("MATCH_ARCHIVE_DB_PATH", "src/scuttle_bot/cache/match_archive.db")
+MATCH_ARCHIVE_SCHEMA_PATH = "src/scuttle_bot/infra/match_archive_schema.sql"
+
+# A kind's first dictionary is trained once it has this many payloads, from
+# (up to) the most recent TRAINING_SAMPLES of them.
+TRAIN_AFTER_PAYLOADS = 1000
+TRAINING_SAMPLES = 2000
+
+
+class MatchArchive(DatabaseClient):
+    """The archive. The collection writer appends while a re-feature job
+    may be reading; writes are serialized by self._write_lock."""
+
+    COLUMN_MIGRATIONS = {}
+    MIGRATED_INDEXES = {}
+
+    def __init__(self, db_path: str = MATCH_ARCHIVE_DB_PATH, compression_level: int = COMPRESSION_LEVEL):
+        self.codec = PayloadCodec(compression_level)
+        # Synced to S3 from its raw file, like the dataset, so not in WAL mode.
+        super().__init__(db_path, sql_script_path=MATCH_ARCHIVE_SCHEMA_PATH, wal=False)
+        for dict_id, kind, data in self.execute_query("SELECT dict_id, kind, data FROM archive_dictionaries"):
+            self.codec.add_dictionary(dict_id, kind, data)
+
+    def _decode(self, dict_id: int, data: bytes):
+        return json.loads(self.codec.decompress(dict_id, data))
+
+    def put_many(self, kind: str, items: Iterable[tuple]) -> int:
+        """Archives (match_id, payload) pairs of kind, payload being the
+        parsed JSON. Matches already archived are left as they are -- the
+        archive is append-only, and a finished match's payload never
+        changes. Returns how many were added."""
+        now = time.time()
+        rows = []
+        for match_id, payload in items:
+            raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            dict_id, data = self.codec.compress(kind, raw)
+            rows.append((kind, qualify_match_id(match_id), dict_id, len(raw), data, now))
+        if not rows:
+            return 0
+        with self._write_lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO archived_payloads (kind, match_id, dict_id, raw_size, data, archived_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            added = self.connection.total_changes - before
+
+        if self.codec.current_dictionary(kind) == NO_DICTIONARY and self.count(kind) >= TRAIN_AFTER_PAYLOADS:
+            self.train_dictionary(kind)
+        return added
+
+    def put(self, kind: str, match_id: str, payload) -> bool:
+        return self.put_many(kind, [(match_id, payload)]) == 1
+
+    def get(self, kind: str, match_id: str):
+        """The archived payload of kind for match_id (bare or qualified), or
+        None if it isn't archived."""
+        rows = self.execute_query(
+            "SELECT dict_id, data FROM archived_payloads WHERE kind = ? AND match_id = ?",
+            (kind, qualify_match_id(match_id))
+        )
+        if not rows:
+            return None
+        return self._decode(*rows[0])
+
+    def contains(self, kind: str, match_id: str) -> bool:
+        return bool(self.execute_query(
+            "SELECT 1 FROM archived_payloads WHERE kind = ? AND match_id = ?", (kind, qualify_match_id(match_id))
+        ))
+
+    def count(self, kind: str) -> int:
+        return self.execute_query("SELECT COUNT(*) FROM archived_payloads WHERE kind = ?", (kind,))[0][0]
+
+    def iter_payloads(self, kind: str, after_seq: int = 0, chunk_size: int = 256) -> Iterator[tuple]:
+        """Streams (seq, match_id, payload) for every archived payload of
+        kind, oldest first, a chunk at a time -- memory stays flat however
+        big the archive is, and each chunk is its own short read, so the
+        writer isn't held up. A job that stops part-way can pass the last
+        seq it processed as after_seq to carry on from there."""
+        while True:
+            rows = self.execute_query(
+                "SELECT seq, match_id, dict_id, data FROM archived_payloads WHERE kind = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (kind, after_seq, chunk_size)
+            )
+            if not rows:
+                return
+            for seq, match_id, dict_id, data in rows:
+                yield seq, match_id, self._decode(dict_id, data)
+            after_seq = rows[-1][0]
+
+    def train_dictionary(self, kind: str) -> Optional[int]:
+        """Trains a new dictionary for kind from its most recent payloads
+        and makes it the one new payloads are compressed with. Returns its
+        dict_id, or None if there isn't enough to train on yet. Runs one
+        training at a time; the writer is only held to store the result."""
+        with self._training_lock:
+            rows = self.execute_query(
+                "SELECT dict_id, data FROM archived_payloads WHERE kind = ? ORDER BY seq DESC LIMIT ?",
+                (kind, TRAINING_SAMPLES)
+            )
+            samples = [self.codec.decompress(dict_id, data) for dict_id, data in rows]
+            dictionary = train_dictionary(kind, samples)
+            if dictionary is None:
+                logging.warning(f"Could not train a {kind} archive dictionary from {len(samples)} samples")
+                return None
+            with self._write_lock, self.connection:
+                cursor = self.connection.execute(
+                    "INSERT INTO archive_dictionaries (kind, data, samples, trained_at) VALUES (?, ?, ?, ?)",
+                    (kind, dictionary, len(samples), time.time())
+                )
+            self.codec.add_dictionary(cursor.lastrowid, kind, dictionary)
+            return cursor.lastrowid
+
+    def stats(self, kind: str) -> dict:
+        """Entry count and raw vs compressed bytes, for seeing what the
+        dictionaries buy."""
+        count, raw_bytes, stored_bytes = self.execute_query(
+            "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(length(data)), 0) FROM archived_payloads WHERE kind = ?",
+            (kind,)
+        )[0]
+        return {"payloads": count, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
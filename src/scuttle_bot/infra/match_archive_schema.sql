@@ -0,0 +1,20 @@
+CREATE TABLE IF NOT EXISTS archive_dictionaries (
+    dict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    data BLOB NOT NULL,
+    samples INTEGER NOT NULL,
+    trained_at REAL NOT NULL
+);
+
+-- seq orders rows by arrival, so iteration streams the archive in the order
+-- it was written and can resume from the last seq it saw.
+CREATE TABLE IF NOT EXISTS archived_payloads (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    match_id TEXT NOT NULL,
+    dict_id INTEGER NOT NULL DEFAULT 0,
+    raw_size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    archived_at REAL NOT NULL,
+    UNIQUE (kind, match_id)
+);
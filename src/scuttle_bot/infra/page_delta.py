@@ -0,0 +1,125 @@
+"""
+Page-level deltas of a sqlite database file, so a backup after each
+collection batch ships the handful of pages the batch touched instead of the
+whole file (see aws_client.sync_database_to_s3).
+
+sqlite stores everything in fixed-size pages, and an INSERT batch rewrites
+only the few B-tree pages it lands in. scan_pages reads the file once under
+a read transaction (so no writer can commit mid-read and tear it), keeps an
+8-byte digest per page, and returns the pages whose digest differs from the
+previous scan's. A delta is those pages plus the file's new page count;
+applying a chain of deltas to the base snapshot they were taken against
+reproduces the file byte for byte, which the manifest's sha256 confirms.
+"""
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import struct
+import tempfile
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional
+
+from scuttle_bot.infra.db_client import copy_database
+
+DIGEST_SIZE = 8
+DELTA_MAGIC = b"SQLPDLT1"
+_HEADER = struct.Struct(">IQ")  # page size, page count
+_PAGE_NUMBER = struct.Struct(">Q")
+
+
+@dataclass
+class PageScan:
+    page_size: int
+    page_count: int
+    digests: bytes
+    sha256: str
+    changed: list = field(default_factory=list)  # (page number, page bytes)
+
+
+def scan_pages(db_path: str, previous_digests: Optional[bytes] = None, copy_to: Optional[BinaryIO] = None) -> PageScan:
+    """Digests every page of db_path, collecting the ones that differ from
+    previous_digests (none are collected without it -- that's a full
+    snapshot's job, via copy_to, which receives the whole file as read).
+
+    The read happens inside a read transaction, whose shared lock keeps
+    other connections from committing until it's done. That doesn't hold in
+    WAL mode -- committed pages may still be in the WAL, and a checkpoint
+    can rewrite the file under a reader -- so a WAL-mode database is first
+    copied through the backup API (db_client.copy_database) and the copy
+    scanned instead."""
+    connection = sqlite3.connect(db_path, timeout=30)
+    try:
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        if connection.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            descriptor, copy_path = tempfile.mkstemp(suffix=".scan", dir=os.path.dirname(os.path.abspath(db_path)))
+            os.close(descriptor)
+            try:
+                copy_database(db_path, copy_path)
+                return _scan_file(copy_path, page_size, previous_digests, copy_to)
+            finally:
+                os.remove(copy_path)
+        connection.execute("BEGIN")
+        connection.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        scan = _scan_file(db_path, page_size, previous_digests, copy_to)
+        connection.rollback()
+    finally:
+        connection.close()
+    return scan
+
+
+def _scan_file(path: str, page_size: int, previous_digests: Optional[bytes], copy_to: Optional[BinaryIO]) -> PageScan:
+    digests = bytearray()
+    checksum = hashlib.sha256()
+    changed = []
+    with open(path, "rb") as f:
+        page_number = 0
+        while page := f.read(page_size):
+            digest = hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+            if previous_digests is not None:
+                offset = page_number * DIGEST_SIZE
+                if previous_digests[offset:offset + DIGEST_SIZE] != digest:
+                    changed.append((page_number, page))
+            digests += digest
+            checksum.update(page)
+            if copy_to is not None:
+                copy_to.write(page)
+            page_number += 1
+    return PageScan(page_size, page_number, bytes(digests), checksum.hexdigest(), changed)
+
+
+def write_delta(fileobj: BinaryIO, scan: PageScan):
+    """Writes scan's changed pages to fileobj as a gzipped delta."""
+    with gzip.GzipFile(fileobj=fileobj, mode="wb") as out:
+        out.write(DELTA_MAGIC)
+        out.write(_HEADER.pack(scan.page_size, scan.page_count))
+        for page_number, page in scan.changed:
+            out.write(_PAGE_NUMBER.pack(page_number))
+            out.write(page)
+
+
+def apply_delta(delta: BinaryIO, target: BinaryIO):
+    """Applies a gzipped delta (from write_delta) to target, a file opened
+    r+b on the database it was taken against, truncating or extending it to
+    the delta's page count."""
+    with gzip.GzipFile(fileobj=delta, mode="rb") as source:
+        if source.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+            raise ValueError("Not a page delta")
+        page_size, page_count = _HEADER.unpack(source.read(_HEADER.size))
+        while header := source.read(_PAGE_NUMBER.size):
+            (page_number,) = _PAGE_NUMBER.unpack(header)
+            page = source.read(page_size)
+            if len(page) != page_size:
+                raise ValueError(f"Truncated page {page_number} in delta")
+            target.seek(page_number * page_size)
+            target.write(page)
+    target.truncate(page_count * page_size)
+
+
+def file_sha256(path: str) -> str:
+    checksum = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            checksum.update(chunk)
+    return checksum.hexdigest()
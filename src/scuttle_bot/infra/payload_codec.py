@@ -0,0 +1,91 @@
+"""
+zstd compression of JSON payloads, with dictionaries trained per kind of
+payload (a match, a timeline).
+
+Match-v5 JSON is highly repetitive across payloads -- the same keys, item
+and perk IDs, challenge names -- but each one alone is too small for that
+to show up in its own compression. A dictionary trained on a few thousand
+of them captures what they share, so each payload compresses against it.
+
+PayloadCodec only holds the dictionaries and compresses with them; where
+they're stored is its owner's business (MatchArchive's
+archive_dictionaries, the bot db's payload_dictionaries). A compressed
+payload is stored with the dict_id it was compressed with -- NO_DICTIONARY
+for plain zstd, before a kind's first dictionary exists -- and dictionaries
+are never deleted or changed, so a kind can be retrained at any time
+without touching what's already stored.
+"""
+
+import threading
+from typing import Optional
+
+import zstandard
+
+MATCH = "match"
+TIMELINE = "timeline"
+
+NO_DICTIONARY = 0
+COMPRESSION_LEVEL = 9
+# A timeline is a few hundred KB against a match's ~20, with proportionally
+# more shared structure worth a bigger dictionary.
+DICTIONARY_SIZES = {
+    MATCH: 112 * 1024,
+    TIMELINE: 256 * 1024,
+}
+
+
+class PayloadCodec:
+    """Thread-safe: the zstd (de)compressors it caches aren't, so every use
+    is serialized by its lock."""
+
+    def __init__(self, compression_level: int = COMPRESSION_LEVEL):
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._dictionaries = {}  # dict_id -> ZstdCompressionDict
+        self._current = {}  # kind -> dict_id, the one new payloads use
+        self._compressors = {}  # dict_id -> ZstdCompressor
+        self._decompressors = {}  # dict_id -> ZstdDecompressor
+
+    def add_dictionary(self, dict_id: int, kind: str, data: bytes):
+        """Registers a stored dictionary. The highest dict_id of a kind is
+        the one its new payloads are compressed with."""
+        with self._lock:
+            self._dictionaries[dict_id] = zstandard.ZstdCompressionDict(data)
+            if dict_id > self._current.get(kind, NO_DICTIONARY):
+                self._current[kind] = dict_id
+
+    def current_dictionary(self, kind: str) -> int:
+        return self._current.get(kind, NO_DICTIONARY)
+
+    def _compressor(self, dict_id: int) -> zstandard.ZstdCompressor:
+        if dict_id not in self._compressors:
+            self._compressors[dict_id] = zstandard.ZstdCompressor(
+                level=self.compression_level, dict_data=self._dictionaries.get(dict_id)
+            )
+        return self._compressors[dict_id]
+
+    def _decompressor(self, dict_id: int) -> zstandard.ZstdDecompressor:
+        if dict_id not in self._decompressors:
+            self._decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self._dictionaries.get(dict_id))
+        return self._decompressors[dict_id]
+
+    def compress(self, kind: str, raw: bytes) -> tuple:
+        """(dict_id, compressed bytes) for raw, a payload of kind."""
+        with self._lock:
+            dict_id = self._current.get(kind, NO_DICTIONARY)
+            return dict_id, self._compressor(dict_id).compress(raw)
+
+    def decompress(self, dict_id: int, data: bytes) -> bytes:
+        if dict_id != NO_DICTIONARY and dict_id not in self._dictionaries:
+            raise KeyError(f"Payload compressed with unknown dictionary {dict_id}")
+        with self._lock:
+            return self._decompressor(dict_id).decompress(data)
+
+
+def train_dictionary(kind: str, samples: list) -> Optional[bytes]:
+    """A dictionary for kind trained on samples (raw payloads), or None if
+    zstd can't train one from them -- too few, or too alike."""
+    try:
+        return zstandard.train_dictionary(DICTIONARY_SIZES.get(kind, DICTIONARY_SIZES[MATCH]), samples).as_bytes()
+    except zstandard.ZstdError:
+        return None
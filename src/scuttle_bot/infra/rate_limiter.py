@@ -0,0 +1,218 @@
+"""Header-driven pacing for Riot API calls, shared by every caller in the
+process (RiotClientMixin, Collector) so they draw from one budget instead of
+each guessing at it with fixed sleeps.
+
+Riot enforces two layers of limits, both per routing host (a platform like
+na1 and a cluster like americas are budgeted separately):
+
+- application limits, across every method on that host, and
+- method limits, per endpoint (e.g. match-v5 match detail vs. matchlist).
+
+Every response advertises both in X-App-Rate-Limit / X-Method-Rate-Limit
+("20:1,100:120" = 20 per 1s and 100 per 120s) along with the key's current
+usage in the matching *-Count headers. The limiter learns the limits from
+those headers, so the same code runs at a personal key's pace or a production
+key's without configuration, and it adopts the server-side counts whenever
+they're higher than its own -- since those counts are per API key, not per
+process, that's what keeps the bot and a collection job sharing one key from
+jointly overrunning it. A 429 blocks the offending bucket for Retry-After.
+"""
+
+import re
+import threading
+import time
+from typing import Mapping, Optional
+
+from scuttle_bot.utilities.schemas import split_riot_url
+
+# Until a host's first response arrives there are no headers to learn from,
+# so calls are paced against the development/personal key's application
+# limit -- the most restrictive one Riot hands out.
+DEFAULT_APP_LIMITS = "20:1,100:120"
+
+# Riot's windows are aligned to the first request it saw, which is always
+# slightly earlier than when we locally started counting -- waiting a little
+# past our own window end avoids racing the server's reset.
+WINDOW_SLACK_SECONDS = 0.1
+
+# Retry-After is normally present on a 429, but a "service" 429 (the
+# underlying service being overloaded rather than our key over its limit)
+# may omit it.
+DEFAULT_RETRY_AFTER = 10
+
+# Method limits are per endpoint, not per URL -- these collapse the
+# puuid/match-ID/Riot-ID path segments out so every call to the same
+# endpoint lands in the same bucket. Order matters where one pattern is a
+# prefix of another (e.g. match detail vs. its timeline).
+_METHOD_PATTERNS = [
+    ("account-v1.by-riot-id", re.compile(r"^/riot/account/v1/accounts/by-riot-id/")),
+    ("account-v1.by-puuid", re.compile(r"^/riot/account/v1/accounts/by-puuid/")),
+    ("league-v4.entries-by-puuid", re.compile(r"^/lol/league/v4/entries/by-puuid/")),
+    ("league-v4.challengerleagues", re.compile(r"^/lol/league/v4/challengerleagues/")),
+    ("league-v4.grandmasterleagues", re.compile(r"^/lol/league/v4/grandmasterleagues/")),
+    ("league-v4.masterleagues", re.compile(r"^/lol/league/v4/masterleagues/")),
+    ("champion-mastery-v4.by-champion", re.compile(r"^/lol/champion-mastery/v4/champion-masteries/by-puuid/[^/]+/by-champion/")),
+    ("champion-mastery-v4.top", re.compile(r"^/lol/champion-mastery/v4/champion-masteries/by-puuid/[^/]+/top")),
+    ("champion-mastery-v4.by-puuid", re.compile(r"^/lol/champion-mastery/v4/champion-masteries/by-puuid/[^/]+/?$")),
+    ("spectator-v5.active-game", re.compile(r"^/lol/spectator/v5/active-games/by-summoner/")),
+    ("match-v5.ids", re.compile(r"^/lol/match/v5/matches/by-puuid/[^/]+/ids")),
+    ("match-v5.replays", re.compile(r"^/lol/match/v5/matches/by-puuid/[^/]+/replays")),
+    ("match-v5.timeline", re.compile(r"^/lol/match/v5/matches/[^/]+/timeline")),
+    ("match-v5.match", re.compile(r"^/lol/match/v5/matches/[^/]+/?$")),
+]
+
+
+def parse_rate_limit_header(value: Optional[str]) -> dict[int, int]:
+    """Parses a "limit:seconds,limit:seconds" header (or its *-Count twin,
+    "count:seconds,...") into {seconds: limit_or_count}. Malformed entries are
+    skipped rather than raised on -- a bad header shouldn't fail the call
+    that carried it."""
+    parsed = {}
+    for part in (value or "").split(","):
+        amount, _, seconds = part.strip().partition(":")
+        try:
+            parsed[int(seconds)] = int(amount)
+        except ValueError:
+            continue
+    return parsed
+
+
+def method_key(path: str) -> str:
+    """The endpoint a request path belongs to, for method-limit bucketing.
+    Unrecognized paths fall back to the path with every ID-looking segment
+    dropped, so they still get a (coarser) bucket of their own."""
+    for name, pattern in _METHOD_PATTERNS:
+        if pattern.search(path):
+            return name
+    return "/".join(segment for segment in path.split("/")[:5] if segment and not any(c.isdigit() for c in segment))
+
+
+class _Window:
+    __slots__ = ("limit", "seconds", "count", "started")
+
+    def __init__(self, limit: int, seconds: int):
+        self.limit = limit
+        self.seconds = seconds
+        self.count = 0
+        self.started = None
+
+    def roll(self, now: float):
+        if self.started is None or now - self.started >= self.seconds:
+            self.started = now
+            self.count = 0
+
+    def wait_time(self, now: float) -> float:
+        self.roll(now)
+        if self.count < self.limit:
+            return 0.0
+        return self.started + self.seconds + WINDOW_SLACK_SECONDS - now
+
+
+class _Bucket:
+    """One set of windows (an application or a method limit on one host),
+    plus an optional hard block from a 429."""
+
+    def __init__(self, limits: Optional[dict[int, int]] = None):
+        self.windows = {}
+        self.blocked_until = 0.0
+        if limits:
+            self.set_limits(limits)
+
+    def set_limits(self, limits: dict[int, int]):
+        for seconds in list(self.windows):
+            if seconds not in limits:
+                del self.windows[seconds]
+        for seconds, limit in limits.items():
+            if seconds in self.windows:
+                self.windows[seconds].limit = limit
+            else:
+                self.windows[seconds] = _Window(limit, seconds)
+
+    def sync_counts(self, counts: dict[int, int], now: float):
+        for seconds, count in counts.items():
+            window = self.windows.get(seconds)
+            if window is None:
+                continue
+            window.roll(now)
+            window.count = max(window.count, count)
+
+    def wait_time(self, now: float) -> float:
+        wait = self.blocked_until - now
+        for window in self.windows.values():
+            wait = max(wait, window.wait_time(now))
+        return wait
+
+    def consume(self, now: float):
+        for window in self.windows.values():
+            window.roll(now)
+            window.count += 1
+
+
+class RiotRateLimiter:
+    """Thread-safe pacing for Riot API calls. Call acquire(url) before each
+    request -- it blocks just long enough for the request to be legal under
+    every known window for that host and method -- and update(url, ...) with
+    the response's status and headers afterwards."""
+
+    def __init__(self, default_app_limits: str = DEFAULT_APP_LIMITS):
+        self._default_app_limits = parse_rate_limit_header(default_app_limits)
+        self._app_buckets = {}
+        self._method_buckets = {}
+        self._lock = threading.Lock()
+
+    def _buckets_for(self, url: str) -> tuple[_Bucket, _Bucket]:
+        host, path = split_riot_url(url)
+        method = method_key(path)
+        app_bucket = self._app_buckets.get(host)
+        if app_bucket is None:
+            app_bucket = self._app_buckets[host] = _Bucket(self._default_app_limits)
+        method_bucket = self._method_buckets.get((host, method))
+        if method_bucket is None:
+            method_bucket = self._method_buckets[(host, method)] = _Bucket()
+        return app_bucket, method_bucket
+
+    def acquire(self, url: str):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                app_bucket, method_bucket = self._buckets_for(url)
+                wait = max(app_bucket.wait_time(now), method_bucket.wait_time(now))
+                if wait <= 0:
+                    app_bucket.consume(now)
+                    method_bucket.consume(now)
+                    return
+            time.sleep(wait)
+
+    def update(self, url: str, status_code: int, headers: Mapping[str, str]):
+        with self._lock:
+            now = time.monotonic()
+            app_bucket, method_bucket = self._buckets_for(url)
+
+            app_limits = parse_rate_limit_header(headers.get("X-App-Rate-Limit"))
+            if app_limits:
+                app_bucket.set_limits(app_limits)
+                app_bucket.sync_counts(parse_rate_limit_header(headers.get("X-App-Rate-Limit-Count")), now)
+
+            method_limits = parse_rate_limit_header(headers.get("X-Method-Rate-Limit"))
+            if method_limits:
+                method_bucket.set_limits(method_limits)
+                method_bucket.sync_counts(parse_rate_limit_header(headers.get("X-Method-Rate-Limit-Count")), now)
+
+            if status_code == 429:
+                try:
+                    retry_after = int(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+                except ValueError:
+                    retry_after = DEFAULT_RETRY_AFTER
+                # An application-limit 429 blocks every method on the host;
+                # method and service 429s only block that one endpoint.
+                blocked = app_bucket if headers.get("X-Rate-Limit-Type") == "application" else method_bucket
+                blocked.blocked_until = max(blocked.blocked_until, now + retry_after)
+
+
+_shared_limiter = RiotRateLimiter()
+
+
+def get_rate_limiter() -> RiotRateLimiter:
+    """The process-wide limiter every Riot caller should share -- separate
+    instances would each think they had the whole budget to themselves."""
+    return _shared_limiter
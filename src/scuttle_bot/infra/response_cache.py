@@ -0,0 +1,262 @@
+"""Stale-while-revalidate cache for Riot responses that change slowly:
+league-v4 ranked entries and champion mastery.
+
+A player's rank and mastery only move when they finish a game, yet both were
+refetched on every lookup -- predict_win_probability and
+Processor.process_participants each make ~20 of these calls per draft, and
+apex-tier collection sees the same players over and over. Each cached
+endpoint has a freshness policy (see CACHE_POLICIES): within fresh_seconds a
+hit is served as-is; past that but within stale_seconds it's still served
+immediately, and a background refresh brings the entry up to date for the
+next caller; past stale_seconds it's refetched inline like a miss.
+
+Absence is cached too, briefly (see NEGATIVE_CACHE_TTLS): "not in a game"
+from spectator, "no such account" from account-v1 and "no ranked entry" from
+league-v4 used to be asked again on every follow-up. A negative entry is
+dropped early once a new match ID shows up for its puuid (note_match_ids),
+since that's exactly when a player may have left a game or placed into
+ranked. Rows keep the puuid their URL is about, indexed, so that drop is a
+lookup rather than a scan of every cached URL.
+
+Entries live in their own sqlite file (RESPONSE_CACHE_DB_PATH) rather than
+scuttle_bot.db or ml_dataset.db, so the bot and a collection job on the same
+host share one cache, fronted by an in-process LRU of raw response bodies.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.infra.rate_limiter import method_key
+from scuttle_bot.utilities.schemas import split_riot_url
+
+RESPONSE_CACHE_DB_PATH = os.getenv("RIOT_CACHE_DB_PATH", "src/scuttle_bot/cache/riot_cache.db")
+RESPONSE_CACHE_SCHEMA_PATH = "src/scuttle_bot/infra/response_cache_schema.sql"
+
+MAX_MEMORY_ENTRIES = 4096
+MAX_REFRESH_WORKERS = 2
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    fresh_seconds: float
+    stale_seconds: float
+
+
+# Keyed by rate_limiter.method_key -- endpoints not listed here aren't cached.
+# Ranked entries go stale faster than mastery: LP moves every game, while a
+# mastery total is only used as a coarse "how much has this player played
+# this champion" signal.
+CACHE_POLICIES = {
+    "league-v4.entries-by-puuid": CachePolicy(fresh_seconds=10 * 60, stale_seconds=6 * 60 * 60),
+    "champion-mastery-v4.top": CachePolicy(fresh_seconds=60 * 60, stale_seconds=24 * 60 * 60),
+    "champion-mastery-v4.by-puuid": CachePolicy(fresh_seconds=60 * 60, stale_seconds=24 * 60 * 60),
+}
+
+
+# Keyed like CACHE_POLICIES: how long a "nothing here" answer (a 404, or an
+# empty 200 body) is trusted. Deliberately short -- a player can queue up or
+# finish placements at any moment, and a wrong "no" is worse than a refetch.
+NEGATIVE_CACHE_TTLS = {
+    "spectator-v5.active-game": 60,
+    "account-v1.by-riot-id": 15 * 60,
+    "league-v4.entries-by-puuid": 30 * 60,
+}
+
+# Returned by a fetch callable in place of a parsed body when Riot answered
+# 404, so a genuine "doesn't exist" can be told apart from a failure (None)
+# that mustn't be cached. Callers of get_json never see it -- a negative hit
+# comes back as None.
+NOT_FOUND = object()
+
+
+# The puuid in a puuid-keyed URL -- spectator-v5 takes it "by-summoner".
+_PUUID_IN_PATH = re.compile(r"/by-(?:puuid|summoner)/([^/?]+)")
+
+
+def puuid_for(url: str) -> Optional[str]:
+    match = _PUUID_IN_PATH.search(split_riot_url(url)[1])
+    return match.group(1) if match else None
+
+
+def policy_for(url: str) -> Optional[CachePolicy]:
+    return CACHE_POLICIES.get(method_key(split_riot_url(url)[1]))
+
+
+def negative_ttl_for(url: str) -> Optional[float]:
+    return NEGATIVE_CACHE_TTLS.get(method_key(split_riot_url(url)[1]))
+
+
+class ResponseCache(DatabaseClient):
+    COLUMN_MIGRATIONS = {"riot_responses": {"negative": "INTEGER NOT NULL DEFAULT 0", "puuid": "TEXT"}}
+    # Negative rows from before puuid was added have none; they expire on
+    # their (short) TTL.
+    MIGRATED_INDEXES = {"idx_riot_responses_puuid": ("riot_responses", "puuid, negative")}
+
+    def __init__(self, db_path: str = RESPONSE_CACHE_DB_PATH, max_entries: int = MAX_MEMORY_ENTRIES):
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()  # url -> (body text, fetched_at, negative)
+        self._negative_urls = {}  # puuid -> URLs of its negative entries in _memory
+        self._latest_match_ids = OrderedDict()  # puuid -> most recent match ID seen
+        self.max_entries = max_entries
+        self._refreshing = set()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=MAX_REFRESH_WORKERS, thread_name_prefix="riot-cache-refresh")
+        super().__init__(db_path, sql_script_path=RESPONSE_CACHE_SCHEMA_PATH)
+
+    def get_json(self, url: str, fetch: Callable[[], Any]) -> Any:
+        """Parsed JSON for url, from the cache when the endpoint's policies
+        allow it, else from fetch() -- which should return the parsed
+        response, NOT_FOUND for a 404, or None for a failure that mustn't be
+        cached. Returns None for a 404, cached or not. An exception from an
+        inline fetch propagates to the caller; one from a background refresh
+        is only logged, the stale entry staying in place."""
+        policy = policy_for(url)
+        negative_ttl = negative_ttl_for(url)
+        if policy is None and negative_ttl is None:
+            value = fetch()
+            return None if value is NOT_FOUND else value
+
+        entry = self._lookup(url)
+        if entry is not None:
+            body, fetched_at, negative = entry
+            age = time.time() - fetched_at
+            if negative:
+                if negative_ttl is not None and age < negative_ttl:
+                    return json.loads(body)
+            elif policy is not None:
+                if age < policy.fresh_seconds:
+                    return json.loads(body)
+                if age < policy.stale_seconds:
+                    self._refresh_in_background(url, fetch)
+                    return json.loads(body)
+
+        return self._fetch_and_store(url, fetch)
+
+    def invalidate(self, url: str):
+        with self._lock:
+            self._forget(url)
+        self.execute_query("DELETE FROM riot_responses WHERE url = ?", (url,))
+
+    def note_match_ids(self, puuid: str, match_ids: Optional[list]):
+        """Called with every matchlist fetched for a puuid. A most-recent
+        match ID we haven't seen before means the player just finished a
+        game, so any negative entry about them ("not in game", "unranked")
+        may no longer hold and is dropped."""
+        if not match_ids:
+            return
+        with self._lock:
+            changed = self._latest_match_ids.get(puuid) != match_ids[0]
+            self._latest_match_ids[puuid] = match_ids[0]
+            self._latest_match_ids.move_to_end(puuid)
+            while len(self._latest_match_ids) > self.max_entries:
+                self._latest_match_ids.popitem(last=False)
+        if changed:
+            self.invalidate_negative(puuid)
+
+    def invalidate_negative(self, puuid: str):
+        with self._lock:
+            for url in self._negative_urls.pop(puuid, ()):
+                self._memory.pop(url, None)
+        self.execute_query("DELETE FROM riot_responses WHERE puuid = ? AND negative = 1", (puuid,))
+
+    def _lookup(self, url: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+                return entry
+        result = self.execute_query("SELECT body, fetched_at, negative FROM riot_responses WHERE url = ?", (url,))
+        if not result:
+            return None
+        body, fetched_at, negative = result[0]
+        self._remember(url, body, fetched_at, bool(negative))
+        return body, fetched_at, bool(negative)
+
+    def _fetch_and_store(self, url: str, fetch: Callable[[], Any]) -> Any:
+        value = fetch()
+        if value is None:
+            return None
+
+        if value is NOT_FOUND:
+            value = None
+            negative = True
+        else:
+            # league-v4 answers "no ranked entry" with a 200 and an empty
+            # list rather than a 404 -- just as much a negative answer, on
+            # the endpoints with a negative TTL. Elsewhere an empty body (a
+            # player with no mastery) is the answer, cached like any other.
+            negative = negative_ttl_for(url) is not None and isinstance(value, (list, dict)) and not value
+
+        if negative and negative_ttl_for(url) is None:
+            return value
+        if not negative and policy_for(url) is None:
+            return value
+
+        body = json.dumps(value)
+        fetched_at = time.time()
+        self._remember(url, body, fetched_at, negative)
+        self.execute_query(
+            "INSERT OR REPLACE INTO riot_responses (url, body, fetched_at, negative, puuid) VALUES (?, ?, ?, ?, ?)",
+            (url, body, fetched_at, int(negative), puuid_for(url))
+        )
+        return value
+
+    def _refresh_in_background(self, url: str, fetch: Callable[[], Any]):
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def refresh():
+            try:
+                self._fetch_and_store(url, fetch)
+            except Exception as e:
+                logging.warning(f"Background refresh of {url} failed, keeping the stale entry: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+
+        self._refresh_pool.submit(refresh)
+
+    def _remember(self, url: str, body: str, fetched_at: float, negative: bool):
+        with self._lock:
+            self._forget(url)
+            self._memory[url] = (body, fetched_at, negative)
+            puuid = puuid_for(url) if negative else None
+            if puuid is not None:
+                self._negative_urls.setdefault(puuid, set()).add(url)
+            while len(self._memory) > self.max_entries:
+                self._forget(next(iter(self._memory)))
+
+    def _forget(self, url: str):
+        """Drops url from the in-memory cache. Hold self._lock."""
+        entry = self._memory.pop(url, None)
+        if entry is None or not entry[2]:
+            return
+        puuid = puuid_for(url)
+        urls = self._negative_urls.get(puuid)
+        if urls is not None:
+            urls.discard(url)
+            if not urls:
+                del self._negative_urls[puuid]
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """The process-wide cache, opened on first use rather than at import so
+    importing a Riot client doesn't create a sqlite file as a side effect."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS riot_responses (
+    url TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    negative INTEGER NOT NULL DEFAULT 0,
+    puuid TEXT
+);
\ No newline at end of file
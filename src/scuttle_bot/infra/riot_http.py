@@ -0,0 +1,171 @@
+"""Pooled, keep-alive HTTP sessions for Riot API and Data Dragon traffic.
+
+A bare requests.get() opens (and throws away) a fresh TCP + TLS connection
+per call. One predict_win_probability makes ~30 sequential Riot calls and a
+collection run makes thousands, so the handshakes alone were a large share of
+the wall time. Here every routing host (na1.api.riotgames.com,
+americas.api.riotgames.com, ddragon.leagueoflegends.com, ...) gets its own
+long-lived requests.Session with a connection pool, so consecutive calls to
+the same host reuse an already-open connection.
+
+riot_get() is the one entry point for Riot API calls: it paces the call
+through the shared rate limiter (see rate_limiter.py) and sends it over the
+host's pooled session. Identical calls already in flight are coalesced --
+when several Discord users ask about the same streamer at once, only the
+first caller's request goes out and the rest wait for its response.
+"""
+
+import os
+import threading
+from typing import Callable, Optional, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scuttle_bot.infra.rate_limiter import get_rate_limiter
+
+# requests has no default timeout -- a stalled connection blocks forever with
+# no exception ever raised, which would freeze the bot's event loop or hang a
+# collection run indefinitely. Every call gets one: (connect, read) seconds.
+DEFAULT_TIMEOUT = (5, 30)
+
+# Per-host overrides of DEFAULT_TIMEOUT, keyed by hostname.
+HOST_TIMEOUTS: dict[str, Union[float, tuple]] = {}
+
+# Connections kept open per host. Serial callers only ever need one; the
+# headroom is for threads fanning out to the same host concurrently.
+DEFAULT_POOL_SIZE = int(os.getenv("RIOT_HTTP_POOL_SIZE", "10"))
+
+
+class SessionPool:
+    """One pooled requests.Session per host, created on first use."""
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        default_timeout: Union[float, tuple] = DEFAULT_TIMEOUT,
+        host_timeouts: Optional[dict] = None,
+    ):
+        self.pool_size = pool_size
+        self.default_timeout = default_timeout
+        self.host_timeouts = dict(HOST_TIMEOUTS if host_timeouts is None else host_timeouts)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str) -> requests.Session:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Retries stay with the callers (Collector._get_json already
+                # retries 429s through the rate limiter); the adapter only
+                # pools connections.
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def timeout_for(self, url: str) -> Union[float, tuple]:
+        return self.host_timeouts.get(urlparse(url).hostname or "", self.default_timeout)
+
+    def get(self, url: str, headers: Optional[dict] = None) -> requests.Response:
+        return self.session_for(url).get(url, headers=headers, timeout=self.timeout_for(url))
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_shared_pool = SessionPool()
+
+
+def get_session_pool() -> SessionPool:
+    return _shared_pool
+
+
+class _Call:
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key: the first caller runs
+    fn, later callers block until it finishes and get its result (or its
+    exception). Nothing is remembered once the call completes -- this only
+    dedupes requests that overlap in time, it's not a cache."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = fn()
+            return call.response
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+_in_flight = SingleFlight()
+
+# Called as hook(url, response) after every response that actually went over
+# the wire (a coalesced caller doesn't trigger it again) -- e.g.
+# test/riot_fixtures.FixtureRecorder capturing real traffic for replay.
+_response_hooks = []
+
+
+def add_response_hook(hook: Callable[[str, requests.Response], None]):
+    _response_hooks.append(hook)
+
+
+def remove_response_hook(hook: Callable[[str, requests.Response], None]):
+    if hook in _response_hooks:
+        _response_hooks.remove(hook)
+
+
+def _send(url: str, headers: dict) -> requests.Response:
+    limiter = get_rate_limiter()
+    limiter.acquire(url)
+    response = get_session_pool().get(url, headers=headers)
+    limiter.update(url, response.status_code, response.headers)
+    for hook in list(_response_hooks):
+        hook(url, response)
+    return response
+
+
+def riot_get(url: str, headers: dict) -> requests.Response:
+    """Rate-limited GET over the host's pooled session, shared with any
+    identical request already in flight. Returns the raw response whatever
+    its status -- interpreting it is up to the caller. A coalesced response
+    is the same object for every caller; its body is already read, so each
+    .json() call still parses into a fresh dict."""
+    # The token is part of the key so two keys in one process (rare, but
+    # e.g. a dev key alongside a production one) never share a response.
+    key = (url, headers.get("X-Riot-Token"))
+    return _in_flight.do(key, lambda: _send(url, headers))
@@ -7,17 +7,55 @@ CREATE TABLE IF NOT EXISTS interactions (
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- data is zstd-compressed JSON, compressed with payload_dictionaries entry
+-- dict_id (0: none) -- or, where dict_id is NULL, the JSON text of a row
+-- cached before compression, rewritten compressed the next time it's read.
+-- last_accessed (unix seconds) orders eviction; see cache_eviction.
 CREATE TABLE IF NOT EXISTS matches (
     match_id TEXT PRIMARY KEY,
     summoner_name TEXT NOT NULL,
     data TEXT NOT NULL,
-    cached_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    cached_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    dict_id INTEGER,
+    last_accessed REAL
 );
 
 CREATE TABLE IF NOT EXISTS match_timelines (
     match_id TEXT PRIMARY KEY,
     data TEXT NOT NULL,
-    cached_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    cached_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    dict_id INTEGER,
+    last_accessed REAL
+);
+
+-- One row per participant of each cached match, written with it, so lookups
+-- of a player's line in a match are index scans rather than a decode of the
+-- whole match JSON. Columns are DatabaseClient.CACHED_PARTICIPANT_FIELDS.
+CREATE TABLE IF NOT EXISTS cached_match_participants (
+    match_id TEXT NOT NULL,
+    participant_id INTEGER NOT NULL,
+    puuid TEXT NOT NULL,
+    team_id INTEGER,
+    team_position TEXT,
+    champion_id INTEGER,
+    champion TEXT,
+    kills INTEGER,
+    deaths INTEGER,
+    assists INTEGER,
+    win INTEGER,
+    riot_id_game_name TEXT,
+    riot_id_tagline TEXT,
+    PRIMARY KEY (match_id, participant_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cached_match_participants_puuid ON cached_match_participants (puuid, match_id);
+
+CREATE TABLE IF NOT EXISTS payload_dictionaries (
+    dict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    data BLOB NOT NULL,
+    samples INTEGER NOT NULL,
+    trained_at REAL NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS user_preferences (
@@ -33,4 +71,15 @@ CREATE TABLE IF NOT EXISTS registered_users (
     game_region TEXT NOT NULL,
     puuid TEXT NOT NULL,
     registered_at DATETIME DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS riot_accounts (
+    game_name TEXT NOT NULL,
+    tag_line TEXT NOT NULL,
+    region TEXT NOT NULL,
+    puuid TEXT NOT NULL,
+    resolved_at REAL NOT NULL,
+    PRIMARY KEY (game_name, tag_line, region)
+);
+
+CREATE INDEX IF NOT EXISTS idx_riot_accounts_puuid ON riot_accounts (puuid, region);
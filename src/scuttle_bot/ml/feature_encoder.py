@@ -28,6 +28,9 @@ ROLE_TO_SLOT = {"top": "top", "jungle": "jungle", "middle": "mid", "bottom": "ad
 SLOTS = [f"{team}_{role}" for team in ("blue", "red") for role in ("top", "jungle", "mid", "adc", "support")]
 PARTICIPANT_STATS = ["rank_score", "win_rate", "games", "champion_points", "champion_level"]
 PARTICIPANT_COLUMNS = [f"{slot}_{stat}" for slot in SLOTS for stat in PARTICIPANT_STATS]
+# The match_participants columns join_participants reads -- all a trainer
+# needs to load.
+PARTICIPANT_SOURCE_COLUMNS = ["match_id", "team", "role", "tier", "rank", "wins", "losses", "win_rate", "champion_points", "champion_level"]
 
 # Same mmr-like scale as Processor.process_ranked_stats, so a missing player's
 # rank_score can fall back to the match's average_tier.
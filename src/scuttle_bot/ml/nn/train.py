@@ -2,8 +2,9 @@ import json
 import statistics
 
 from scuttle_bot.data.dataset import Dataset
+from scuttle_bot.data.snapshot import load_table
 from scuttle_bot.ml.nn.nn_model import NeuralNetworkModel
-from scuttle_bot.ml.feature_encoder import FeatureEncoder
+from scuttle_bot.ml.feature_encoder import FeatureEncoder, PARTICIPANT_SOURCE_COLUMNS
 from scuttle_bot.ml.greedy_search import cross_val_metric, greedy_hyperparameter_search
 
 MODELS_DIR = "src/scuttle_bot/ml/nn/models"
@@ -44,8 +45,8 @@ TEST_SIZE = 0.2
 
 def main():
     dataset = Dataset(db_path="src/scuttle_bot/cache/ml_dataset.db")
-    df = dataset.retrieve_dataset()
-    participants_df = dataset.retrieve_match_participants()
+    df = load_table(dataset, "matches")
+    participants_df = load_table(dataset, "match_participants", columns=PARTICIPANT_SOURCE_COLUMNS)
     print(f"{len(df)} matches")
 
     variant_models_dir = f"{MODELS_DIR}/{VARIANT}"
@@ -9,6 +9,7 @@ from zoneinfo import ZoneInfo
 from discord.ext import tasks
 
 from scuttle_bot.utilities.schemas import Region
+from scuttle_bot.infra.cache_eviction import MatchCacheEvictor, MATCH_CACHE_EVICTION_MINUTES
 from src.scuttle_bot.service.service import ScuttleBotService
 from scuttle_bot.llm.llm import LLMService
 from src.scuttle_bot.infra.db_client import DatabaseClient
@@ -43,6 +44,7 @@ class ScuttleBot(discord.Client):
         self.service = ScuttleBotService(db=self.db)
         self.llm_service = LLMService(db=self.db)
         self.reporter = Reporter(db_client=self.db, llm_service=self.llm_service)
+        self.cache_evictor = MatchCacheEvictor(self.db)
 
         self.testing = kwargs.get('testing', False)
 
@@ -52,6 +54,8 @@ class ScuttleBot(discord.Client):
         # on_ready fires again on every reconnect.
         if not self.daily_report_task.is_running():
             self.daily_report_task.start()
+        if not self.evict_cache_task.is_running():
+            self.evict_cache_task.start()
 
     async def on_message(self, message: discord.Message):
         try:
@@ -167,6 +171,15 @@ class ScuttleBot(discord.Client):
         # (fetch_user / DMs need an established gateway connection).
         await self.wait_until_ready()
 
+    @tasks.loop(minutes=MATCH_CACHE_EVICTION_MINUTES)
+    async def evict_cache_task(self):
+        # A pass can delete thousands of rows and vacuum, so it runs off the
+        # event loop like the daily report.
+        try:
+            await asyncio.to_thread(self.cache_evictor.run_once)
+        except Exception as e:
+            logging.error(f"Match cache eviction failed: {e}")
+
     async def report_daily(self):
         logging.info("Starting daily report generation...")
         # generate_report() is synchronous and slow (an LLM call plus a 10s
@@ -2,21 +2,23 @@
 live games, and match history.
 
 RiotClientMixin is mixed into ScuttleBotService, which owns the shared HTTP
-session state (self.headers, self.lol_url, self.db, self.champion_mapping,
-self.error_traceback) these methods read -- it isn't meant to be used
-standalone.
+session state (self.headers, self.db, self.account_cache,
+self.champion_mapping, self.error_traceback) these methods read -- it isn't
+meant to be used standalone.
 """
 
-import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Literal, Optional
 from urllib.parse import parse_qs, urlparse
 
-import requests
-
-from scuttle_bot.utilities.schemas import Region, get_account_routing_url, get_match_routing_url
+from scuttle_bot.utilities.schemas import Region, get_account_routing_url, get_match_routing_url, get_platform_routing_url
 from scuttle_bot.data.collector import Collector
+from scuttle_bot.infra.db_client import match_participants
+from scuttle_bot.infra.payload_codec import MATCH, TIMELINE
+from scuttle_bot.infra.riot_http import riot_get
+from scuttle_bot.infra.response_cache import NOT_FOUND, get_response_cache
 from scuttle_bot.utilities.role_inference import infer_roles
 
 # Smite is the only summoner spell reserved for one role in 5v5 ranked, so it's
@@ -25,11 +27,6 @@ from scuttle_bot.utilities.role_inference import infer_roles
 # from timeline data, not something available on a live game.
 SMITE_SPELL_ID = 11
 
-# requests.get() has no default timeout -- a stalled connection blocks
-# forever with no exception ever raised, which would freeze the bot's whole
-# event loop indefinitely. Every call in this module gets one explicitly.
-REQUEST_TIMEOUT = 30
-
 # Match-v5's teamPosition uses Riot's internal lane names -- normalized here
 # to match the top/jungle/mid/adc/support vocabulary used elsewhere in this
 # codebase (e.g. get_active_game, PlayerDraftEntry).
@@ -48,20 +45,51 @@ _TEAM_POSITION_TO_ROLE = {
 # (e.g. "NA1_5607321601") used everywhere else in this codebase.
 _REPLAY_URL_MATCH_ID_RE = re.compile(r"/([A-Za-z0-9]+_\d+)/\d+\.replay")
 
+# Upper bound on match-detail fetches in flight at once when resolving a
+# whole matchlist. Each fetch still goes through the shared rate limiter, so
+# this only caps how many threads can be waiting on Riot at a time -- enough
+# to hide per-request latency, not a way around the key's budget.
+MAX_CONCURRENT_MATCH_FETCHES = 8
+
 
 class RiotClientMixin:
+    def _riot_get(self, url: str):
+        """Every Riot call in this mixin goes through here, so it's paced by
+        the same process-wide rate limiter as Collector's -- the bot's
+        lookups and any collection running alongside share one budget -- and
+        sent over the routing host's pooled keep-alive session."""
+        return riot_get(url, headers=self.headers)
+
+    def _riot_get_cached_json(self, url: str):
+        """Parsed 200 response for url through the shared response cache
+        (stale-while-revalidate for ranked entries and mastery, short-lived
+        negative entries for 404s -- see response_cache). Returns None for a
+        404 and raises on any other error status, like the uncached lookups
+        in this mixin; those errors are never cached."""
+        def fetch():
+            response = self._riot_get(url)
+            if response.status_code == 404:
+                return NOT_FOUND
+            if response.status_code != 200:
+                raise Exception(response.status_code)
+            return response.json()
+        return get_response_cache().get_json(url, fetch)
+
     def get_puuid(self, summoner_name: str, tag_line: str, region: Region = Region.NA) -> Optional[str]:
         if isinstance(region, str):
             region = Region(region)
         try:
-            riot_url = get_account_routing_url(region)
-            response = requests.get(f"{riot_url}/riot/account/v1/accounts/by-riot-id/{summoner_name}/{tag_line}", headers=self.headers, timeout=REQUEST_TIMEOUT)
-            if response.status_code == 200:
-                response = response.json()
-                puuid = response["puuid"]
+            puuid = self.account_cache.get(summoner_name, tag_line, region.value)
+            if puuid is not None:
                 return puuid
-            else:
-                raise Exception(response.status_code)
+
+            riot_url = get_account_routing_url(region)
+            account = self._riot_get_cached_json(f"{riot_url}/riot/account/v1/accounts/by-riot-id/{summoner_name}/{tag_line}")
+            if account is None:
+                return None
+            puuid = account["puuid"]
+            self.account_cache.put(summoner_name, tag_line, region.value, puuid)
+            return puuid
         except Exception as e:
             self.error_traceback()
             return None
@@ -83,13 +111,8 @@ class RiotClientMixin:
             if puuid is None:
                 return None
 
-            url = self.lol_url.format(region=region.value)
-            response = requests.get(f"{url}/lol/league/v4/entries/by-puuid/{puuid}", headers=self.headers, timeout=REQUEST_TIMEOUT)
-            if response.status_code == 200:
-                response = response.json()
-                return response
-            else:
-                raise Exception(response.status_code)
+            url = get_platform_routing_url(region)
+            return self._riot_get_cached_json(f"{url}/lol/league/v4/entries/by-puuid/{puuid}")
         except Exception as e:
             self.error_traceback()
             return None
@@ -111,15 +134,13 @@ class RiotClientMixin:
             if puuid is None:
                 return None
 
-            url = self.lol_url.format(region=region.value)
-            response = requests.get(f"{url}/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top?count={count}", headers=self.headers, timeout=REQUEST_TIMEOUT)
-            if response.status_code == 200:
-                response = response.json()
-                for mastery in response:
-                    mastery["championName"] = self.champion_mapping.get(mastery["championId"], mastery["championId"])
-                return response
-            else:
-                raise Exception(response.status_code)
+            url = get_platform_routing_url(region)
+            response = self._riot_get_cached_json(f"{url}/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top?count={count}")
+            if response is None:
+                return None
+            for mastery in response:
+                mastery["championName"] = self.champion_mapping.get(mastery["championId"], mastery["championId"])
+            return response
         except Exception as e:
             self.error_traceback()
             return None
@@ -210,24 +231,95 @@ class RiotClientMixin:
             url += f"&startTime={int(start_time)}"
         if end_time is not None:
             url += f"&endTime={int(end_time)}"
-        response = requests.get(url, headers=self.headers, timeout=REQUEST_TIMEOUT)
+        response = self._riot_get(url)
         if response.status_code != 200:
             raise Exception(response.status_code)
-        return response.json()
+        match_ids = response.json()
+        get_response_cache().note_match_ids(puuid, match_ids)
+        return match_ids
 
     def _get_cached_match_detail(self, match_id: str, summoner_name: str, region: Region) -> Optional[dict]:
         """Raw match-v5 match detail, from the local cache if present, else
-        fetched from Riot and cached. Shared by get_match_stats and the
-        performance-trend analyzer so both draw from (and populate) the same
-        cache instead of double-fetching. Internal helper -- not exposed as
-        an LLM tool.
+        fetched from Riot and cached. For the rare caller that needs more of
+        a match than _get_cached_match_participants keeps -- it draws from
+        (and populates) the same cache. Internal helper -- not exposed as an
+        LLM tool.
         """
-        if self.db.exists_match(match_id):
-            return self.db.retrieve_match(match_id)
-        match_url = get_match_routing_url(region)
-        match = requests.get(f"{match_url}/lol/match/v5/matches/{match_id}", headers=self.headers, timeout=REQUEST_TIMEOUT).json()
-        self.db.store_match(match_id=match_id, summoner_name=summoner_name, data=json.dumps(match))
-        return match
+        return self._get_cached_match_details([match_id], summoner_name=summoner_name, region=region).get(match_id)
+
+    def _get_cached_match_details(self, match_ids: list[str], summoner_name: str, region: Region) -> dict:
+        """Batch form of _get_cached_match_detail for a whole matchlist: one
+        cache query for every ID, the misses fetched from Riot concurrently
+        (at most MAX_CONCURRENT_MATCH_FETCHES in flight), and all of them
+        written back to the cache in a single transaction. Returns
+        {match_id: match} -- IDs that couldn't be fetched are simply absent,
+        so callers look each one up in their own order.
+        """
+        matches, missing = self.db.get_matches(match_ids)
+        if missing:
+            matches.update(self._fetch_and_cache_match_details(missing, summoner_name=summoner_name, region=region))
+        return matches
+
+    def _get_cached_match_participants(self, match_ids: list[str], summoner_name: str, region: Region, puuid: Optional[str] = None) -> dict:
+        """{match_id: [participant, ...]} for a matchlist, each participant
+        cut down to the fields cached_match_participants keeps (see
+        DatabaseClient.retrieve_match_participants) -- all most lookups
+        need, answered from an index rather than by decoding each match's
+        JSON. With puuid, only that player's entry. Misses are fetched and
+        cached like _get_cached_match_details's; IDs that couldn't be
+        fetched are absent.
+        """
+        participants = self.db.retrieve_match_participants(match_ids, puuid=puuid) if match_ids else {}
+        missing = [match_id for match_id in dict.fromkeys(match_ids) if match_id not in participants]
+        if missing:
+            fetched = self._fetch_and_cache_match_details(missing, summoner_name=summoner_name, region=region)
+            for match_id, match in fetched.items():
+                participants[match_id] = [p for p in match_participants(match) if puuid is None or p["puuid"] == puuid]
+        return participants
+
+    def _fetch_and_cache_match_details(self, match_ids: list[str], summoner_name: str, region: Region) -> dict:
+        """Fetches match details from Riot concurrently (at most
+        MAX_CONCURRENT_MATCH_FETCHES in flight) and writes them all to the
+        cache in a single transaction. Returns {match_id: match} for the
+        ones Riot returned."""
+        fetched = self._fetch_concurrently(match_ids, lambda match_id: self._fetch_match_detail(match_id, region=region))
+        self.db.put_many(MATCH, fetched, summoner_name=summoner_name)
+        self._remember_participant_accounts(list(fetched.values()), region)
+        return fetched
+
+    def _fetch_concurrently(self, match_ids: list[str], fetch) -> dict:
+        """{match_id: fetch(match_id)} for the match_ids fetch returned
+        something for, at most MAX_CONCURRENT_MATCH_FETCHES in flight."""
+        if not match_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_MATCH_FETCHES, len(match_ids))) as pool:
+            fetched = dict(zip(match_ids, pool.map(fetch, match_ids)))
+        return {match_id: result for match_id, result in fetched.items() if result is not None}
+
+    def _fetch_match_detail(self, match_id: str, region: Region) -> Optional[dict]:
+        """Uncached match-v5 match detail, or None if Riot didn't return one
+        -- never an error payload, so nothing bogus ends up in the cache.
+        Safe to call from worker threads: it touches no db state."""
+        try:
+            match_url = get_match_routing_url(region)
+            response = self._riot_get(f"{match_url}/lol/match/v5/matches/{match_id}")
+            if response.status_code != 200:
+                raise Exception(response.status_code)
+            return response.json()
+        except Exception as e:
+            self.error_traceback()
+            return None
+
+    def _remember_participant_accounts(self, matches: list[dict], region: Region):
+        """A fresh match detail carries every participant's current Riot ID
+        next to their puuid -- caching those for free saves the account-v1
+        call when someone asks about a teammate next, and is how a renamed
+        player's cache entry gets corrected."""
+        self.account_cache.put_many([
+            (p.get("riotIdGameName"), p.get("riotIdTagline"), region.value, p.get("puuid"))
+            for match in matches
+            for p in match.get("info", {}).get("participants", [])
+        ])
 
     def get_match_timeline(self, match_id: str, region: Region = Region.NA) -> Optional[dict]:
         """Raw match-v5 timeline for a match: ~60s frames with each
@@ -238,20 +330,35 @@ class RiotClientMixin:
         find_notable_moments -- a full timeline is large and not useful on
         its own, so it isn't exposed as its own LLM tool.
         """
+        return self.get_match_timelines([match_id], region=region).get(match_id)
+
+    def get_match_timelines(self, match_ids: list[str], region: Region = Region.NA) -> dict:
+        """Batch form of get_match_timeline: one cache query for the whole
+        list, the misses fetched concurrently and cached in one transaction.
+        Returns {match_id: timeline}, without the ones that couldn't be
+        fetched. Internal building block, like get_match_timeline."""
         if isinstance(region, str):
             region = Region(region)
         try:
-            if self.db.exists_match_timeline(match_id):
-                return self.db.retrieve_match_timeline(match_id)
+            timelines, missing = self.db.get_timelines(match_ids)
+            if missing:
+                fetched = self._fetch_concurrently(missing, lambda match_id: self._fetch_match_timeline(match_id, region=region))
+                self.db.put_many(TIMELINE, fetched)
+                timelines.update(fetched)
+            return timelines
+        except Exception as e:
+            self.error_traceback()
+            return {}
 
+    def _fetch_match_timeline(self, match_id: str, region: Region) -> Optional[dict]:
+        """Uncached match-v5 timeline, or None if Riot didn't return one.
+        Safe to call from worker threads, like _fetch_match_detail."""
+        try:
             match_url = get_match_routing_url(region)
-            response = requests.get(f"{match_url}/lol/match/v5/matches/{match_id}/timeline", headers=self.headers, timeout=REQUEST_TIMEOUT)
+            response = self._riot_get(f"{match_url}/lol/match/v5/matches/{match_id}/timeline")
             if response.status_code != 200:
                 raise Exception(response.status_code)
-
-            timeline = response.json()
-            self.db.store_match_timeline(match_id=match_id, data=json.dumps(timeline))
-            return timeline
+            return response.json()
         except Exception as e:
             self.error_traceback()
             return None
@@ -275,7 +382,7 @@ class RiotClientMixin:
             region = Region(region)
         try:
             match_url = get_match_routing_url(region)
-            response = requests.get(f"{match_url}/lol/match/v5/matches/by-puuid/{puuid}/replays", headers=self.headers, timeout=REQUEST_TIMEOUT)
+            response = self._riot_get(f"{match_url}/lol/match/v5/matches/by-puuid/{puuid}/replays")
             if response.status_code != 200:
                 raise Exception(response.status_code)
 
@@ -345,10 +452,10 @@ class RiotClientMixin:
                 return None
 
             match_ids = self._fetch_match_ids(puuid, region=region, start_time=start_time, end_time=end_time, count=count)
-            stats = []
-            for match_id in match_ids:
-                stats.append(self.get_match_stats(match_id, puuid, summoner_name=summoner_name, region=region, stats_level=stats_level))
-            return stats
+            participants = self._get_cached_match_participants(
+                match_ids, summoner_name=summoner_name, region=region, puuid=puuid if stats_level == "personal" else None
+            )
+            return [self._extract_match_stats(participants.get(match_id), puuid, stats_level=stats_level) for match_id in match_ids]
         except Exception as e:
             self.error_traceback()
             return None
@@ -380,13 +487,24 @@ class RiotClientMixin:
         if isinstance(region, str):
             region = Region(region)
         try:
-            match = self._get_cached_match_detail(match_id, summoner_name=summoner_name, region=region)
-            if match is None:
+            participants = self._get_cached_match_participants(
+                [match_id], summoner_name=summoner_name, region=region, puuid=puuid if stats_level == "personal" else None
+            )
+            return self._extract_match_stats(participants.get(match_id), puuid, stats_level=stats_level)
+        except Exception as e:
+            self.error_traceback()
+            return None
+
+    def _extract_match_stats(self, participants: Optional[list], puuid: str, stats_level: Literal["personal", "advanced"] = "personal") -> Optional[dict]:
+        """get_match_stats's result shape, computed from a match's
+        already-fetched participants (_get_cached_match_participants). None
+        if the match is missing or the player isn't in it."""
+        try:
+            if participants is None:
                 return None
 
-            match_info = match["info"]
             personal_stats = None
-            for participant in match_info["participants"]:
+            for participant in participants:
                 if participant["puuid"] == puuid:
                     personal_stats = {
                         "champion": participant["championName"],
@@ -415,7 +533,7 @@ class RiotClientMixin:
                     "assists": p.get("assists"),
                     "win": p.get("win"),
                 }
-                for p in match_info["participants"]
+                for p in participants
                 if p["puuid"] != puuid
             ]
             return {**personal_stats, "participants": other_participants}
@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 
 from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.infra.account_cache import AccountCache
 from scuttle_bot.utilities.schemas import Region
 from scuttle_bot.infra.aws_client import get_riot_api_key
 from scuttle_bot.utilities.utilities import get_champion_mapping, error_traceback
@@ -18,7 +19,7 @@ class ScuttleBotService(RiotClientMixin, SummonerProfileMixin, RegistrationMixin
     lives in its own mixin module (riot_client.py, summoner_profile.py,
     registration.py, personality_service.py, analyzer/match_analyzer.py);
     this class just composes them and owns the shared state (HTTP headers,
-    db, champion mapping) they all read via self.
+    db, Riot ID cache, champion mapping) they all read via self.
     """
 
     def __init__(self, db: DatabaseClient):
@@ -28,8 +29,8 @@ class ScuttleBotService(RiotClientMixin, SummonerProfileMixin, RegistrationMixin
         self.headers = {
             "X-Riot-Token": self.riot_key
         }
-        self.lol_url = "https://{region}.api.riotgames.com"
         self.db = db
+        self.account_cache = AccountCache(db)
         self.champion_mapping = get_champion_mapping()
         self.error_traceback = error_traceback
 
@@ -0,0 +1,288 @@
+"""
+Record/replay of Riot API traffic, so RiotClientMixin, Collector,
+Dataset.create_dataset and MatchAnalyzerMixin can be exercised -- and
+benchmarked -- without live Riot access.
+
+Recording captures every response riot_get actually sends (body, status
+code, and the rate-limit headers the limiter reads) into a gzipped JSON-lines
+archive. Replay serves that archive from a local HTTP stand-in, with
+configurable latency, emulated application rate limits and random 429
+injection; every Riot base URL is built by schemas.get_riot_base_url, so
+setting RIOT_API_URL_TEMPLATE to the server's template redirects all of it.
+
+Record by running any module under the recorder (real, billed API calls):
+    python -m scuttle_bot.test.riot_fixtures record fixtures.jsonl.gz scuttle_bot.data.run_collection
+
+Serve an archive for another process to point at:
+    python -m scuttle_bot.test.riot_fixtures serve fixtures.jsonl.gz --port 8765 --latency-ms 40 --inject-429-rate 0.01
+    RIOT_API_URL_TEMPLATE="http://127.0.0.1:8765/{host}" python -m ...
+
+Or in-process, from a benchmark:
+    with replaying("fixtures.jsonl.gz", latency_ms=40):
+        Dataset(db_path=...).create_dataset(...)
+
+The rate limiter and response cache are process-wide, so point
+RIOT_CACHE_DB_PATH at a scratch file when benchmarking -- otherwise cached
+responses from an earlier run skip the calls being measured.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import runpy
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse
+
+from scuttle_bot.infra.rate_limiter import parse_rate_limit_header
+from scuttle_bot.infra.riot_http import add_response_hook, remove_response_hook
+from scuttle_bot.utilities.schemas import split_riot_url
+
+# Response headers worth keeping: everything the rate limiter reads, plus
+# Content-Type so replayed bodies are served as what they are.
+FIXTURE_HEADERS = (
+    "X-App-Rate-Limit",
+    "X-App-Rate-Limit-Count",
+    "X-Method-Rate-Limit",
+    "X-Method-Rate-Limit-Count",
+    "X-Rate-Limit-Type",
+    "Retry-After",
+    "Content-Type",
+)
+
+
+class FixtureRecorder:
+    """While active, appends every Riot response riot_get sends to a
+    gzipped JSON-lines archive. Appending, so several recording sessions can
+    build up one archive."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        add_response_hook(self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_response_hook(self._record)
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def _record(self, url: str, response):
+        host, path = split_riot_url(url)
+        query = urlparse(url).query
+        entry = {
+            "host": host,
+            "path": f"{path}?{query}" if query else path,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in FIXTURE_HEADERS if name in response.headers},
+            "body": response.text,
+        }
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(entry) + "\n")
+
+
+def load_fixtures(path: str) -> dict:
+    """{(host, path with query): [recorded responses, oldest first]}."""
+    fixtures = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                fixtures.setdefault((entry["host"], entry["path"]), []).append(entry)
+    return fixtures
+
+
+class _AppLimitEmulator:
+    """Fixed-window application limits per host, mirroring how Riot counts,
+    so a replay run sees real 429s if it outpaces the configured key."""
+
+    def __init__(self, app_limits: str):
+        self.header = app_limits
+        self.limits = parse_rate_limit_header(app_limits)
+        self._windows = {}  # (host, seconds) -> [started, count]
+        self._lock = threading.Lock()
+
+    def hit(self, host: str) -> tuple[Optional[float], str]:
+        """Counts one request; returns (retry_after if over the limit else
+        None, the X-App-Rate-Limit-Count header value)."""
+        now = time.monotonic()
+        retry_after = None
+        counts = []
+        with self._lock:
+            for seconds, limit in self.limits.items():
+                window = self._windows.setdefault((host, seconds), [now, 0])
+                if now - window[0] >= seconds:
+                    window[0], window[1] = now, 0
+                window[1] += 1
+                counts.append(f"{window[1]}:{seconds}")
+                if window[1] > limit:
+                    remaining = window[0] + seconds - now
+                    retry_after = max(retry_after or 0, remaining)
+        return retry_after, ",".join(counts)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Local stand-in for the Riot API serving a recorded archive. Requests
+    arrive as /{host}/{api path}, per url_template. Repeated requests for the
+    same URL cycle through every response recorded for it, in order."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        fixtures: dict,
+        port: int = 0,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        inject_429_rate: float = 0.0,
+        app_limits: Optional[str] = None,
+        retry_after: int = 1,
+    ):
+        super().__init__(("127.0.0.1", port), _FixtureHandler)
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.inject_429_rate = inject_429_rate
+        self.retry_after = retry_after
+        self.app_limits = _AppLimitEmulator(app_limits) if app_limits else None
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url_template(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/{{host}}"
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="riot-fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def respond(self, host: str, path: str) -> tuple[int, dict, str]:
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+        headers = {}
+        if self.app_limits is not None:
+            over_by, counts = self.app_limits.hit(host)
+            headers = {"X-App-Rate-Limit": self.app_limits.header, "X-App-Rate-Limit-Count": counts}
+            if over_by is not None:
+                return 429, {**headers, "X-Rate-Limit-Type": "application", "Retry-After": str(max(1, int(over_by + 0.999)))}, ""
+
+        if self.inject_429_rate and random.random() < self.inject_429_rate:
+            return 429, {**headers, "X-Rate-Limit-Type": "method", "Retry-After": str(self.retry_after)}, ""
+
+        recorded = self.fixtures.get((host, path))
+        if not recorded:
+            body = json.dumps({"status": {"message": f"No fixture recorded for {host}{path}", "status_code": 404}})
+            return 404, {**headers, "Content-Type": "application/json"}, body
+
+        with self._lock:
+            index = self._cursors.get((host, path), 0)
+            self._cursors[(host, path)] = (index + 1) % len(recorded)
+        entry = recorded[index]
+        return entry["status"], {**entry["headers"], **headers}, entry["body"]
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        host, _, rest = self.path.lstrip("/").partition("/")
+        status, headers, body = self.server.respond(host.lower(), f"/{rest}")
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # One line per request would drown out whatever is being benchmarked.
+        pass
+
+
+@contextmanager
+def replaying(archive_path: str, **server_options):
+    """Serves archive_path and points RIOT_API_URL_TEMPLATE at it for the
+    duration of the block. server_options are FixtureServer's."""
+    server = FixtureServer(load_fixtures(archive_path), **server_options).start()
+    previous = os.environ.get("RIOT_API_URL_TEMPLATE")
+    os.environ["RIOT_API_URL_TEMPLATE"] = server.url_template
+    try:
+        yield server
+    finally:
+        if previous is None:
+            os.environ.pop("RIOT_API_URL_TEMPLATE", None)
+        else:
+            os.environ["RIOT_API_URL_TEMPLATE"] = previous
+        server.stop()
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="Run a module with every Riot response appended to an archive")
+    record.add_argument("archive")
+    record.add_argument("module", help="Module to run as __main__, e.g. scuttle_bot.data.run_collection")
+    record.add_argument("module_args", nargs=argparse.REMAINDER)
+
+    serve = subparsers.add_parser("serve", help="Replay an archive over HTTP")
+    serve.add_argument("archive")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency-ms", type=float, default=0)
+    serve.add_argument("--jitter-ms", type=float, default=0)
+    serve.add_argument("--inject-429-rate", type=float, default=0.0)
+    serve.add_argument("--app-limits", default=None, help='Emulated application limits, e.g. "20:1,100:120"')
+    serve.add_argument("--retry-after", type=int, default=1)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        sys.argv = [args.module, *args.module_args]
+        with FixtureRecorder(args.archive):
+            runpy.run_module(args.module, run_name="__main__", alter_sys=True)
+        return
+
+    fixtures = load_fixtures(args.archive)
+    server = FixtureServer(
+        fixtures,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        inject_429_rate=args.inject_429_rate,
+        app_limits=args.app_limits,
+        retry_after=args.retry_after,
+    )
+    print(f"Serving {sum(len(v) for v in fixtures.values())} recorded responses for {len(fixtures)} URLs.")
+    print(f'export RIOT_API_URL_TEMPLATE="{server.url_template}"')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Shared setup for the unit tests (test_*.py in this package). They run on
+temp sqlite files and the local fixture server, with no Riot, AWS or LLM
+access:
+
+    PYTHONPATH=src python -m unittest discover -s src/scuttle_bot/test -t src
+
+Schema and data paths across the package are relative to the repository
+root, so importing this module makes that the working directory.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+os.chdir(REPO_ROOT)
+
+POSITIONS = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+
+
+def match_detail(match_id: str, puuids: list, game_end: int = 1_700_000_000_000) -> dict:
+    """A ranked solo match-v5 detail with the fields collection reads, the
+    first five of puuids (ten in all) on blue, which wins."""
+    platform, _, game_id = match_id.partition("_")
+    return {
+        "metadata": {"matchId": match_id, "participants": list(puuids)},
+        "info": {
+            "gameId": int(game_id),
+            "platformId": platform,
+            "queueId": 420,
+            "gameVersion": "14.1.555.5555",
+            "gameDuration": 1800,
+            "gameEndTimestamp": game_end,
+            "teams": [
+                {"teamId": 100, "win": True, "bans": [{"championId": 1 + i, "pickTurn": i + 1} for i in range(5)]},
+                {"teamId": 200, "win": False, "bans": [{"championId": 11 + i, "pickTurn": i + 6} for i in range(5)]},
+            ],
+            "participants": [
+                {
+                    "participantId": i + 1,
+                    "puuid": puuid,
+                    "teamId": 100 if i < 5 else 200,
+                    "teamPosition": POSITIONS[i % 5],
+                    "championId": 21 + i,
+                    "championName": f"Champion{21 + i}",
+                    "kills": i,
+                    "deaths": 1,
+                    "assists": 2,
+                    "win": i < 5,
+                    "riotIdGameName": f"player{i}",
+                    "riotIdTagline": "NA1",
+                }
+                for i, puuid in enumerate(puuids)
+            ],
+        },
+    }
+
+
+class TempDirTestCase(unittest.TestCase):
+    """A scratch directory per test, removed afterwards."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="scuttle-test-")
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.temp_dir, name)
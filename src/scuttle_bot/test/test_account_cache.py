@@ -0,0 +1,56 @@
+import unittest
+
+from scuttle_bot.test.support import TempDirTestCase
+from scuttle_bot.infra.account_cache import AccountCache
+from scuttle_bot.infra.db_client import DatabaseClient
+
+
+class AccountCacheTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = DatabaseClient(self.path("scuttle_bot.db"))
+        self.addCleanup(self.db.close)
+        self.cache = AccountCache(self.db)
+
+    def test_riot_ids_are_case_insensitive(self):
+        self.cache.put("Faker", "KR1", "kr", "p1")
+        self.assertEqual(self.cache.get(" faker ", "kr1", "kr"), "p1")
+        self.assertIsNone(self.cache.get("Faker", "KR1", "na1"))
+
+    def test_survives_a_restart(self):
+        self.cache.put("Faker", "KR1", "kr", "p1")
+        self.assertEqual(AccountCache(self.db).get("Faker", "KR1", "kr"), "p1")
+
+    def test_entries_expire(self):
+        self.cache.put("Faker", "KR1", "kr", "p1")
+        self.db.execute_query("UPDATE riot_accounts SET resolved_at = resolved_at - 100")
+        expiring = AccountCache(self.db, ttl_seconds=50)
+        self.assertIsNone(expiring.get("Faker", "KR1", "kr"))
+        self.assertEqual(AccountCache(self.db, ttl_seconds=500).get("Faker", "KR1", "kr"), "p1")
+
+    def test_rename_drops_the_old_name(self):
+        self.cache.put("OldName", "NA1", "na1", "p1")
+        self.assertEqual(self.cache.get("OldName", "NA1", "na1"), "p1")
+        self.cache.put_many([("NewName", "NA1", "na1", "p1"), ("Other", "NA1", "na1", "p2")])
+        self.assertEqual(self.cache.get("NewName", "NA1", "na1"), "p1")
+        self.assertIsNone(self.cache.get("OldName", "NA1", "na1"))
+        self.assertIsNone(AccountCache(self.db).get("OldName", "NA1", "na1"))
+
+    def test_incomplete_accounts_are_skipped(self):
+        self.cache.put_many([("", "NA1", "na1", "p1"), ("Name", "NA1", "na1", None)])
+        self.assertEqual(self.db.execute_query("SELECT COUNT(*) FROM riot_accounts"), [(0,)])
+
+    def test_registered_users_are_seeded(self):
+        self.db.register_user("discord-1", "Faker", "KR1", "kr", "p1")
+        self.assertEqual(AccountCache(self.db).get("faker", "kr1", "kr"), "p1")
+
+    def test_memory_tier_is_bounded(self):
+        cache = AccountCache(self.db, max_entries=2)
+        cache.put_many([(f"name{i}", "NA1", "na1", f"p{i}") for i in range(5)])
+        self.assertEqual(len(cache._entries), 2)
+        # Evicted from memory, still answered from the table.
+        self.assertEqual(cache.get("name0", "NA1", "na1"), "p0")
+
+
+if __name__ == "__main__":
+    unittest.main()
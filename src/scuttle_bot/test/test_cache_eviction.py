@@ -0,0 +1,84 @@
+import os
+import random
+import unittest
+
+from scuttle_bot.test.support import TempDirTestCase, match_detail
+from scuttle_bot.infra.cache_eviction import MatchCacheEvictor, enable_incremental_vacuum
+from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.infra.payload_codec import MATCH, TIMELINE
+
+
+def puuids(match_number: int) -> list:
+    return [f"puuid-{match_number}-{i}" for i in range(10)]
+
+
+class MatchCacheEvictorTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("scuttle_bot.db")
+        self.db = DatabaseClient(self.db_path)
+        self.addCleanup(self.db.close)
+        # As at bot startup.
+        self.converted = enable_incremental_vacuum(self.db_path)
+
+    def cache(self, count: int, padding: int = 0):
+        """Caches matches NA1_0 .. NA1_<count - 1>, each under a summoner
+        of its own, least recently used first."""
+        for i in range(count):
+            match = match_detail(f"NA1_{i}", puuids(i))
+            if padding:
+                match["padding"] = random.randbytes(padding).hex()
+            self.db.put_many(MATCH, {f"NA1_{i}": match}, summoner_name=f"summoner{i}")
+            self.db.execute_query("UPDATE matches SET last_accessed = ? WHERE match_id = ?", (1000 + i, f"NA1_{i}"))
+
+    def cached(self) -> list:
+        return sorted(int(match_id.split("_")[1]) for match_id, in self.db.execute_query("SELECT match_id FROM matches"))
+
+    def test_under_budget_evicts_nothing(self):
+        self.cache(5)
+        stats = MatchCacheEvictor(self.db, max_rows=10).run_once()
+        self.assertEqual(stats["evicted"], 0)
+        self.assertEqual(self.cached(), [0, 1, 2, 3, 4])
+
+    def test_least_recently_used_go_first_down_to_low_water(self):
+        self.cache(20)
+        # A user's own match survives however old; so does a recent read.
+        self.db.register_user("discord-1", "someone", "NA1", "na1", puuids(0)[3])
+        self.db.get_matches(["NA1_1"])
+        stats = MatchCacheEvictor(self.db, max_bytes=1 << 40, max_rows=10).run_once()
+        self.assertEqual(stats["evicted"], 11)
+        self.assertEqual(self.cached(), [0, 1, 13, 14, 15, 16, 17, 18, 19])
+        evicted_participants = self.db.execute_query("SELECT COUNT(*) FROM cached_match_participants WHERE match_id = 'NA1_2'")
+        self.assertEqual(evicted_participants, [(0,)])
+
+    def test_matches_looked_up_under_a_users_name_are_protected(self):
+        self.cache(5)
+        self.db.register_user("discord-1", "Summoner0", "NA1", "na1", "someone-else")
+        MatchCacheEvictor(self.db, max_bytes=1 << 40, max_rows=3).run_once()
+        self.assertEqual(self.cached(), [0, 4])
+
+    def test_timelines_share_the_budget(self):
+        self.cache(3)
+        self.db.put_many(TIMELINE, {"NA1_0": {"info": {"frames": []}}})
+        self.db.execute_query("UPDATE match_timelines SET last_accessed = 0")
+        stats = MatchCacheEvictor(self.db, max_bytes=1 << 40, max_rows=3).run_once()
+        self.assertEqual(stats["evicted"], 2)
+        self.assertFalse(self.db.exists_match_timeline("NA1_0"))
+        self.assertEqual(self.cached(), [1, 2])
+
+    def test_byte_budget_shrinks_the_file_in_incremental_mode(self):
+        self.assertTrue(self.converted)
+        self.assertFalse(enable_incremental_vacuum(self.db_path))
+        self.cache(40, padding=16 * 1024)
+        self.db.execute_query("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_before = os.path.getsize(self.db_path)
+        payload_bytes, _ = MatchCacheEvictor(self.db).usage()
+
+        stats = MatchCacheEvictor(self.db, max_bytes=payload_bytes // 4).run_once()
+        self.assertLessEqual(stats["payload_bytes_after"], payload_bytes // 4)
+        self.assertLess(os.path.getsize(self.db_path), size_before // 2)
+        self.assertEqual(os.path.getsize(self.db_path + "-wal"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+from scuttle_bot.test.support import TempDirTestCase
+from scuttle_bot.data.collector import Collector
+from scuttle_bot.infra import response_cache
+from scuttle_bot.infra.response_cache import NOT_FOUND, ResponseCache
+
+MASTERIES = [
+    {"championId": 86, "championPoints": 1000, "championLevel": 5, "lastPlayTime": 111, "tokensEarned": 0},
+    {"championId": 64, "championPoints": 2000, "championLevel": 7, "lastPlayTime": 222, "tokensEarned": 2},
+]
+
+
+class CollectorTestCase(TempDirTestCase):
+    """A Collector with no AWS key lookup, over a scratch response cache.
+    Riot responses are set per test through self.riot."""
+
+    def setUp(self):
+        super().setUp()
+        cache = ResponseCache(self.path("riot_cache.db"))
+        self.addCleanup(cache.close)
+        for patcher in (
+            mock.patch.object(response_cache, "_shared_cache", cache),
+            mock.patch("scuttle_bot.data.collector.get_riot_api_key", return_value="test-key"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.collector = Collector()
+        patcher = mock.patch.object(self.collector, "_get_json")
+        self.riot = patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ChampionMasteryTest(CollectorTestCase):
+    def test_one_call_answers_every_champion(self):
+        self.riot.return_value = MASTERIES
+        self.assertEqual(
+            self.collector.collect_champion_mastery("p1", 64),
+            {"puuid": "p1", "championId": 64, "championPoints": 2000, "championLevel": 7, "lastPlayTime": 222}
+        )
+        self.assertEqual(self.collector.collect_champion_mastery("p1", 86)["championPoints"], 1000)
+        self.assertIsNone(self.collector.collect_champion_mastery("p1", 1))
+        self.assertEqual(self.riot.call_count, 1)
+        self.assertIn("/champion-masteries/by-puuid/p1", self.riot.call_args.args[0])
+
+    def test_snapshot_is_compact(self):
+        self.riot.return_value = MASTERIES
+        self.assertEqual(self.collector.collect_champion_masteries("p1"), {"86": [1000, 5, 111], "64": [2000, 7, 222]})
+
+    def test_players_are_cached_separately(self):
+        self.riot.side_effect = [MASTERIES, MASTERIES[:1]]
+        self.collector.collect_champion_mastery("p1", 64)
+        self.assertIsNone(self.collector.collect_champion_mastery("p2", 64))
+        self.assertEqual(self.riot.call_count, 2)
+
+    def test_player_without_mastery_is_cached(self):
+        self.riot.return_value = []
+        self.assertIsNone(self.collector.collect_champion_mastery("p1", 64))
+        self.assertIsNone(self.collector.collect_champion_mastery("p1", 86))
+        self.assertEqual(self.riot.call_count, 1)
+
+    def test_failures_are_retried(self):
+        self.riot.side_effect = [None, {"status": {"status_code": 403}}, NOT_FOUND, MASTERIES]
+        for _ in range(3):
+            self.assertIsNone(self.collector.collect_champion_mastery("p1", 64))
+        self.assertEqual(self.collector.collect_champion_mastery("p1", 64)["championLevel"], 7)
+        self.assertEqual(self.riot.call_count, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
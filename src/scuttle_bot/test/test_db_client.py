@@ -0,0 +1,283 @@
+import gc
+import json
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+
+from scuttle_bot.test.support import TempDirTestCase, match_detail
+from scuttle_bot.data.dataset import Dataset
+from scuttle_bot.data.frontier import CollectionFrontier, PLAYER
+from scuttle_bot.infra import db_client
+from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.infra.match_archive import MatchArchive
+from scuttle_bot.infra.payload_codec import MATCH, NO_DICTIONARY, TIMELINE
+from scuttle_bot.infra.response_cache import ResponseCache
+
+PUUIDS = [f"puuid-{i}" for i in range(10)]
+
+
+def columns(db_path: str, table: str) -> set:
+    connection = sqlite3.connect(db_path)
+    try:
+        return {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    finally:
+        connection.close()
+
+
+def indexes(db_path: str, table: str) -> set:
+    connection = sqlite3.connect(db_path)
+    try:
+        return {row[1] for row in connection.execute(f"PRAGMA index_list({table})")}
+    finally:
+        connection.close()
+
+
+class ConnectionsTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = DatabaseClient(self.path("scuttle_bot.db"))
+        self.addCleanup(self.db.close)
+
+    def in_thread(self, target):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+    def test_each_thread_reads_on_its_own_connection(self):
+        readers = []
+        self.in_thread(lambda: readers.append(self.db.reader))
+        self.assertIsNot(readers[0], self.db.reader)
+        self.assertIs(self.db.reader, self.db.reader)
+        self.assertIsNot(self.db.reader, self.db.connection)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.reader.execute("DELETE FROM interactions")
+
+    def test_readers_are_closed_when_their_thread_ends(self):
+        self.db.execute_query("SELECT 1")
+        for _ in range(5):
+            self.in_thread(lambda: self.db.execute_query("SELECT 1"))
+        gc.collect()
+        self.assertEqual(self.db._readers, [self.db.reader])
+
+    def test_reads_dont_wait_for_the_writer(self):
+        clients = [
+            self.db,
+            ResponseCache(self.path("riot_cache.db")),
+            CollectionFrontier(self.path("ml_dataset.db")),
+            MatchArchive(self.path("match_archive.db")),
+        ]
+        for client in clients[1:]:
+            self.addCleanup(client.close)
+        for client in clients:
+            with self.subTest(client=type(client).__name__):
+                holding = threading.Event()
+                release = threading.Event()
+
+                def hold_writer():
+                    with client._write_lock:
+                        holding.set()
+                        release.wait(5)
+
+                thread = threading.Thread(target=hold_writer)
+                thread.start()
+                holding.wait()
+                try:
+                    self.assertEqual(client.execute_query("SELECT 1"), [(1,)])
+                finally:
+                    release.set()
+                    thread.join()
+
+    def test_close_closes_every_connection(self):
+        readers = []
+        self.in_thread(lambda: readers.append(self.db.reader))
+        readers.append(self.db.reader)
+        writer = self.db.connection
+        self.db.close()
+        for connection in readers + [writer]:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                connection.execute("SELECT 1")
+
+
+class ColumnMigrationTest(TempDirTestCase):
+    def create(self, db_path: str, script: str):
+        connection = sqlite3.connect(db_path)
+        connection.executescript(script)
+        connection.close()
+
+    def test_bot_db_payload_tables_are_migrated(self):
+        db_path = self.path("scuttle_bot.db")
+        self.create(db_path, """
+            CREATE TABLE matches (match_id TEXT PRIMARY KEY, summoner_name TEXT NOT NULL, data TEXT NOT NULL);
+            CREATE TABLE interactions (id INTEGER PRIMARY KEY, user_id TEXT, query TEXT, response TEXT);
+        """)
+        DatabaseClient(db_path).close()
+        self.assertLessEqual({"dict_id", "last_accessed"}, columns(db_path, "matches"))
+        self.assertIn("tool_calls", columns(db_path, "interactions"))
+        self.assertIn("idx_matches_last_accessed", indexes(db_path, "matches"))
+
+    def test_dataset_matches_table_is_left_alone(self):
+        db_path = self.path("ml_dataset.db")
+        with mock.patch("scuttle_bot.data.collector.get_riot_api_key", return_value="test-key"):
+            Dataset(db_path).close()
+        self.assertNotIn("dict_id", columns(db_path, "matches"))
+        self.assertNotIn("idx_matches_last_accessed", indexes(db_path, "matches"))
+
+    def test_subclasses_migrate_their_own_tables(self):
+        db_path = self.path("riot_cache.db")
+        self.create(db_path, "CREATE TABLE riot_responses (url TEXT PRIMARY KEY, body TEXT NOT NULL, fetched_at REAL NOT NULL);")
+        ResponseCache(db_path).close()
+        self.assertLessEqual({"negative", "puuid"}, columns(db_path, "riot_responses"))
+        self.assertIn("idx_riot_responses_puuid", indexes(db_path, "riot_responses"))
+
+        db_path = self.path("ml_dataset.db")
+        self.create(db_path, """
+            CREATE TABLE collection_frontier (
+                kind TEXT NOT NULL, item_id TEXT NOT NULL, payload TEXT, state TEXT NOT NULL DEFAULT 'pending',
+                leased_at REAL, updated_at REAL NOT NULL, PRIMARY KEY (kind, item_id)
+            );
+        """)
+        frontier = CollectionFrontier(db_path)
+        self.addCleanup(frontier.close)
+        self.assertLessEqual({"priority", "last_seen", "matches_seen", "region", "attempts"}, columns(db_path, "collection_frontier"))
+        frontier.add(PLAYER, [("p1", None)])
+        self.assertEqual(frontier.lease(PLAYER, 10), [("p1", None)])
+
+
+class PayloadTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("scuttle_bot.db")
+        self.db = DatabaseClient(self.db_path)
+        self.addCleanup(self.db.close)
+
+    def raw_row(self, table: str, match_id: str) -> tuple:
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(f"SELECT data, dict_id FROM {table} WHERE match_id = ?", (match_id,)).fetchone()
+        finally:
+            connection.close()
+
+    def cache(self, first: int, count: int) -> dict:
+        matches = {f"NA1_{i}": match_detail(f"NA1_{i}", PUUIDS) for i in range(first, first + count)}
+        self.db.put_many(MATCH, matches, summoner_name="player0")
+        return matches
+
+
+class PayloadCacheTest(PayloadTestCase):
+    def test_payloads_are_stored_compressed(self):
+        match = self.cache(1, 1)["NA1_1"]
+        data, dict_id = self.raw_row("matches", "NA1_1")
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(dict_id, NO_DICTIONARY)
+        self.assertEqual(self.db.retrieve_match("NA1_1"), match)
+
+    def test_legacy_rows_are_compressed_on_read(self):
+        timeline = {"metadata": {"matchId": "NA1_1"}, "info": {"frames": []}}
+        connection = sqlite3.connect(self.db_path)
+        with connection:
+            connection.execute("INSERT INTO match_timelines (match_id, data) VALUES (?, ?)", ("NA1_1", json.dumps(timeline)))
+        connection.close()
+
+        self.assertEqual(self.db.retrieve_match_timeline("NA1_1"), timeline)
+        data, dict_id = self.raw_row("match_timelines", "NA1_1")
+        self.assertIsInstance(data, bytes)
+        self.assertIsNotNone(dict_id)
+        self.assertEqual(self.db.retrieve_match_timeline("NA1_1"), timeline)
+
+    def test_dictionary_trains_in_the_background_once_enough_is_cached(self):
+        with mock.patch.object(db_client, "PAYLOAD_TRAIN_AFTER", 50):
+            early = self.cache(0, 49)
+            self.assertIsNone(self.db._training_thread)
+            early.update(self.cache(49, 11))
+            self.db._training_thread.join()
+            later = self.cache(100, 1)
+        dict_id = self.raw_row("matches", "NA1_100")[1]
+        if dict_id == NO_DICTIONARY:
+            self.skipTest("zstd could not train a dictionary from these samples")
+        self.assertEqual(self.raw_row("matches", "NA1_0")[1], NO_DICTIONARY)
+        # Rows from before and after the dictionary both still read back.
+        reopened = DatabaseClient(self.db_path)
+        self.addCleanup(reopened.close)
+        hits, _ = reopened.get_matches(["NA1_0", "NA1_100"])
+        self.assertEqual(hits, {"NA1_0": early["NA1_0"], "NA1_100": later["NA1_100"]})
+
+    def test_training_stays_off_the_storing_thread(self):
+        trained_on = []
+        with mock.patch.object(db_client, "PAYLOAD_TRAIN_AFTER", 5), \
+                mock.patch.object(DatabaseClient, "train_payload_dictionary", lambda db, kind: trained_on.append(threading.current_thread())):
+            self.cache(0, 5)
+            self.db._training_thread.join()
+        self.assertEqual(len(trained_on), 1)
+        self.assertIsNot(trained_on[0], threading.current_thread())
+
+    def test_stores_count_rows_without_querying_the_table(self):
+        self.cache(0, 3)
+        self.cache(2, 3)  # NA1_2 is already cached
+        statements = []
+        self.db.connection.set_trace_callback(statements.append)
+        self.cache(10, 1)
+        self.assertEqual(self.db._payload_rows[MATCH], 6)
+        self.assertFalse([statement for statement in statements if "COUNT(" in statement.upper()])
+
+
+
+class CachedParticipantsTest(PayloadTestCase):
+    def test_matches_are_cached_with_their_participants(self):
+        self.cache(1, 1)
+        participants = self.db.retrieve_match_participants(["NA1_1"], puuid="puuid-3")
+        self.assertEqual([participant["teamPosition"] for participant in participants["NA1_1"]], ["BOTTOM"])
+        rows = self.db.execute_query("SELECT COUNT(*) FROM cached_match_participants WHERE match_id = 'NA1_1'")
+        self.assertEqual(rows, [(10,)])
+
+    def test_failed_participant_insert_caches_nothing(self):
+        with mock.patch.object(DatabaseClient, "_insert_participant_rows", side_effect=sqlite3.OperationalError("disk I/O error")):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.db.store_matches([("NA1_1", "player0", json.dumps(match_detail("NA1_1", PUUIDS)))])
+        self.assertFalse(self.db.exists_match("NA1_1"))
+
+    def test_timelines_have_no_participant_rows(self):
+        self.db.put_many(TIMELINE, {"NA1_1": {"info": {"frames": []}}})
+        self.assertTrue(self.db.exists_match_timeline("NA1_1"))
+        self.assertEqual(self.db.execute_query("SELECT COUNT(*) FROM cached_match_participants"), [(0,)])
+
+
+
+class BatchedCacheTest(PayloadTestCase):
+    def test_get_matches_splits_hits_and_misses(self):
+        cached = self.cache(1, 1)
+        hits, missing = self.db.get_matches(["NA1_2", "NA1_1", "NA1_3", "NA1_2"])
+        self.assertEqual(hits, cached)
+        self.assertEqual(missing, ["NA1_2", "NA1_3"])
+
+    def test_long_matchlists_are_queried_in_chunks(self):
+        cached = self.cache(0, 5)
+        with mock.patch.object(db_client, "IN_QUERY_CHUNK", 2):
+            hits, missing = self.db.get_matches([f"NA1_{i}" for i in range(7)])
+        self.assertEqual(hits, cached)
+        self.assertEqual(missing, ["NA1_5", "NA1_6"])
+
+    def test_timelines_are_batched_too(self):
+        timelines = {f"NA1_{i}": {"info": {"frames": [i]}} for i in range(3)}
+        self.db.put_many(TIMELINE, timelines)
+        hits, missing = self.db.get_timelines(["NA1_0", "NA1_9", "NA1_2"])
+        self.assertEqual(hits, {"NA1_0": timelines["NA1_0"], "NA1_2": timelines["NA1_2"]})
+        self.assertEqual(missing, ["NA1_9"])
+        self.assertEqual(self.db.get_matches(["NA1_0"]), ({}, ["NA1_0"]))
+
+    def test_hits_are_noted_as_accessed(self):
+        self.cache(1, 2)
+        self.db.execute_query("UPDATE matches SET last_accessed = 0")
+        self.db.get_matches(["NA1_1", "NA1_3"])
+        self.db.flush_access_times()
+        rows = self.db.execute_query("SELECT match_id FROM matches WHERE last_accessed > 0")
+        self.assertEqual(rows, [("NA1_1",)])
+
+    def test_caching_a_match_needs_its_summoner(self):
+        with self.assertRaises(ValueError):
+            self.db.put_many(MATCH, {"NA1_1": match_detail("NA1_1", PUUIDS)})
+        self.db.put_many(MATCH, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import sqlite3
+import unittest
+
+from scuttle_bot.test.support import TempDirTestCase
+from scuttle_bot.data.dedup import MatchDedup, encode_match_id
+
+
+class EncodeMatchIdTest(unittest.TestCase):
+    def test_bare_ids_are_na1(self):
+        self.assertEqual(encode_match_id("5012345678"), encode_match_id("NA1_5012345678"))
+        self.assertEqual(encode_match_id(5012345678), encode_match_id("na1_5012345678"))
+
+    def test_platforms_and_game_ids_are_distinct(self):
+        keys = {encode_match_id(match_id) for match_id in ("NA1_1", "EUW1_1", "NA1_2", "KR_1")}
+        self.assertEqual(len(keys), 4)
+
+    def test_unencodable_ids(self):
+        self.assertIsNone(encode_match_id("XX9_1"))
+        self.assertIsNone(encode_match_id("NA1_abc"))
+        self.assertIsNone(encode_match_id(f"NA1_{1 << 40}"))
+
+
+class MatchDedupTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("ml_dataset.db")
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("CREATE TABLE matches (match_id TEXT PRIMARY KEY)")
+            connection.executemany(
+                "INSERT INTO matches VALUES (?)", [("5000000001",), ("EUW1_7",), ("XX9_42",)]
+            )
+        connection.close()
+        self.dedup = MatchDedup(self.db_path)
+        self.addCleanup(self.dedup.close)
+
+    def test_stored_ids_match_either_form(self):
+        self.assertIn("NA1_5000000001", self.dedup)
+        self.assertIn("5000000001", self.dedup)
+        self.assertIn("EUW1_7", self.dedup)
+        self.assertNotIn("NA1_7", self.dedup)
+
+    def test_new_ids_keeps_order_and_doesnt_claim(self):
+        self.assertEqual(self.dedup.new_ids(["NA1_3", "EUW1_7", "NA1_2"]), ["NA1_3", "NA1_2"])
+        self.assertEqual(self.dedup.new_ids(["NA1_3"]), ["NA1_3"])
+
+    def test_each_match_is_claimed_once(self):
+        self.assertEqual(self.dedup.claim(["NA1_3", "NA1_3", "3", "NA1_5000000001"]), ["NA1_3"])
+        self.assertEqual(self.dedup.claim(["NA1_3", "NA1_4"]), ["NA1_4"])
+
+    def test_unencodable_ids_fall_back_to_the_table(self):
+        self.assertIn("XX9_42", self.dedup)
+        self.assertEqual(self.dedup.claim(["XX9_43", "XX9_43", "XX9_42"]), ["XX9_43"])
+        self.assertIn("XX9_43", self.dedup)
+
+
+if __name__ == "__main__":
+    unittest.main()
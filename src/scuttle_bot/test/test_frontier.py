@@ -0,0 +1,174 @@
+import sqlite3
+import unittest
+
+from scuttle_bot.test.support import TempDirTestCase
+from scuttle_bot.data.frontier import CollectionFrontier, ENRICHMENT, MATCH, PLAYER
+from scuttle_bot.utilities.schemas import Region
+
+
+class FrontierTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("ml_dataset.db")
+        self.frontier = self.open_frontier()
+
+    def open_frontier(self, region: Region = Region.NA, **kwargs) -> CollectionFrontier:
+        frontier = CollectionFrontier(self.db_path, region=region, **kwargs)
+        self.addCleanup(frontier.close)
+        return frontier
+
+    def state(self, kind: str, item_id: str, region: Region = Region.NA) -> tuple:
+        return self.frontier.execute_query(
+            "SELECT state, attempts FROM collection_frontier WHERE region = ? AND kind = ? AND item_id = ?",
+            (region.value, kind, item_id)
+        )[0]
+
+
+class CollectionFrontierTest(FrontierTestCase):
+    def test_lease_hands_out_each_row_once(self):
+        self.frontier.add(PLAYER, [("p1", None), ("p2", {"tier": "GOLD"})])
+        leased = self.frontier.lease(PLAYER, 10)
+        self.assertEqual(sorted(leased), [("p1", None), ("p2", {"tier": "GOLD"})])
+        self.assertEqual(self.frontier.lease(PLAYER, 10), [])
+
+    def test_expired_lease_is_handed_out_again(self):
+        self.frontier.add(PLAYER, [("p1", None)])
+        self.frontier.lease(PLAYER, 10)
+        self.frontier.execute_query("UPDATE collection_frontier SET leased_at = leased_at - ?", (self.frontier.lease_seconds + 1,))
+        self.assertEqual(self.frontier.lease(PLAYER, 10), [("p1", None)])
+
+    def test_advance_records_the_next_stage_before_finishing(self):
+        self.frontier.add(PLAYER, [("p1", None)])
+        self.frontier.lease(PLAYER, 10)
+        self.frontier.advance(PLAYER, "p1", MATCH, [("NA1_1", {"tier": "GOLD"}), ("NA1_2", None)])
+        self.assertEqual(self.state(PLAYER, "p1"), ("done", 0))
+        self.assertEqual(self.state(MATCH, "NA1_1"), ("in_flight", 0))
+        self.frontier.complete(MATCH, ["NA1_1", "NA1_2"])
+        self.assertFalse(self.frontier.has_unfinished())
+
+    def test_failing_row_is_retried_then_given_up(self):
+        self.frontier.add(MATCH, [("NA1_1", {"tier": "GOLD"})], state="in_flight")
+        self.frontier.fail(MATCH, ["NA1_1"])
+        self.assertEqual(self.state(MATCH, "NA1_1"), ("in_flight", 1))
+        self.frontier.reclaim()
+        self.assertEqual(self.frontier.lease(MATCH, 10), [("NA1_1", {"tier": "GOLD"})])
+        self.frontier.fail(MATCH, ["NA1_1"])
+        self.frontier.fail(MATCH, ["NA1_1"])
+        self.assertEqual(self.state(MATCH, "NA1_1"), ("failed", 3))
+        self.frontier.reclaim()
+        self.assertEqual(self.frontier.lease(MATCH, 10), [])
+        self.assertFalse(self.frontier.has_unfinished())
+        # Still counted as seen, so the match isn't claimed again.
+        self.assertEqual(self.frontier.unfinished_ids(MATCH), ["NA1_1"])
+
+    def test_max_attempts_is_configurable(self):
+        frontier = self.open_frontier(max_attempts=1)
+        frontier.add(ENRICHMENT, [("NA1_1", None)], state="in_flight")
+        frontier.fail(ENRICHMENT, ["NA1_1"])
+        self.assertEqual(self.state(ENRICHMENT, "NA1_1"), ("failed", 1))
+
+    def test_done_rows_ignore_failures(self):
+        self.frontier.add(PLAYER, [("p1", None)])
+        self.frontier.complete(PLAYER, ["p1"])
+        self.frontier.fail(PLAYER, ["p1"])
+        self.assertEqual(self.state(PLAYER, "p1"), ("done", 0))
+
+    def test_requeue_resets_finished_and_failed_rows(self):
+        self.frontier.add(PLAYER, [("done", None), ("failed", None), ("pending", None)])
+        self.frontier.complete(PLAYER, ["done"])
+        self.open_frontier(max_attempts=1).fail(PLAYER, ["failed"])
+        self.frontier.add(PLAYER, [("done", None), ("failed", None), ("pending", None)], requeue_done=True)
+        for item_id in ("done", "failed", "pending"):
+            self.assertEqual(self.state(PLAYER, item_id), ("pending", 0))
+        self.assertTrue(self.frontier.has_pending(PLAYER))
+
+    def test_reclaim_returns_in_flight_rows(self):
+        self.frontier.add(PLAYER, [("p1", None)])
+        self.frontier.lease(PLAYER, 10)
+        self.assertFalse(self.frontier.has_pending(PLAYER))
+        self.frontier.reclaim()
+        self.assertEqual(self.frontier.lease(PLAYER, 10), [("p1", None)])
+
+    def test_regions_only_see_their_own_rows(self):
+        euw = self.open_frontier(Region.EUW1)
+        self.frontier.add(PLAYER, [("p1", None)])
+        euw.add(PLAYER, [("p2", None)])
+        self.assertEqual(euw.lease(PLAYER, 10), [("p2", None)])
+        self.assertEqual(self.frontier.counts(), {(PLAYER, "pending"): 1})
+
+    def test_same_item_in_two_regions_gets_two_rows(self):
+        euw = self.open_frontier(Region.EUW1)
+        self.frontier.add(PLAYER, [("p1", None)])
+        euw.add(PLAYER, [("p1", {"tier": "GOLD"})])
+        euw.complete(PLAYER, ["p1"])
+        self.assertEqual(self.state(PLAYER, "p1"), ("pending", 0))
+        self.assertEqual(self.state(PLAYER, "p1", Region.EUW1), ("done", 0))
+        self.assertEqual(self.frontier.lease(PLAYER, 10), [("p1", None)])
+
+
+class CrawlTest(FrontierTestCase):
+    def test_lease_prefers_priority_then_recent_sightings(self):
+        self.frontier.add(PLAYER, [("low", None)], priorities={"low": 1})
+        self.frontier.sight_players([("seen-early", 5, 100.0), ("seen-late", 5, 200.0)], max_matches_per_player=10)
+        leased = [item_id for item_id, _ in self.frontier.lease(PLAYER, 10)]
+        self.assertEqual(leased, ["seen-late", "seen-early", "low"])
+
+    def test_sightings_keep_the_best_priority_and_latest_time(self):
+        self.frontier.sight_players([("p1", 7, 200.0)], max_matches_per_player=10)
+        self.frontier.sight_players([("p1", 3, 100.0)], max_matches_per_player=10)
+        self.assertEqual(
+            self.frontier.execute_query("SELECT priority, last_seen, matches_seen FROM collection_frontier WHERE item_id = 'p1'"),
+            [(7, 200.0, 2)]
+        )
+
+    def test_players_seen_often_enough_are_dropped(self):
+        self.frontier.sight_players([("p1", 1, 100.0)], max_matches_per_player=2)
+        self.frontier.sight_players([("p1", 1, 200.0)], max_matches_per_player=2)
+        self.assertEqual(self.state(PLAYER, "p1"), ("done", 0))
+        self.assertEqual(self.frontier.lease(PLAYER, 10), [])
+
+    def test_crawled_players_are_not_requeued(self):
+        self.frontier.sight_players([("p1", 1, 100.0)], max_matches_per_player=10)
+        self.assertEqual(self.frontier.lease(PLAYER, 10), [("p1", None)])
+        self.frontier.sight_players([("p1", 1, 200.0)], max_matches_per_player=10)
+        self.assertEqual(self.state(PLAYER, "p1"), ("in_flight", 0))
+        self.frontier.complete(PLAYER, ["p1"])
+        self.frontier.sight_players([("p1", 9, 300.0)], max_matches_per_player=10)
+        self.assertEqual(self.state(PLAYER, "p1"), ("done", 0))
+        self.assertEqual(self.frontier.lease(PLAYER, 10), [])
+
+
+class PrimaryKeyMigrationTest(TempDirTestCase):
+    def test_unscoped_table_is_rekeyed_by_region(self):
+        db_path = self.path("ml_dataset.db")
+        connection = sqlite3.connect(db_path)
+        connection.executescript("""
+            CREATE TABLE collection_frontier (
+                kind TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                payload TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                leased_at REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (kind, item_id)
+            );
+            INSERT INTO collection_frontier (kind, item_id, payload, state, updated_at)
+            VALUES ('player', 'p1', '{"tier": "GOLD"}', 'pending', 1.0), ('match', 'NA1_1', NULL, 'done', 1.0);
+        """)
+        connection.close()
+
+        frontier = CollectionFrontier(db_path, region=Region.NA)
+        self.addCleanup(frontier.close)
+        key = sorted((column[5], column[1]) for column in frontier.execute_query("PRAGMA table_info(collection_frontier)") if column[5])
+        self.assertEqual([name for _, name in key], ["region", "kind", "item_id"])
+        self.assertEqual(frontier.counts(), {(PLAYER, "pending"): 1, (MATCH, "done"): 1})
+        self.assertEqual(frontier.lease(PLAYER, 10), [("p1", {"tier": "GOLD"})])
+
+        euw = CollectionFrontier(db_path, region=Region.EUW1)
+        self.addCleanup(euw.close)
+        euw.add(PLAYER, [("p1", None)])
+        self.assertEqual(euw.lease(PLAYER, 10), [("p1", None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import contextlib
+import io
+import json
+import sqlite3
+import unittest
+from unittest import mock
+
+from scuttle_bot.test.support import TempDirTestCase, match_detail
+from scuttle_bot.data.dataset import Dataset
+from scuttle_bot.data.harvest import harvest_cached_matches
+from scuttle_bot.infra.db_client import DatabaseClient
+from scuttle_bot.infra.match_archive import MatchArchive, MATCH
+
+
+def aram_detail(match_id: str) -> dict:
+    detail = match_detail(match_id, [f"{match_id}-p{i}" for i in range(10)])
+    detail["info"]["queueId"] = 450
+    return detail
+
+
+class HarvestCachedMatchesTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("scuttle_bot.data.collector.get_riot_api_key", return_value="test-key")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bot_db_path = self.path("scuttle_bot.db")
+        bot_db = DatabaseClient(self.bot_db_path)
+        bot_db.store_matches([
+            ("NA1_1", "Faker", json.dumps(match_detail("NA1_1", [f"a{i}" for i in range(10)]))),
+            ("NA1_2", "Faker", json.dumps(aram_detail("NA1_2"))),
+            ("NA1_3", "Faker", json.dumps({"info": {"queueId": 420}})),  # no teams to make a row from
+        ])
+        bot_db.close()
+        # Cached before payload compression: JSON text, no dict_id.
+        with sqlite3.connect(self.bot_db_path) as connection:
+            connection.executemany(
+                "INSERT INTO matches (match_id, summoner_name, data) VALUES (?, 'Faker', ?)",
+                [
+                    ("NA1_4", json.dumps(match_detail("NA1_4", [f"b{i}" for i in range(10)]))),
+                    ("NA1_5", json.dumps(aram_detail("NA1_5"))),
+                ]
+            )
+        connection.close()
+
+        self.dataset = Dataset(self.path("ml_dataset.db"))
+        self.addCleanup(self.dataset.close)
+        self.archive = MatchArchive(self.path("match_archive.db"))
+        self.addCleanup(self.archive.close)
+
+    def harvest(self) -> int:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return harvest_cached_matches(
+                self.dataset, self.bot_db_path, workers=1, chunk_rows=2, transaction_rows=1, archive=self.archive
+            )
+
+    def test_harvests_ranked_matches_once(self):
+        self.assertEqual(self.harvest(), 2)
+        self.assertEqual(
+            self.dataset.execute_query("SELECT match_id, blue_top, red_top, average_tier FROM matches ORDER BY match_id"),
+            [("NA1_1", "21", "26", None), ("NA1_4", "21", "26", None)]
+        )
+        self.assertEqual(self.harvest(), 0)
+        self.assertEqual(self.dataset.execute_query("SELECT COUNT(*) FROM matches"), [(2,)])
+
+    def test_harvested_matches_are_archived(self):
+        self.harvest()
+        self.assertEqual(self.archive.get(MATCH, "NA1_4")["metadata"]["matchId"], "NA1_4")
+        self.assertTrue(self.archive.contains(MATCH, "NA1_1"))
+        self.assertEqual(self.archive.count(MATCH), 2)
+
+    def test_the_bot_db_is_left_alone(self):
+        with sqlite3.connect(self.bot_db_path) as connection:
+            before = connection.execute("SELECT match_id, data FROM matches ORDER BY match_id").fetchall()
+        connection.close()
+        self.harvest()
+        with sqlite3.connect(self.bot_db_path) as connection:
+            self.assertEqual(connection.execute("SELECT match_id, data FROM matches ORDER BY match_id").fetchall(), before)
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
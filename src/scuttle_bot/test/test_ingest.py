@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+import unittest
+
+from scuttle_bot.test.support import TempDirTestCase
+from scuttle_bot.data.ingest import IngestWriter
+
+SCHEMA_PATHS = ["src/scuttle_bot/infra/ml_schema.sql", "src/scuttle_bot/infra/match_participants_schema.sql"]
+
+
+def match_row(match_id: str, **fields) -> dict:
+    return {"match_id": match_id, "patch_version": "14.1", "blue_win": 1, "blue_top": "Garen", **fields}
+
+
+def participant_row(match_id: str, puuid: str, **fields) -> dict:
+    return {"match_id": match_id, "puuid": puuid, "team": "blue", "role": "top", "champion_id": 86, **fields}
+
+
+class IngestWriterTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("ml_dataset.db")
+        self.connection = sqlite3.connect(self.db_path)
+        self.addCleanup(self.connection.close)
+        for schema_path in SCHEMA_PATHS:
+            with open(schema_path) as f:
+                self.connection.executescript(f.read())
+        self.writer = IngestWriter(self.connection)
+
+    def stored(self, table: str) -> list:
+        """What another connection sees, i.e. only what's committed."""
+        reader = sqlite3.connect(self.db_path)
+        try:
+            return [row[0] for row in reader.execute(f"SELECT match_id FROM {table} ORDER BY match_id")]
+        finally:
+            reader.close()
+
+    def test_nothing_is_visible_until_commit(self):
+        self.assertEqual(self.writer.write_batch([match_row("NA1_1")], [participant_row("NA1_1", "p1")]), 1)
+        self.assertEqual(self.writer.pending_matches, 1)
+        self.assertEqual(self.stored("matches"), [])
+        self.writer.commit()
+        self.assertEqual(self.stored("matches"), ["NA1_1"])
+        self.assertEqual(self.stored("match_participants"), ["NA1_1"])
+        self.assertEqual(self.writer.pending_matches, 0)
+
+    def test_duplicates_are_skipped(self):
+        self.writer.write_batch([match_row("NA1_1")])
+        self.assertEqual(self.writer.write_batch([match_row("NA1_1", blue_top="Darius"), match_row("NA1_2")]), 1)
+        self.writer.commit()
+        self.assertEqual(self.connection.execute("SELECT blue_top FROM matches WHERE match_id = 'NA1_1'").fetchone(), ("Garen",))
+
+    def test_failed_batch_rolls_back_alone(self):
+        self.writer.write_batch([match_row("NA1_1")], [participant_row("NA1_1", "p1")])
+        # Fails on the participants, after the batch's match row is in.
+        bad_participant = participant_row("NA1_2", "p2", lane="top")
+        with self.assertRaises(ValueError):
+            self.writer.write_batch([match_row("NA1_2")], [bad_participant])
+        self.writer.write_batch([match_row("NA1_3")])
+        self.writer.commit()
+        self.assertEqual(self.stored("matches"), ["NA1_1", "NA1_3"])
+        self.assertEqual(self.stored("match_participants"), ["NA1_1"])
+
+    def test_unknown_column_is_refused(self):
+        with self.assertRaises(ValueError):
+            self.writer.write_batch([match_row("NA1_1", blue_toplane="Garen")])
+        self.writer.commit()
+        self.assertEqual(self.stored("matches"), [])
+
+    def test_with_block_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with IngestWriter(self.connection) as writer:
+                writer.write_batch([match_row("NA1_1")])
+                raise RuntimeError("interrupted")
+        self.assertEqual(self.stored("matches"), [])
+
+    def test_bulk_load_pragmas_are_restored(self):
+        synchronous = self.connection.execute("PRAGMA synchronous").fetchone()[0]
+        with IngestWriter(self.connection, bulk_load=True) as writer:
+            self.assertEqual(self.connection.execute("PRAGMA synchronous").fetchone()[0], 0)
+            writer.write_batch([match_row("NA1_1")])
+        self.assertEqual(self.connection.execute("PRAGMA synchronous").fetchone()[0], synchronous)
+        self.assertEqual(self.stored("matches"), ["NA1_1"])
+
+    def test_lock_is_held_while_a_transaction_is_open(self):
+        lock = threading.RLock()
+        writer = IngestWriter(self.connection, lock=lock)
+
+        def free() -> bool:
+            # Tried from another thread, as a concurrent writer would.
+            acquired = []
+
+            def try_lock():
+                acquired.append(lock.acquire(timeout=0.05))
+                if acquired[0]:
+                    lock.release()
+
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return acquired[0]
+
+        self.assertTrue(free())
+        writer.write_batch([match_row("NA1_1")])
+        writer.write_batch([match_row("NA1_2")])
+        self.assertFalse(free())
+        writer.commit()
+        self.assertTrue(free())
+        writer.write_batch([match_row("NA1_3")])
+        writer.rollback()
+        self.assertTrue(free())
+        self.assertEqual(self.stored("matches"), ["NA1_1", "NA1_2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from unittest import mock
+
+from scuttle_bot.test.support import TempDirTestCase, match_detail
+from scuttle_bot.infra import match_archive
+from scuttle_bot.infra.match_archive import MatchArchive, MATCH, TIMELINE
+from scuttle_bot.infra.payload_codec import NO_DICTIONARY
+
+
+def matches(first: int, count: int) -> list:
+    return [
+        (f"NA1_{i}", match_detail(f"NA1_{i}", [f"p{i}-{j}" for j in range(10)], game_end=1_700_000_000_000 + i))
+        for i in range(first, first + count)
+    ]
+
+
+class MatchArchiveTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("match_archive.db")
+        self.archive = self.open_archive()
+
+    def open_archive(self) -> MatchArchive:
+        archive = MatchArchive(self.db_path)
+        self.addCleanup(archive.close)
+        return archive
+
+    def dict_ids(self, kind: str) -> set:
+        rows = self.archive.execute_query("SELECT DISTINCT dict_id FROM archived_payloads WHERE kind = ?", (kind,))
+        return {dict_id for dict_id, in rows}
+
+    def test_put_many_is_append_only(self):
+        self.assertEqual(self.archive.put_many(MATCH, matches(1, 3)), 3)
+        self.assertEqual(self.archive.put_many(MATCH, [("NA1_1", {"changed": True})] + matches(4, 1)), 1)
+        self.assertEqual(self.archive.get(MATCH, "NA1_1"), matches(1, 1)[0][1])
+        self.assertEqual(self.archive.count(MATCH), 4)
+        self.assertEqual(self.archive.put_many(MATCH, []), 0)
+
+    def test_bare_ids_are_qualified(self):
+        self.assertTrue(self.archive.put(MATCH, "5012345678", {"info": {}}))
+        self.assertTrue(self.archive.contains(MATCH, "NA1_5012345678"))
+        self.assertEqual(self.archive.get(MATCH, "5012345678"), {"info": {}})
+
+    def test_kinds_are_separate(self):
+        self.archive.put(MATCH, "NA1_1", {"info": {}})
+        self.assertIsNone(self.archive.get(TIMELINE, "NA1_1"))
+        self.assertTrue(self.archive.put(TIMELINE, "NA1_1", {"frames": []}))
+        self.assertEqual(self.archive.count(TIMELINE), 1)
+
+    def test_iter_payloads_streams_in_write_order(self):
+        self.archive.put_many(MATCH, matches(10, 5))
+        self.archive.put_many(MATCH, matches(1, 2))
+        streamed = list(self.archive.iter_payloads(MATCH, chunk_size=2))
+        self.assertEqual(
+            [match_id for _, match_id, _ in streamed],
+            ["NA1_10", "NA1_11", "NA1_12", "NA1_13", "NA1_14", "NA1_1", "NA1_2"]
+        )
+        self.assertEqual(streamed[0][2], matches(10, 1)[0][1])
+        resumed = [match_id for _, match_id, _ in self.archive.iter_payloads(MATCH, after_seq=streamed[4][0])]
+        self.assertEqual(resumed, ["NA1_1", "NA1_2"])
+
+    def test_trained_dictionary_compresses_later_payloads(self):
+        self.archive.put_many(MATCH, matches(1, 200))
+        self.assertEqual(self.dict_ids(MATCH), {NO_DICTIONARY})
+        dict_id = self.archive.train_dictionary(MATCH)
+        self.assertIsNotNone(dict_id)
+        self.archive.put_many(MATCH, matches(201, 1))
+        self.assertEqual(self.dict_ids(MATCH), {NO_DICTIONARY, dict_id})
+        # Both generations still decode, also after a reopen.
+        reopened = self.open_archive()
+        self.assertEqual(reopened.get(MATCH, "NA1_1"), matches(1, 1)[0][1])
+        self.assertEqual(reopened.get(MATCH, "NA1_201"), matches(201, 1)[0][1])
+
+    def test_first_dictionary_is_trained_automatically(self):
+        with mock.patch.object(match_archive, "TRAIN_AFTER_PAYLOADS", 100):
+            self.archive.put_many(MATCH, matches(1, 99))
+            self.assertEqual(self.archive.codec.current_dictionary(MATCH), NO_DICTIONARY)
+            self.archive.put_many(MATCH, matches(100, 1))
+        self.assertNotEqual(self.archive.codec.current_dictionary(MATCH), NO_DICTIONARY)
+
+    def test_too_few_samples_train_nothing(self):
+        self.archive.put(MATCH, "NA1_1", {"info": {}})
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(self.archive.train_dictionary(MATCH))
+
+
+if __name__ == "__main__":
+    unittest.main()
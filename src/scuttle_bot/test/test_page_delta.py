@@ -0,0 +1,170 @@
+import gzip
+import io
+import os
+import random
+import sqlite3
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from scuttle_bot.test.support import TempDirTestCase
+from scuttle_bot.infra import aws_client
+from scuttle_bot.infra.page_delta import apply_delta, file_sha256, scan_pages, write_delta
+
+
+class FakeS3:
+    """The handful of S3 client calls the incremental sync makes, over a dict."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = bytes(Body)
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.objects[key] = fileobj.read()
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def download_fileobj(self, bucket, key, fileobj):
+        fileobj.write(self.get_object(bucket, key)["Body"].read())
+
+    def delete_objects(self, Bucket, Delete):
+        for entry in Delete["Objects"]:
+            self.objects.pop(entry["Key"], None)
+
+
+class DatasetFileTestCase(TempDirTestCase):
+    """A rollback-journal db of a few hundred incompressible rows."""
+
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("ml_dataset.db")
+        self.execute("CREATE TABLE matches (match_id TEXT PRIMARY KEY, data TEXT)")
+        self.insert(range(200))
+
+    def execute(self, *statements: str, params: list = ()):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            with connection:
+                for statement in statements:
+                    if params:
+                        connection.executemany(statement, params)
+                    else:
+                        connection.execute(statement)
+        finally:
+            connection.close()
+
+    def insert(self, numbers):
+        self.execute(
+            "INSERT INTO matches VALUES (?, ?)",
+            params=[(f"NA1_{number}", random.randbytes(250).hex()) for number in numbers]
+        )
+
+
+class PageDeltaTest(DatasetFileTestCase):
+    def snapshot(self):
+        """(scan, path of a copy of the file as scanned)."""
+        base_path = self.path(f"base-{len(os.listdir(self.temp_dir))}.db")
+        with open(base_path, "wb") as base:
+            scan = scan_pages(self.db_path, copy_to=base)
+        return scan, base_path
+
+    def apply(self, base_path: str, scan):
+        delta = io.BytesIO()
+        write_delta(delta, scan)
+        delta.seek(0)
+        with open(base_path, "r+b") as target:
+            apply_delta(delta, target)
+
+    def test_scan_without_previous_digests_collects_nothing(self):
+        scan, base_path = self.snapshot()
+        self.assertEqual(scan.changed, [])
+        self.assertEqual(file_sha256(base_path), scan.sha256)
+        self.assertEqual(len(scan.digests), scan.page_count * 8)
+
+    def test_delta_carries_only_changed_pages(self):
+        base, base_path = self.snapshot()
+        self.execute("UPDATE matches SET data = 'y' WHERE match_id = 'NA1_7'")
+        scan = scan_pages(self.db_path, previous_digests=base.digests)
+        self.assertGreater(len(scan.changed), 0)
+        self.assertLess(len(scan.changed), base.page_count // 2)
+        self.apply(base_path, scan)
+        self.assertEqual(file_sha256(base_path), file_sha256(self.db_path))
+
+    def test_delta_chain_grows_and_shrinks_the_file(self):
+        base, base_path = self.snapshot()
+        digests = base.digests
+        self.insert(range(200, 600))
+        grown = scan_pages(self.db_path, previous_digests=digests)
+        self.assertGreater(grown.page_count, base.page_count)
+        self.apply(base_path, grown)
+
+        self.execute("DELETE FROM matches WHERE match_id != 'NA1_1'")
+        self.execute("VACUUM")
+        shrunk = scan_pages(self.db_path, previous_digests=grown.digests)
+        self.assertLess(shrunk.page_count, grown.page_count)
+        self.apply(base_path, shrunk)
+        self.assertEqual(file_sha256(base_path), shrunk.sha256)
+        connection = sqlite3.connect(base_path)
+        self.assertEqual(connection.execute("SELECT match_id FROM matches").fetchall(), [("NA1_1",)])
+        connection.close()
+
+    def test_rejects_other_files(self):
+        not_a_delta = io.BytesIO()
+        with gzip.GzipFile(fileobj=not_a_delta, mode="wb") as out:
+            out.write(b"SQLite format 3\x00")
+        not_a_delta.seek(0)
+        with self.assertRaises(ValueError):
+            apply_delta(not_a_delta, io.BytesIO())
+
+
+class IncrementalSyncTest(DatasetFileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.s3 = FakeS3()
+        patcher = mock.patch.object(aws_client, "_s3_client", return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def restore_path(self) -> str:
+        """Where to restore to -- a db is synced under its basename."""
+        return os.path.join(self.temp_dir, "restored", os.path.basename(self.db_path))
+
+    def test_sync_then_restore(self):
+        first = aws_client.sync_database_to_s3(self.db_path, bucket="bucket")
+        self.assertEqual(first["deltas"], [])
+        self.insert(range(200, 210))
+        second = aws_client.sync_database_to_s3(self.db_path, bucket="bucket")
+        self.assertEqual(len(second["deltas"]), 1)
+        self.assertEqual(aws_client.sync_database_to_s3(self.db_path, bucket="bucket"), second)
+
+        restored_path = self.restore_path()
+        self.assertTrue(aws_client.restore_database_from_s3_incremental(restored_path, bucket="bucket"))
+        self.assertEqual(file_sha256(restored_path), file_sha256(self.db_path))
+
+    def test_restore_rejects_a_corrupt_chain(self):
+        aws_client.sync_database_to_s3(self.db_path, bucket="bucket")
+        self.insert(range(200, 210))
+        manifest = aws_client.sync_database_to_s3(self.db_path, bucket="bucket")
+        self.s3.objects[manifest["deltas"][0]] = self.s3.objects[manifest["base"]]
+
+        restored_path = self.restore_path()
+        os.makedirs(os.path.dirname(restored_path))
+        with open(restored_path, "wb") as f:
+            f.write(b"previous")
+        with self.assertRaises(ValueError):
+            aws_client.restore_database_from_s3_incremental(restored_path, bucket="bucket")
+        with open(restored_path, "rb") as f:
+            self.assertEqual(f.read(), b"previous")
+
+    def test_restore_without_a_sync(self):
+        self.assertFalse(aws_client.restore_database_from_s3_incremental(self.restore_path(), bucket="bucket"))
+
+
+if __name__ == "__main__":
+    unittest.main()
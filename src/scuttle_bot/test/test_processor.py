@@ -0,0 +1,57 @@
+import unittest
+from unittest import mock
+
+from scuttle_bot.test.support import match_detail
+from scuttle_bot.data.processor import Processor
+
+CHALLENGER = {"tier": "CHALLENGER", "queue": "RANKED_SOLO_5x5", "entries": [
+    {"puuid": "c1", "rank": "I", "leaguePoints": 1500, "wins": 300, "losses": 200},
+]}
+MASTER = {"tier": "MASTER", "queue": "RANKED_SOLO_5x5", "entries": [
+    {"puuid": "m1", "rank": "I", "leaguePoints": 50},
+    {"rank": "I", "leaguePoints": 10},  # no puuid
+]}
+LEAGUE_ENTRY = [{"queueType": "RANKED_SOLO_5x5", "tier": "GOLD", "rank": "II", "leaguePoints": 20, "wins": 10, "losses": 10}]
+
+
+class LookupRankedStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.collector = mock.Mock()
+        self.collector.collect_ranked_stats.return_value = LEAGUE_ENTRY
+        self.collector.collect_champion_mastery.return_value = None
+        self.processor = Processor(self.collector)
+
+    def test_indexes_league_entries_by_puuid(self):
+        self.assertEqual(self.processor.set_rank_index([CHALLENGER, None, MASTER]), 2)
+        self.assertEqual(self.processor.lookup_ranked_stats("c1"), [{
+            "queueType": "RANKED_SOLO_5x5", "tier": "CHALLENGER", "rank": "I",
+            "leaguePoints": 1500, "wins": 300, "losses": 200,
+        }])
+        self.assertEqual(self.processor.lookup_ranked_stats("m1")[0]["wins"], 0)
+        self.collector.collect_ranked_stats.assert_not_called()
+
+    def test_unindexed_players_go_to_league_v4(self):
+        self.processor.set_rank_index([CHALLENGER])
+        self.assertEqual(self.processor.lookup_ranked_stats("g1"), LEAGUE_ENTRY)
+        self.collector.collect_ranked_stats.assert_called_once_with("g1")
+
+    def test_new_index_replaces_the_old(self):
+        self.processor.set_rank_index([CHALLENGER])
+        self.processor.set_rank_index([MASTER])
+        self.processor.lookup_ranked_stats("c1")
+        self.collector.collect_ranked_stats.assert_called_once_with("c1")
+
+    def test_participants_use_the_index(self):
+        self.processor.set_rank_index([CHALLENGER])
+        puuids = ["c1"] + [f"g{i}" for i in range(9)]
+        rows = self.processor.process_participants(match_detail("NA1_1", puuids))
+        self.assertEqual(
+            (rows[0]["tier"], rows[0]["league_points"], rows[0]["win_rate"]),
+            ("CHALLENGER", 1500, 0.6)
+        )
+        self.assertEqual(rows[1]["tier"], "GOLD")
+        self.assertEqual(self.collector.collect_ranked_stats.call_count, 9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import threading
+import unittest
+
+from scuttle_bot.test.support import REPO_ROOT  # noqa: F401 -- sets the working directory
+from scuttle_bot.infra.rate_limiter import RiotRateLimiter, method_key, parse_rate_limit_header
+
+PLATFORM = "https://na1.api.riotgames.com"
+
+
+def _acquires_within(limiter: RiotRateLimiter, url: str, seconds: float = 0.3) -> bool:
+    """Whether limiter.acquire(url) returns within seconds. A blocked
+    acquire is left waiting on a daemon thread."""
+    thread = threading.Thread(target=limiter.acquire, args=(url,), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    return not thread.is_alive()
+
+
+class ParseRateLimitHeaderTest(unittest.TestCase):
+    def test_parses_limit_windows(self):
+        self.assertEqual(parse_rate_limit_header("20:1,100:120"), {1: 20, 120: 100})
+
+    def test_skips_malformed_entries(self):
+        self.assertEqual(parse_rate_limit_header("20:1, junk ,x:5,100:120"), {1: 20, 120: 100})
+        self.assertEqual(parse_rate_limit_header(None), {})
+
+
+class MethodKeyTest(unittest.TestCase):
+    def test_ids_collapse_into_one_bucket(self):
+        self.assertEqual(method_key("/lol/match/v5/matches/NA1_1"), "match-v5.match")
+        self.assertEqual(method_key("/lol/match/v5/matches/NA1_2"), "match-v5.match")
+        self.assertEqual(method_key("/lol/match/v5/matches/NA1_1/timeline"), "match-v5.timeline")
+        self.assertEqual(method_key("/lol/league/v4/entries/by-puuid/abc"), "league-v4.entries-by-puuid")
+
+
+class RiotRateLimiterTest(unittest.TestCase):
+    def test_learns_limits_and_server_counts_from_headers(self):
+        limiter = RiotRateLimiter()
+        url = f"{PLATFORM}/lol/league/v4/entries/by-puuid/abc"
+        limiter.acquire(url)
+        limiter.update(url, 200, {"X-App-Rate-Limit": "3:100", "X-App-Rate-Limit-Count": "3:100"})
+        # The key is already at its limit server-side, so nothing on the
+        # host may go out until the window resets.
+        self.assertFalse(_acquires_within(limiter, f"{PLATFORM}/lol/spectator/v5/active-games/by-summoner/abc"))
+        # Other hosts are budgeted separately.
+        self.assertTrue(_acquires_within(limiter, "https://euw1.api.riotgames.com/lol/league/v4/entries/by-puuid/abc"))
+
+    def test_method_429_blocks_only_that_method(self):
+        limiter = RiotRateLimiter()
+        url = f"{PLATFORM}/lol/league/v4/entries/by-puuid/abc"
+        limiter.acquire(url)
+        limiter.update(url, 429, {"Retry-After": "30", "X-Rate-Limit-Type": "method"})
+        self.assertFalse(_acquires_within(limiter, f"{PLATFORM}/lol/league/v4/entries/by-puuid/def"))
+        self.assertTrue(_acquires_within(limiter, f"{PLATFORM}/lol/spectator/v5/active-games/by-summoner/abc"))
+
+    def test_application_429_blocks_the_host(self):
+        limiter = RiotRateLimiter()
+        url = f"{PLATFORM}/lol/league/v4/entries/by-puuid/abc"
+        limiter.acquire(url)
+        limiter.update(url, 429, {"Retry-After": "30", "X-Rate-Limit-Type": "application"})
+        self.assertFalse(_acquires_within(limiter, f"{PLATFORM}/lol/spectator/v5/active-games/by-summoner/abc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
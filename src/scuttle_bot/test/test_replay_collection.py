@@ -0,0 +1,133 @@
+"""
+Dataset.create_dataset end to end against a small synthetic fixture archive
+served by riot_fixtures.replaying: league list, matchlists and match details
+go over real HTTP through riot_get, the rate limiter, the pipeline and the
+frontier, into a scratch ml_dataset.db.
+"""
+
+import contextlib
+import gzip
+import io
+import json
+import sqlite3
+import unittest
+from unittest import mock
+
+from scuttle_bot.test.support import TempDirTestCase, match_detail
+from scuttle_bot.test.riot_fixtures import replaying
+from scuttle_bot.data.dataset import CollectionOptions, Dataset
+from scuttle_bot.data.frontier import CollectionFrontier, MATCH
+from scuttle_bot.infra import response_cache
+from scuttle_bot.infra.response_cache import ResponseCache
+from scuttle_bot.utilities.schemas import Region
+
+APP_LIMITS = {"X-App-Rate-Limit": "500:1,3000:120", "X-App-Rate-Limit-Count": "1:1,1:120", "Content-Type": "application/json"}
+
+# Two master players. p1's matchlist overlaps p0's and ends with a match
+# that has no recorded details, so it 404s on every run.
+PLAYERS = ["p0", "p1"]
+MATCHLISTS = {"p0": ["NA1_101", "NA1_102"], "p1": ["NA1_102", "NA1_404"]}
+MATCHES = {
+    "NA1_101": ["p0"] + [f"a{i}" for i in range(9)],
+    "NA1_102": ["p1", "p0"] + [f"b{i}" for i in range(8)],
+}
+MISSING_MATCH = "NA1_404"
+
+
+def fixture(host: str, path: str, body) -> dict:
+    return {"host": host, "path": path, "status": 200, "headers": APP_LIMITS, "body": json.dumps(body)}
+
+
+def write_archive(path: str):
+    league = {
+        "tier": "MASTER",
+        "queue": "RANKED_SOLO_5x5",
+        "entries": [
+            {"puuid": puuid, "rank": "I", "leaguePoints": 100 + i, "wins": 60, "losses": 40}
+            for i, puuid in enumerate(PLAYERS)
+        ],
+    }
+    entries = [fixture("na1", "/lol/league/v4/masterleagues/by-queue/RANKED_SOLO_5x5", league)]
+    entries += [
+        fixture("americas", f"/lol/match/v5/matches/by-puuid/{puuid}/ids?count=2&queue=420", match_ids)
+        for puuid, match_ids in MATCHLISTS.items()
+    ]
+    entries += [
+        fixture("americas", f"/lol/match/v5/matches/{match_id}", match_detail(match_id, puuids))
+        for match_id, puuids in MATCHES.items()
+    ]
+    entries.append(fixture(
+        "na1", "/lol/champion-mastery/v4/champion-masteries/by-puuid/p0",
+        [{"championId": 21, "championPoints": 123456, "championLevel": 7, "lastPlayTime": 1}]
+    ))
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+
+class ReplayCollectionTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.archive_path = self.path("fixtures.jsonl.gz")
+        write_archive(self.archive_path)
+        self.db_path = self.path("ml_dataset.db")
+
+        cache = ResponseCache(self.path("riot_cache.db"))
+        self.addCleanup(cache.close)
+        for patcher in (
+            mock.patch.object(response_cache, "_shared_cache", cache),
+            mock.patch("scuttle_bot.data.collector.get_riot_api_key", return_value="test-key"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def collect(self):
+        with replaying(self.archive_path), contextlib.redirect_stdout(io.StringIO()):
+            dataset = Dataset(self.db_path)
+            try:
+                dataset.create_dataset(Region.NA, CollectionOptions(
+                    sample_size=len(PLAYERS), num_matches_per_player=2, master_league=True, stratified_sampling=False,
+                ))
+            finally:
+                dataset.close()
+
+    def query(self, sql: str) -> list:
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def missing_match_row(self) -> tuple:
+        return self.query(f"SELECT state, attempts FROM collection_frontier WHERE kind = 'match' AND item_id = '{MISSING_MATCH}'")[0]
+
+    def test_collects_matches_and_gives_up_on_a_missing_one(self):
+        self.collect()
+        self.assertEqual(self.query("SELECT match_id FROM matches ORDER BY match_id"), [("NA1_101",), ("NA1_102",)])
+        self.assertEqual(
+            self.query("SELECT blue_top, red_top, blue_win, queue_id FROM matches WHERE match_id = 'NA1_101'"),
+            [("21", "26", 1, 420)]
+        )
+        self.assertEqual(self.query("SELECT match_id, COUNT(*) FROM match_participants GROUP BY match_id"), [("NA1_101", 10), ("NA1_102", 10)])
+        # Rank from the league list, mastery from its endpoint.
+        self.assertEqual(
+            self.query("SELECT tier, league_points, champion_points FROM match_participants WHERE match_id = 'NA1_101' AND puuid = 'p0'"),
+            [("MASTER", 100, 123456)]
+        )
+        self.assertEqual(self.missing_match_row(), ("in_flight", 1))
+
+        self.collect()
+        self.assertEqual(self.missing_match_row(), ("in_flight", 2))
+        self.assertEqual(self.query("SELECT COUNT(*) FROM matches"), [(2,)])
+
+        self.collect()
+        self.assertEqual(self.missing_match_row(), ("failed", 3))
+        frontier = CollectionFrontier(self.db_path, region=Region.NA)
+        self.addCleanup(frontier.close)
+        self.assertFalse(frontier.has_unfinished())
+        self.assertEqual(frontier.lease(MATCH, 10), [])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM match_participants"), [(20,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
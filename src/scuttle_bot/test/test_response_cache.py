@@ -0,0 +1,133 @@
+import json
+import time
+import unittest
+
+from scuttle_bot.test.support import TempDirTestCase
+from scuttle_bot.infra.response_cache import NOT_FOUND, ResponseCache
+
+PLATFORM = "https://na1.api.riotgames.com"
+LEAGUE_URL = f"{PLATFORM}/lol/league/v4/entries/by-puuid/p1"
+SPECTATOR_URL = f"{PLATFORM}/lol/spectator/v5/active-games/by-summoner/p1"
+MASTERY_URL = f"{PLATFORM}/lol/champion-mastery/v4/champion-masteries/by-puuid/p1"
+MATCHLIST_URL = "https://americas.api.riotgames.com/lol/match/v5/matches/by-puuid/p1/ids"
+
+
+class Fetcher:
+    """A fetch callable returning value and counting its calls."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class ResponseCacheTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = self.path("riot_cache.db")
+        self.cache = self.open_cache()
+
+    def open_cache(self) -> ResponseCache:
+        cache = ResponseCache(self.db_path)
+        self.addCleanup(cache.close)
+        return cache
+
+    def seed(self, url: str, value, age: float, negative: bool = False):
+        """Stores value for url as if fetched age seconds ago, then reopens
+        the cache so nothing is held in memory."""
+        self.cache.execute_query(
+            "INSERT OR REPLACE INTO riot_responses (url, body, fetched_at, negative, puuid) VALUES (?, ?, ?, ?, ?)",
+            (url, json.dumps(value), time.time() - age, int(negative), "p1")
+        )
+        self.cache = self.open_cache()
+
+    def test_fresh_entry_is_served_without_fetching(self):
+        fetch = Fetcher([{"tier": "GOLD"}])
+        self.assertEqual(self.cache.get_json(LEAGUE_URL, fetch), [{"tier": "GOLD"}])
+        self.assertEqual(self.cache.get_json(LEAGUE_URL, fetch), [{"tier": "GOLD"}])
+        self.assertEqual(fetch.calls, 1)
+        # And survives a restart.
+        self.assertEqual(self.open_cache().get_json(LEAGUE_URL, fetch), [{"tier": "GOLD"}])
+        self.assertEqual(fetch.calls, 1)
+
+    def test_stale_entry_is_served_then_refreshed_in_background(self):
+        self.seed(LEAGUE_URL, [{"tier": "GOLD"}], age=20 * 60)
+        fetch = Fetcher([{"tier": "PLATINUM"}])
+        self.assertEqual(self.cache.get_json(LEAGUE_URL, fetch), [{"tier": "GOLD"}])
+        self.cache._refresh_pool.shutdown(wait=True)
+        self.assertEqual(fetch.calls, 1)
+        self.assertEqual(self.cache.get_json(LEAGUE_URL, Fetcher(None)), [{"tier": "PLATINUM"}])
+
+    def test_expired_entry_is_refetched_inline(self):
+        self.seed(LEAGUE_URL, [{"tier": "GOLD"}], age=7 * 60 * 60)
+        fetch = Fetcher([{"tier": "PLATINUM"}])
+        self.assertEqual(self.cache.get_json(LEAGUE_URL, fetch), [{"tier": "PLATINUM"}])
+        self.assertEqual(fetch.calls, 1)
+
+    def test_failures_are_not_cached(self):
+        self.assertIsNone(self.cache.get_json(LEAGUE_URL, Fetcher(None)))
+        fetch = Fetcher([{"tier": "GOLD"}])
+        self.assertEqual(self.cache.get_json(LEAGUE_URL, fetch), [{"tier": "GOLD"}])
+        self.assertEqual(fetch.calls, 1)
+
+    def test_empty_body_is_an_answer_where_there_is_no_negative_ttl(self):
+        fetch = Fetcher({})
+        self.assertEqual(self.cache.get_json(MASTERY_URL, fetch), {})
+        self.assertEqual(self.cache.get_json(MASTERY_URL, fetch), {})
+        self.assertEqual(fetch.calls, 1)
+
+    def test_not_found_is_cached_as_negative(self):
+        fetch = Fetcher(NOT_FOUND)
+        self.assertIsNone(self.cache.get_json(SPECTATOR_URL, fetch))
+        self.assertIsNone(self.cache.get_json(SPECTATOR_URL, fetch))
+        self.assertEqual(fetch.calls, 1)
+
+    def test_negative_entry_expires_on_its_own_ttl(self):
+        self.seed(SPECTATOR_URL, None, age=2 * 60, negative=True)
+        fetch = Fetcher({"gameId": 1})
+        self.assertEqual(self.cache.get_json(SPECTATOR_URL, fetch), {"gameId": 1})
+        self.assertEqual(fetch.calls, 1)
+
+    def test_empty_league_answer_is_negative(self):
+        self.cache.get_json(LEAGUE_URL, Fetcher([]))
+        negative = self.cache.execute_query("SELECT negative, puuid FROM riot_responses WHERE url = ?", (LEAGUE_URL,))
+        self.assertEqual(negative, [(1, "p1")])
+
+    def test_new_match_drops_negative_entries(self):
+        self.cache.get_json(SPECTATOR_URL, Fetcher(NOT_FOUND))
+        self.cache.note_match_ids("p1", ["NA1_2", "NA1_1"])
+        fetch = Fetcher({"gameId": 1})
+        self.assertEqual(self.cache.get_json(SPECTATOR_URL, fetch), {"gameId": 1})
+        self.assertEqual(fetch.calls, 1)
+        self.assertEqual(self.cache.execute_query("SELECT COUNT(*) FROM riot_responses WHERE negative = 1"), [(0,)])
+
+    def test_known_match_keeps_negative_entries(self):
+        self.cache.note_match_ids("p1", ["NA1_2", "NA1_1"])
+        self.cache.get_json(SPECTATOR_URL, Fetcher(NOT_FOUND))
+        self.cache.note_match_ids("p1", ["NA1_2", "NA1_1"])
+        fetch = Fetcher({"gameId": 1})
+        self.assertIsNone(self.cache.get_json(SPECTATOR_URL, fetch))
+        self.assertEqual(fetch.calls, 0)
+
+    def test_other_players_negative_entries_are_kept(self):
+        other_url = f"{PLATFORM}/lol/spectator/v5/active-games/by-summoner/p2"
+        self.cache.get_json(other_url, Fetcher(NOT_FOUND))
+        self.cache.invalidate_negative("p1")
+        fetch = Fetcher({"gameId": 1})
+        self.assertIsNone(self.cache.get_json(other_url, fetch))
+        self.assertEqual(fetch.calls, 0)
+
+    def test_uncached_endpoints_always_fetch(self):
+        fetch = Fetcher(["NA1_1"])
+        self.cache.get_json(MATCHLIST_URL, fetch)
+        self.assertIsNone(self.cache.get_json(MATCHLIST_URL, Fetcher(NOT_FOUND)))
+        self.cache.get_json(MATCHLIST_URL, fetch)
+        self.assertEqual(fetch.calls, 2)
+        self.assertEqual(self.cache.execute_query("SELECT COUNT(*) FROM riot_responses"), [(0,)])
+
+
+if __name__ == "__main__":
+    unittest.main()
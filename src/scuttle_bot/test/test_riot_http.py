@@ -0,0 +1,67 @@
+import threading
+import unittest
+
+from scuttle_bot.test.support import REPO_ROOT  # noqa: F401 -- sets the working directory
+from scuttle_bot.infra.riot_http import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def _concurrently(self, flight: SingleFlight, fn, callers: int = 4) -> list:
+        """Runs flight.do("key", fn) from callers threads at once; returns
+        each one's result or exception."""
+        results = [None] * callers
+
+        def call(i):
+            try:
+                results[i] = flight.do("key", fn)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_overlapping_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return {"answer": 42}
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results = self._concurrently(flight, fn)
+        timer.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_error_reaches_every_waiter(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise RuntimeError("riot is down")
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results = self._concurrently(flight, fn)
+        timer.join()
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_nothing_is_remembered_after_completion(self):
+        flight = SingleFlight()
+        calls = []
+        flight.do("key", lambda: calls.append(1))
+        flight.do("key", lambda: calls.append(1))
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import os
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from scuttle_bot.test.support import TempDirTestCase, match_detail
+from scuttle_bot.data import snapshot
+from scuttle_bot.data.dataset import Dataset
+from scuttle_bot.data.processor import Processor
+
+LEAGUE_ENTRY = [{"queueType": "RANKED_SOLO_5x5", "tier": "GOLD", "rank": "II", "leaguePoints": 20, "wins": 10, "losses": 10}]
+
+
+@unittest.skipUnless(snapshot.columnar_available(), "snapshots need pyarrow")
+class SnapshotTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("scuttle_bot.data.collector.get_riot_api_key", return_value="test-key")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db_path = self.path("ml_dataset.db")
+        self.snapshot_dir = self.path("ml_snapshot")
+        self.dataset = Dataset(self.db_path)
+        self.addCleanup(self.dataset.close)
+        collector = mock.Mock()
+        collector.collect_ranked_stats.return_value = LEAGUE_ENTRY
+        collector.collect_champion_mastery.return_value = None
+        self.processor = Processor(collector)
+
+    def write_match(self, match_id: str, game_version: str):
+        detail = match_detail(match_id, [f"{match_id}-p{i}" for i in range(10)])
+        detail["info"]["gameVersion"] = game_version
+        writer = self.dataset.ingest_writer()
+        writer.write_batch([self.processor.process_data(detail, [])], self.processor.process_participants(detail))
+        writer.close()
+
+    def export(self) -> dict:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return snapshot.export_snapshot(self.db_path, self.snapshot_dir)
+
+    def load(self, table: str, **kwargs):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            data = snapshot.load_table(self.dataset, table, snapshot_dir=self.snapshot_dir, **kwargs)
+        return data, output.getvalue()
+
+    def test_round_trip(self):
+        self.write_match("NA1_1", "14.1.555.5555")
+        self.write_match("NA1_2", "14.2.1.1")
+        manifest = self.export()
+        self.assertEqual({table: entry["rows"] for table, entry in manifest["tables"].items()}, {"matches": 2, "match_participants": 20})
+        self.assertTrue(os.path.isdir(os.path.join(self.snapshot_dir, "matches", "patch=14.2")))
+
+        from_db = self.dataset.retrieve_dataset().sort_values("match_id").reset_index(drop=True)
+        from_snapshot = snapshot.read_snapshot("matches", self.snapshot_dir).sort_values("match_id").reset_index(drop=True)
+        # Typed in the snapshot, so an all-NULL column reads back as NaN
+        # floats rather than the db's Nones.
+        pd.testing.assert_frame_equal(from_snapshot, from_db.astype(from_snapshot.dtypes))
+
+    def test_columns_and_patches_are_selective(self):
+        self.write_match("NA1_1", "14.1.555.5555")
+        self.write_match("NA1_2", "14.2.1.1")
+        self.export()
+        data = snapshot.read_snapshot("matches", self.snapshot_dir, columns=["match_id", "blue_top"], patches=["14.2"], categorical=True)
+        self.assertEqual(list(data.columns), ["match_id", "blue_top"])
+        self.assertEqual(list(data["match_id"]), ["NA1_2"])
+        self.assertEqual(str(data["blue_top"].dtype), "category")
+        participants = snapshot.read_snapshot("match_participants", self.snapshot_dir, columns=["champion_id"], patches=["14.1"])
+        self.assertEqual(len(participants), 10)
+
+    def test_load_table_prefers_a_current_snapshot(self):
+        self.write_match("NA1_1", "14.1.555.5555")
+        self.export()
+        data, output = self.load("matches", columns=["match_id"])
+        self.assertIn("from the snapshot", output)
+        self.assertEqual(list(data["match_id"]), ["NA1_1"])
+
+    def test_load_table_falls_back_once_the_db_has_moved_on(self):
+        self.write_match("NA1_1", "14.1.555.5555")
+        self.export()
+        self.write_match("NA1_2", "14.1.555.5555")
+        data, output = self.load("matches", columns=["match_id"])
+        self.assertIn("out of date", output)
+        self.assertEqual(sorted(data["match_id"]), ["NA1_1", "NA1_2"])
+        participants, _ = self.load("match_participants", columns=["match_id"])
+        self.assertEqual(len(participants), 20)
+
+    def test_load_table_without_a_snapshot_reads_the_db(self):
+        self.write_match("NA1_1", "14.1.555.5555")
+        data, output = self.load("matches", columns=["match_id"])
+        self.assertEqual(output, "")
+        self.assertEqual(list(data["match_id"]), ["NA1_1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
+import os
 from enum import Enum
+from urllib.parse import urlparse
 
 class Region(Enum):
     NA = "na1"
@@ -50,11 +52,65 @@ _MATCH_ROUTING = {
 }
 
 
+# Every Riot base URL is built from this template, {host} being a platform
+# (na1) or cluster (americas) routing value. Pointing RIOT_API_URL_TEMPLATE
+# somewhere else -- e.g. "http://127.0.0.1:8765/{host}" for the fixture
+# replay server in test/riot_fixtures.py -- redirects all Riot traffic at
+# once. Read per call rather than at import so a benchmark can set it late.
+DEFAULT_RIOT_API_URL_TEMPLATE = "https://{host}.api.riotgames.com"
+
+
+def _riot_url_template() -> str:
+    return os.getenv("RIOT_API_URL_TEMPLATE", DEFAULT_RIOT_API_URL_TEMPLATE)
+
+
+def get_riot_base_url(host: str) -> str:
+    return _riot_url_template().format(host=host)
+
+
+def split_riot_url(url: str) -> tuple[str, str]:
+    """(routing host, API path) for a URL built by get_riot_base_url, e.g.
+    ("na1", "/lol/league/v4/entries/by-puuid/..."). Works whether the
+    template puts the host in the hostname (Riot itself) or in the path (a
+    stand-in serving every host from one address), so per-host bookkeeping
+    like rate-limit buckets stays per routing host either way."""
+    parsed = urlparse(url)
+    if "{host}" in urlparse(_riot_url_template()).netloc:
+        return parsed.netloc.split(".", 1)[0].lower(), parsed.path
+    _, host, path = parsed.path.split("/", 2) if parsed.path.count("/") >= 2 else ("", parsed.path.strip("/"), "")
+    return host.lower(), f"/{path}"
+
+
+def get_platform_routing_url(region: Region) -> str:
+    """Platform base URL (e.g. na1) for league-v4, champion-mastery-v4 and
+    spectator-v5 calls."""
+    return get_riot_base_url(region.value)
+
+
 def get_account_routing_url(region: Region) -> str:
     """Continental base URL for account-v1 calls (e.g. puuid lookup)."""
-    return f"https://{_ACCOUNT_ROUTING.get(region, 'americas')}.api.riotgames.com"
+    return get_riot_base_url(_ACCOUNT_ROUTING.get(region, 'americas'))
 
 
 def get_match_routing_url(region: Region) -> str:
     """Continental base URL for match-v5 calls."""
-    return f"https://{_MATCH_ROUTING.get(region, 'americas')}.api.riotgames.com"
\ No newline at end of file
+    return get_riot_base_url(_MATCH_ROUTING.get(region, 'americas'))
+
+
+# ml_dataset.db's matches were keyed by bare gameId ("5012345678") before
+# collection ran in more than one region; gameIds are only unique within a
+# platform, so rows are now keyed by Riot's region-qualified match ID
+# ("NA1_5012345678"). Every bare ID predates that and was collected on NA1;
+# migrate_match_ids.py rewrites them in place. Until a db has been migrated,
+# readers that match IDs across sources (MatchDedup, the archive,
+# CollectionFrontier.reconcile_written) accept either form.
+LEGACY_MATCH_ID_REGION = Region.NA
+
+
+def qualify_match_id(match_id, region: Region = LEGACY_MATCH_ID_REGION) -> str:
+    """match_id in region-qualified form: returned as-is if it already has a
+    platform prefix, else prefixed with region's."""
+    match_id = str(match_id)
+    if "_" in match_id:
+        return match_id
+    return f"{region.value.upper()}_{match_id}"
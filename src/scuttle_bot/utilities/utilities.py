@@ -1,18 +1,15 @@
-import requests
 import sys
 import logging
 import re
 
-# requests.get() has no default timeout -- a stalled connection blocks
-# forever with no exception ever raised.
-REQUEST_TIMEOUT = 30
+from scuttle_bot.infra.riot_http import get_session_pool
 
 def get_champion_mapping(version = None):
     try:
         if version is None:
-            version = requests.get("https://ddragon.leagueoflegends.com/api/versions.json", timeout=REQUEST_TIMEOUT).json()[0]
+            version = get_session_pool().get("https://ddragon.leagueoflegends.com/api/versions.json").json()[0]
         url = f"https://ddragon.leagueoflegends.com/cdn/{version}/data/en_US/champion.json"
-        data = requests.get(url, timeout=REQUEST_TIMEOUT).json()["data"]
+        data = get_session_pool().get(url).json()["data"]
 
         mapping = {int(info["key"]): info["name"] for info in data.values()}
         return mapping